@@ -1,24 +1,36 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from wordcloud import WordCloud, STOPWORDS
 import numpy as np
-from PIL import Image, ImageDraw
+from PIL import Image
 import io
 from io import BytesIO
 import base64
-import re
 import string
 import nltk
-from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
-from collections import Counter
-import PyPDF2
 from docx import Document
 import time
 import os
+import hashlib
+import uuid
 from dotenv import load_dotenv
-import openai
+from cloud_layout import (GRADIENT_STEPS, gradient_palette, layout_to_json, load_layout,
+                          recolor_layout, render_layout, write_png, write_svg)
+from frequency_table import FrequencyTable, IncrementalFrequencyIndex, count_terms
+from document_processing import count_sections, preprocess_text, process_upload, sample_upload
+from comparison import compare_counts, count_documents
+from jobs import CANCELLED, DONE, FAILED, JobRegistry
+from artifact_store import ArtifactStore
+from corpus_index import CorpusIndex
+from masks import get_mask, get_mask_image, is_image_shape, register_mask_image
+from render_pool import PREVIEW, RenderPool, RenderQueueFull, new_process_pool, paint_cloud, render_priority
+from presets import (ASPECT_RATIOS, CUSTOM, MAX_CUSTOM_SIZE, RESOLUTION_PRESETS, get_render_plan, preset_size,
+                     warm_plans)
+from timeline import SECTION_TOP_TERMS, encode_gif
+from chat import chat_completion
+from tokenization import resolve_language
+from concurrent.futures import TimeoutError as FuturesTimeout
 
 # Load environment variables
 load_dotenv()
@@ -64,6 +76,8 @@ if not openai_api_key:
 # Initialize session state variables
 if 'processed_document_text' not in st.session_state:
     st.session_state.processed_document_text = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Custom CSS for better styling
 st.markdown("""
@@ -155,11 +169,11 @@ st.write("Upload a document or use ChatGPT to generate text for a word cloud.")
 
 # Initialize session state variables if they don't exist
 if 'document_text' not in st.session_state:
-    st.session_state.document_text = ""
+    st.session_state.document_text = None
 if 'chatgpt_response' not in st.session_state:
     st.session_state.chatgpt_response = ""
 if 'processed_chatgpt_text' not in st.session_state:
-    st.session_state.processed_chatgpt_text = ""
+    st.session_state.processed_chatgpt_text = None
 if 'wordcloud_source' not in st.session_state:
     st.session_state.wordcloud_source = None
 if 'uploaded_file_name' not in st.session_state:
@@ -174,16 +188,127 @@ if 'last_settings' not in st.session_state:
     st.session_state.last_settings = {}
 if 'wordcloud_image' not in st.session_state:
     st.session_state.wordcloud_image = None
-if 'current_wordcloud' not in st.session_state:
-    st.session_state.current_wordcloud = None
+if 'current_layout' not in st.session_state:
+    st.session_state.current_layout = None
+if 'current_label_map' not in st.session_state:
+    st.session_state.current_label_map = None
 if 'current_wordcloud_text' not in st.session_state:
-    st.session_state.current_wordcloud_text = ""
+    st.session_state.current_wordcloud_text = None
+if 'current_wordcloud_text_hash' not in st.session_state:
+    st.session_state.current_wordcloud_text_hash = None
+if 'current_counting_mode' not in st.session_state:
+    st.session_state.current_counting_mode = None
 if 'current_source_text' not in st.session_state:
     st.session_state.current_source_text = ""
 if 'word_frequencies' not in st.session_state:
-    st.session_state.word_frequencies = []
+    st.session_state.word_frequencies = FrequencyTable.from_counts({})
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "document"
+if 'download_payloads' not in st.session_state:
+    st.session_state.download_payloads = {}
+if 'comparison' not in st.session_state:
+    st.session_state.comparison = None
+if 'chatgpt_index' not in st.session_state:
+    st.session_state.chatgpt_index = None
+if 'upload_job_id' not in st.session_state:
+    st.session_state.upload_job_id = None
+if 'upload_job_applied' not in st.session_state:
+    st.session_state.upload_job_applied = None
+if 'upload_preview_applied' not in st.session_state:
+    st.session_state.upload_preview_applied = None
+if 'render_key' not in st.session_state:
+    st.session_state.render_key = None
+if 'layout_key' not in st.session_state:
+    st.session_state.layout_key = None
+if 'timeline_requested' not in st.session_state:
+    st.session_state.timeline_requested = None
+if 'timeline_applied' not in st.session_state:
+    st.session_state.timeline_applied = None
+
+@st.cache_resource
+def get_artifact_store():
+    """Artifact store shared by every session on this server."""
+    return ArtifactStore(memory_budget=ARTIFACT_MEMORY_BUDGET, disk_budget=ARTIFACT_DISK_BUDGET)
+
+def put_artifact(name, value):
+    """Keep a large value in the artifact store and only its handle in session state."""
+    if value is None:
+        st.session_state[name] = None
+    else:
+        st.session_state[name] = get_artifact_store().put(st.session_state.session_id, name, value)
+
+def get_artifact(name):
+    """Look up a value stored with put_artifact, None if missing or dropped."""
+    handle = st.session_state.get(name)
+    return get_artifact_store().get(handle) if handle else None
+
+# Download payloads kept per session, oldest dropped first
+MAX_CACHED_PAYLOADS = 12
+
+# Fixed seed so the same text and settings always give the same layout,
+# which keeps cached download payloads valid across reruns
+LAYOUT_RANDOM_STATE = 42
+
+# Large session values (texts, images, layouts) share this budget across all sessions
+# before being compressed and then spilled to disk
+ARTIFACT_MEMORY_BUDGET = int(os.getenv("WORDCLOUD_ARTIFACT_MEMORY_MB", "512")) * 2**20
+ARTIFACT_DISK_BUDGET = int(os.getenv("WORDCLOUD_ARTIFACT_DISK_MB", "4096")) * 2**20
+
+# Artifacts of sessions that have not run the script for this long are released
+ARTIFACT_SESSION_TTL = int(os.getenv("WORDCLOUD_ARTIFACT_SESSION_TTL_MIN", "60")) * 60
+
+# Render worker processes and the most renders that may wait for them
+RENDER_WORKERS = int(os.getenv("WORDCLOUD_RENDER_WORKERS", str(os.cpu_count() or 1)))
+RENDER_QUEUE_SIZE = int(os.getenv("WORDCLOUD_RENDER_QUEUE", "32"))
+
+# Longest a script run waits for one render, queueing included
+RENDER_TIMEOUT = int(os.getenv("WORDCLOUD_RENDER_TIMEOUT", "300"))
+
+# Word counts of processed documents are kept in this SQLite file, if set
+CORPUS_DB = os.getenv("WORDCLOUD_CORPUS_DB")
+
+# Widest image sent to the page; larger clouds are shown scaled down
+DISPLAY_MAX_WIDTH = 1460
+
+# Size of the frames of timeline animations
+TIMELINE_FRAME_SIZE = (800, 450)
+
+# Size of the clouds in comparison grids, timelines and corpus views
+COMPARISON_CLOUD_SIZE = (600, 400)
+
+# Start render workers with the server and preload the most used presets
+RENDER_WARM_UP = os.getenv("WORDCLOUD_RENDER_WARM_UP", "1") == "1"
+
+# Shapes offered in the sidebar
+CLOUD_SHAPES = ["Rectangle", "Cloud", "Circle", "Heart", "Star"]
+CUSTOM_IMAGE_SHAPE = "Custom Image"
+
+# Counting options: longest phrase counted, and how words are normalized
+TERM_LENGTHS = {"Single Words": 1, "Up to 2-Word Phrases": 2, "Up to 3-Word Phrases": 3}
+WORD_FORM_OPTIONS = {"As Written": "words", "Lemmatized": "lemmas", "Stemmed": "stems"}
+DEFAULT_COUNTING_MODE = (1, "words")
+
+# Coloring options: a colormap color per word, or a gradient across the cloud
+COLORING_OPTIONS = {"By Word": "words", "Gradient": "gradient"}
+
+# Render request fields identified by the text id instead of their values; uploaded mask
+# images are identified by the hash in the shape name
+RENDER_INPUT_FIELDS = ('text', 'frequencies', 'mask_image')
+
+# Render request fields that only change colors; the layout and its label map are kept
+LOOK_FIELDS = ('colormap', 'background_color', 'color_scheme', 'settings')
+
+# Widget keys already created during this script run
+widget_keys_this_run = set()
+
+# Word cloud displays already shown during this script run, by render identity
+rendered_this_run = set()
+
+# Seconds between reruns while background jobs are running
+JOB_POLL_INTERVAL = 0.5
+
+# Set when a background job is still running, so the script reruns to poll it
+jobs_pending = False
 
 # Function to check if settings have changed
 def settings_changed():
@@ -194,7 +319,9 @@ def settings_changed():
         'width': st.session_state.wc_width,
         'height': st.session_state.wc_height,
         'cloud_shape': cloud_shape,
-        'show_border': show_border
+        'show_border': show_border,
+        'counting_mode': get_counting_mode(),
+        'color_scheme': get_color_scheme()
     }
     
     if 'last_settings' not in st.session_state:
@@ -205,169 +332,243 @@ def settings_changed():
     st.session_state.last_settings = current_settings
     return changed
 
-def extract_text_from_pdf(file):
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
-
-def extract_text_from_docx(file):
-    """Extract text from a DOCX file."""
-    doc = Document(file)
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
-    return '\n'.join(full_text)
-
-def extract_text_from_txt(file):
-    return file.getvalue().decode("utf-8")
-
-def preprocess_text(text):
-    # Remove special characters, numbers, and extra whitespace
-    text = re.sub(r'[^\w\s]', '', text)
-    text = re.sub(r'\d+', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    words = text.split()
-    filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
-    
-    return ' '.join(filtered_words)
-
-def create_shape_mask(shape, width, height):
-    """Create a mask image for the word cloud in the specified shape."""
-    mask = Image.new("L", (width, height), 255)  # White background
-    draw = ImageDraw.Draw(mask)
-    
-    if shape == "Cloud":
-        # Draw a cloud-like shape
-        center_x, center_y = width // 2, height // 2
-        radius_x, radius_y = width // 2 - 50, height // 2 - 50
-        
-        # Main ellipse
-        draw.ellipse([center_x - radius_x, center_y - radius_y, 
-                      center_x + radius_x, center_y + radius_y], fill=0)
-        
-        # Additional bumps to make it cloud-like
-        draw.ellipse([center_x - radius_x//2, center_y - radius_y - 30, 
-                      center_x + radius_x//2, center_y - radius_y//2], fill=0)
-        
-        draw.ellipse([center_x + radius_x//2, center_y - radius_y//2, 
-                      center_x + radius_x + 30, center_y + radius_y//2], fill=0)
-        
-        draw.ellipse([center_x - radius_x - 30, center_y - radius_y//2, 
-                      center_x - radius_x//2, center_y + radius_y//2], fill=0)
-        
-    elif shape == "Circle":
-        # Simple circle with minimal margin
-        padding = 20  # Reduced from 50
-        draw.ellipse([padding, padding, width - padding, height - padding], fill=0)
-        
-    elif shape == "Rectangle":
-        # Rectangle with rounded corners
-        padding = 50
-        draw.rectangle([padding, padding, width - padding, height - padding], fill=0)
-        
-    elif shape == "Heart":
-        # Heart shape with minimal margin
-        center_x, center_y = width // 2, height // 2
-        size = min(width, height) // 2 - 20  # Reduced from 50
-        
-        # Create a proper heart shape
-        # Define the heart as a polygon with carefully placed points
-        points = []
-        
-        # Use parametric equation for heart shape
-        # x = 16 * sin(t)^3
-        # y = 13 * cos(t) - 5 * cos(2t) - 2 * cos(3t) - cos(4t)
-        scale = size / 16  # Scale to fit our desired size
-        
-        for t in np.linspace(0, 2*np.pi, 100):
-            x = center_x + scale * 16 * np.sin(t)**3
-            # Flip the y-coordinate to make the heart right-side up
-            y = center_y - scale * (13*np.cos(t) - 5*np.cos(2*t) - 2*np.cos(3*t) - np.cos(4*t))
-            points.append((x, y))
-        
-        # Draw the heart shape
-        draw.polygon(points, fill=0)
-    
-    elif shape == "Star":
-        # Star shape with minimal margin
-        center_x, center_y = width // 2, height // 2
-        outer_radius = min(width, height) // 2 - 20  # Reduced from 50
-        inner_radius = outer_radius // 2
-        num_points = 5
-        
-        # Calculate star points
-        points = []
-        for i in range(num_points * 2):
-            radius = outer_radius if i % 2 == 0 else inner_radius
-            angle = i * 3.14159 / num_points
-            x = center_x + radius * np.sin(angle)
-            y = center_y + radius * np.cos(angle)
-            points.append((x, y))
-        
-        draw.polygon(points, fill=0)
+def generate_word_cloud(text, max_words=100, width=800, height=400, colormap='viridis', 
+                        background_color='white', shape='Rectangle', frequencies=None, text_id=None):
+    """Render the word cloud in the shared render pool and store the image and layout.
+    
+    text_id identifies the text and its counting mode (see current_text_id); it is
+    hashed from the text when not given.
+    """
+    if text_id is None:
+        text_id = text_hash(text)
+    request = {
+        'text': text,
+        # Precomputed counts (phrases, lemmas, stems) are used as they are
+        'frequencies': frequencies.to_dict() if frequencies is not None else None,
+        'plan': get_render_plan(width, height).to_dict(),
+        'max_words': max_words,
+        'colormap': colormap,
+        'color_scheme': get_color_scheme(),
+        'background_color': background_color,
+        'shape': shape,
+        'mask_image': get_mask_image(shape),
+        'random_state': LAYOUT_RANDOM_STATE,
+        'settings': {'colormap': colormap, 'shape': shape, 'max_words': max_words},
+    }
+    
+    # The image and layout from the last run are reused if nothing changed
+    key = render_key(request, text_id)
+    if st.session_state.render_key == key:
+        layout = get_artifact('current_layout')
+        if layout is not None and get_artifact('wordcloud_image') is not None:
+            return layout
+    
+    # Color changes repaint the last layout from its label map instead of rendering again
+    layout_key = render_key(request, text_id, ignore=LOOK_FIELDS)
+    if st.session_state.layout_key == layout_key:
+        layout = get_artifact('current_layout')
+        label_map = get_artifact('current_label_map')
+        if layout is not None and label_map is not None:
+            layout, image = paint_cloud(layout, label_map, request)
+            put_artifact('wordcloud_image', image)
+            put_artifact('current_layout', layout)
+            st.session_state.render_key = key
+            return layout
     
-    else:  # Default to rectangle if shape not recognized
-        padding = 50
-        draw.rectangle([padding, padding, width - padding, height - padding], fill=0)
+    # Raises RenderQueueFull when the server is saturated
+    pool = get_render_pool()
+    future = pool.submit(st.session_state.session_id, request, render_priority(width, height))
     
-    return np.array(mask)
+    with st.spinner("Rendering word cloud..."):
+        status = st.empty()
+        deadline = time.monotonic() + RENDER_TIMEOUT
+        while True:
+            try:
+                layout, image, label_map = future.result(timeout=JOB_POLL_INTERVAL)
+                break
+            except FuturesTimeout:
+                if time.monotonic() > deadline:
+                    future.cancel()
+                    status.empty()
+                    raise RuntimeError(f"Rendering took longer than {RENDER_TIMEOUT} seconds")
+                position = pool.position(st.session_state.session_id)
+                if position:
+                    status.caption(f"Waiting for a render worker ({position} in queue)")
+        status.empty()
+    
+    # Save the wordcloud image, layout and label map to the artifact store
+    put_artifact('wordcloud_image', image)
+    put_artifact('current_layout', layout)
+    put_artifact('current_label_map', label_map)
+    st.session_state.render_key = key
+    st.session_state.layout_key = layout_key
+    
+    return layout
 
-def generate_word_cloud(text, max_words=100, width=800, height=400, colormap='viridis', 
-                        background_color='white', shape='Rectangle'):
+def render_key(request, text_id, ignore=()):
+    """Identity of a render request; equal keys always give the same image.
     
-    # Create word cloud
-    wordcloud = WordCloud(
-        width=width,
-        height=height,
-        max_words=max_words,
-        background_color=background_color,
-        colormap=colormap,
-        prefer_horizontal=0.9,
-        collocations=True,
-        min_font_size=4,
-        mode="RGB",
-        mask=create_shape_mask(shape, width, height)
-    ).generate(text)
-    
-    # Save the wordcloud image to session state
-    st.session_state.wordcloud_image = wordcloud.to_array()
-    st.session_state.current_wordcloud = wordcloud
-    
-    return wordcloud
-
-def process_text_once(text):
-    """Process text once and store the results for reuse"""
+    The text and the frequencies counted from it are identified by text_id, so
+    they are never hashed here. Fields named in ignore are left out, so ignoring
+    LOOK_FIELDS identifies the layout.
+    """
+    digest = hashlib.sha1(f"text={text_id}|".encode("utf-8"))
+    for name, value in request.items():
+        if name not in RENDER_INPUT_FIELDS and name not in ignore:
+            digest.update(f"{name}={value!r}|".encode("utf-8"))
+    return digest.hexdigest()
+
+def get_counting_mode():
+    """Longest phrase length and word form selected in the sidebar."""
+    return (TERM_LENGTHS[st.session_state.get('term_length', "Single Words")],
+            WORD_FORM_OPTIONS[st.session_state.get('word_form', "As Written")])
+
+def get_color_scheme():
+    """Coloring selected in the sidebar, as a cloud_layout color scheme."""
+    return COLORING_OPTIONS[st.session_state.get('color_scheme', "By Word")]
+
+def text_hash(text):
+    """Identity of a text, computed once when it becomes the current word cloud input."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def current_text_id():
+    """Identity of the current word cloud text and the way its words were counted."""
+    return f"{st.session_state.current_wordcloud_text_hash}|{st.session_state.current_counting_mode}"
+
+def process_text_once(text, counting_mode=DEFAULT_COUNTING_MODE):
+    """Count already processed text once and store the results for reuse.
+    
+    Preprocessing is not repeated: stopword filtering is not idempotent, as text
+    without its English stopwords may be detected as another language. The text
+    is only hashed when it is not already the current text.
+    """
     if not text:
         return None
     
-    # Check if we've already processed this text
-    if st.session_state.current_wordcloud_text == text:
-        return text  # Return the text, not the wordcloud object
+    # Comparing with the current text is cheaper than hashing it, and free for the same object
+    current_text = get_artifact('current_wordcloud_text')
+    if text is not current_text and text != current_text:
+        put_artifact('current_wordcloud_text', text)
+        st.session_state.current_wordcloud_text_hash = text_hash(text)
+        st.session_state.current_counting_mode = None
+    
+    # Store word frequencies for reuse, once per counting mode
+    if st.session_state.current_counting_mode != counting_mode:
+        st.session_state.word_frequencies = get_all_words(text, max_words=400, counting_mode=counting_mode)
+        st.session_state.current_counting_mode = counting_mode
+    
+    return text
+
+def set_current_text(processed_text, frequencies):
+    """Use already processed text and its single word counts as the current word cloud input."""
+    st.session_state.word_frequencies = frequencies
+    put_artifact('current_wordcloud_text', processed_text)
+    st.session_state.current_wordcloud_text_hash = text_hash(processed_text)
+    st.session_state.current_counting_mode = DEFAULT_COUNTING_MODE
+
+def get_all_words(text, max_words=400, counting_mode=DEFAULT_COUNTING_MODE):
+    max_n, word_form = counting_mode
+    return count_terms(text.split(), max_n=max_n, word_form=word_form, max_terms=max_words)
+
+def build_cloud_figure(image, width, height, colormap, shape, show_border, mask_size=None):
+    """Draw the word cloud image, and optionally the shape border, on a figure.
+    
+    mask_size is the resolution the words were laid out at, if not the image size.
+    """
+    # Create a figure for the word cloud, sized by the image (a preview for poster sizes)
+    fig, ax = plt.subplots(figsize=(image.shape[1]/100, image.shape[0]/100))
+    
+    # Display the word cloud image
+    ax.imshow(image, interpolation='bilinear')
+    
+    # Add border if requested
+    if show_border:
+        # Border pixels: inside the shape with a neighbor outside it, stretched
+        # from the layout resolution to the image
+        mask_width, mask_height = mask_size or (width, height)
+        contour = get_mask(shape, mask_width, mask_height).contour
+        rows = np.arange(image.shape[0]) * contour.shape[0] // image.shape[0]
+        cols = np.arange(image.shape[1]) * contour.shape[1] // image.shape[1]
+        border = contour[np.ix_(rows, cols)]
+        
+        # Color border pixels by their position (creates a gradient)
+        cmap = plt.cm.get_cmap(colormap)
+        border_rgba = np.zeros((border.shape[0], border.shape[1], 4), dtype=np.float32)
+        rows, cols = np.nonzero(border)
+        border_rgba[rows, cols] = cmap((rows + cols) / (border.shape[0] + border.shape[1]))
+        
+        # Overlay the border on the word cloud
+        ax.imshow(border_rgba, interpolation='bilinear')
+    
+    ax.axis('off')
+    return fig
+
+def build_cloud_preview(image, width, height, colormap, shape, show_border, mask_size=None):
+    """The word cloud image as shown on the page, with the shape border painted in.
     
-    # Process new text
-    processed_text = preprocess_text(text)
+    Images wider than DISPLAY_MAX_WIDTH are scaled down first, so a change of
+    colors at 4K only sends a screen-sized image.
+    """
+    if image.shape[1] > DISPLAY_MAX_WIDTH:
+        preview_height = max(round(image.shape[0] * DISPLAY_MAX_WIDTH / image.shape[1]), 1)
+        image = np.asarray(Image.fromarray(image).resize((DISPLAY_MAX_WIDTH, preview_height), Image.BILINEAR))
+    image = image.copy()
     
-    # Store word frequencies for reuse
-    st.session_state.word_frequencies = get_all_words(processed_text, max_words=400)
-    st.session_state.current_wordcloud_text = text
+    if show_border:
+        # Same border and gradient as build_cloud_figure, looked up from the gradient palette
+        mask_width, mask_height = mask_size or (width, height)
+        contour = get_mask(shape, mask_width, mask_height).contour
+        rows = np.arange(image.shape[0]) * contour.shape[0] // image.shape[0]
+        cols = np.arange(image.shape[1]) * contour.shape[1] // image.shape[1]
+        rows, cols = np.nonzero(contour[np.ix_(rows, cols)])
+        steps = (rows + cols) * GRADIENT_STEPS // (image.shape[0] + image.shape[1])
+        image[rows, cols] = gradient_palette(colormap)[steps]
     
-    return processed_text
+    return image
+
+def build_cloud_png(image, width, height, colormap, shape, show_border, mask_size=None):
+    """Encode the word cloud figure as a 300 dpi PNG."""
+    fig = build_cloud_figure(image, width, height, colormap, shape, show_border, mask_size)
+    download_buf = BytesIO()
+    fig.savefig(download_buf, format='png', dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    return download_buf.getvalue()
+
+def build_tiled_png(job, layout, width, height, colormap, shape, show_border):
+    """Background job: encode a full-size PNG from the layout, rasterized in strips to bound memory."""
+    contour = get_mask(shape, layout['width'], layout['height']).contour if show_border else None
+    png_buf = BytesIO()
+    write_png(layout, png_buf, size=(width, height), dpi=300, contour=contour, contour_colormap=colormap,
+              progress=lambda fraction: job.set_progress(fraction, f"{fraction:.0%} of rows"))
+    return png_buf.getvalue()
 
-def get_all_words(text, max_words=400):
-    words = text.split()
-    word_counts = Counter(words)
-    return word_counts.most_common(max_words)
+def get_cached_payload(key, builder=None):
+    """Return a download payload cached for the session, building it if a builder is given.
+    
+    Payloads live in the artifact store; the session keeps their handles by key.
+    """
+    handles = st.session_state.download_payloads
+    store = get_artifact_store()
+    if key in handles:
+        payload = store.get(handles[key])
+        if payload is not None:
+            return payload
+        # Dropped by the store under memory pressure
+        del handles[key]
+    if builder is None:
+        return None
+    
+    payload = builder()
+    handles[key] = store.put(st.session_state.session_id, f"payload_{key}", payload)
+    
+    # Only keep the most recent payloads
+    while len(handles) > MAX_CACHED_PAYLOADS:
+        store.delete(handles.pop(next(iter(handles))))
+    return payload
 
 def display_word_cloud(text, max_words=100, width=800, height=400, colormap='viridis', 
                       background_color='white', source_text="Document", shape="Rectangle", show_border=False):
+    global jobs_pending
     
     if not text:
         st.warning("Please enter some text or upload a document to generate a word cloud.")
@@ -375,11 +576,27 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
     
     try:
         # Process text only once
-        processed_text = process_text_once(text)
+        counting_mode = get_counting_mode()
+        processed_text = process_text_once(text, counting_mode)
+        
+        # The same text and settings are only shown once per run
+        text_id = current_text_id()
+        display_id = hashlib.sha1(
+            f"{text_id}|{max_words}|{width}x{height}|{colormap}|{get_color_scheme()}|"
+            f"{background_color}|{shape}|{show_border}|{source_text}".encode("utf-8")
+        ).hexdigest()
+        if display_id in rendered_this_run:
+            return
+        rendered_this_run.add(display_id)
+        
+        # Phrase and word form modes feed the counted terms straight to the cloud
+        frequencies = None
+        if counting_mode != DEFAULT_COUNTING_MODE:
+            frequencies = st.session_state.word_frequencies.top(max_words)
         
         # Generate word cloud with current settings
-        wordcloud = generate_word_cloud(
-            processed_text, max_words, width, height, colormap, background_color, shape
+        generate_word_cloud(
+            processed_text, max_words, width, height, colormap, background_color, shape, frequencies, text_id
         )
         
         # Store current source text
@@ -393,66 +610,90 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
             st.subheader("Word Cloud")
             st.caption(f"Generated from: {source_text}")
             
-            # Create a figure for the word cloud
-            fig, ax = plt.subplots(figsize=(width/100, height/100))
+            # Display the image, scaled down to the page
+            image = get_artifact('wordcloud_image')
+            layout = get_artifact('current_layout')
+            mask_size = (layout['width'], layout['height'])
+            st.image(build_cloud_preview(image, width, height, colormap, shape, show_border, mask_size),
+                     use_column_width=True)
             
-            # Display the word cloud image
-            ax.imshow(wordcloud.to_array(), interpolation='bilinear')
+            # Poster sizes are previewed; large PNGs are rasterized at full size in strips
+            plan = get_render_plan(width, height)
+            tiled = plan.tiled_png
+            if plan.preview_only:
+                st.caption(f"Preview at {image.shape[1]}x{image.shape[0]}; "
+                           f"the PNG download is rendered at {width}x{height}.")
             
-            # Add border if requested
-            if show_border:
-                # Get shape mask
-                mask = create_shape_mask(shape, width, height)
-                
-                # Find the border pixels (where mask is 0 but neighbors include non-zero values)
-                border = np.zeros_like(mask)
-                for i in range(1, mask.shape[0]-1):
-                    for j in range(1, mask.shape[1]-1):
-                        if mask[i, j] == 0:  # If this is part of the shape
-                            # Check if any neighbor is not part of the shape
-                            if (mask[i-1:i+2, j-1:j+2] > 0).any():
-                                border[i, j] = 1  # This is a border pixel
-                
-                # Create a colormap for the border
-                cmap = plt.cm.get_cmap(colormap)
-                border_rgba = np.zeros((border.shape[0], border.shape[1], 4))
-                
-                # Set border pixels to the colormap colors
-                for i in range(border.shape[0]):
-                    for j in range(border.shape[1]):
-                        if border[i, j] > 0:
-                            # Use position in the border to determine color (creates a gradient)
-                            position = (i + j) / (border.shape[0] + border.shape[1])
-                            border_rgba[i, j] = cmap(position)
-                
-                # Create a separate border image
-                border_img = np.zeros((border.shape[0], border.shape[1], 4))
-                border_img[border > 0] = border_rgba[border > 0]
-                
-                # Overlay the border on the word cloud
-                ax.imshow(border_img, interpolation='bilinear')
-            
-            ax.axis('off')
-            
-            # Display the figure
-            st.pyplot(fig)
-            
-            # Save the figure to a buffer for download
-            download_buf = BytesIO()
-            fig.savefig(download_buf, format='png', dpi=300, bbox_inches='tight')
-            download_buf.seek(0)
+            # Payloads are keyed by the render that made the layout and image, so reruns reuse them
+            payload_key = f"{st.session_state.render_key}|{show_border}"
+            file_stem = f"wordcloud_{source_text.replace(' ', '_').lower()}"
             
             # Use a container to prevent the download button from affecting the display
             download_container = st.container()
             with download_container:
-                # Use a unique key based on timestamp to prevent conflicts
-                unique_key = f"download_wordcloud_{hash(source_text)}_{int(time.time())}"
+                # The 300 dpi PNG is only encoded once someone asks for it
+                png_key = f"png_{payload_key}"
+                png_job_id = f"{png_key}_{st.session_state.session_id}"
+                png_data = get_cached_payload(png_key)
+                png_job = job_registry.get(png_job_id) if png_data is None else None
+                prepare_key = f"prepare_png_{payload_key}"
+                if png_data is None and png_job is None and prepare_key not in widget_keys_this_run:
+                    widget_keys_this_run.add(prepare_key)
+                    if st.button("Prepare PNG Download", key=prepare_key):
+                        if tiled:
+                            # Large PNGs are rasterized by a background job, polled on each rerun
+                            png_job = job_registry.submit(png_job_id, build_tiled_png, layout, width, height,
+                                                          colormap, shape, show_border)
+                        else:
+                            with st.spinner("Rendering PNG..."):
+                                png_data = get_cached_payload(
+                                    png_key,
+                                    lambda: build_cloud_png(image, width, height,
+                                                            colormap, shape, show_border, mask_size)
+                                )
+                if png_job is not None:
+                    if png_job.active:
+                        st.progress(png_job.progress, text=f"Rendering PNG: {png_job.message}")
+                        jobs_pending = True
+                    else:
+                        # The PNG moves to the artifact store; the session keeps only its handle
+                        if png_job.status == DONE:
+                            png_data = get_cached_payload(png_key, lambda: png_job.result)
+                        else:
+                            st.error(f"Error rendering PNG: {png_job.message}")
+                        job_registry.forget(png_job_id)
+                if png_data is not None:
+                    # Keys follow the content, so unchanged buttons keep their identity across reruns
+                    unique_key = f"download_wordcloud_{display_id}"
+                    st.download_button(
+                        label="Download Word Cloud as PNG",
+                        data=png_data,
+                        file_name=f"{file_stem}.png",
+                        mime="image/png",
+                        key=unique_key
+                    )
+                
+                # SVG is written straight from the layout, no rasterization needed
+                svg_data = get_cached_payload(
+                    f"svg_{payload_key}", lambda: write_svg(layout, BytesIO()).getvalue()
+                )
+                svg_key = f"download_svg_{display_id}"
                 st.download_button(
-                    label="Download Word Cloud as PNG",
-                    data=download_buf,
-                    file_name=f"wordcloud_{source_text.replace(' ', '_').lower()}.png",
-                    mime="image/png",
-                    key=unique_key
+                    label="Download Word Cloud as SVG",
+                    data=svg_data,
+                    file_name=f"{file_stem}.svg",
+                    mime="image/svg+xml",
+                    key=svg_key
+                )
+                
+                # The layout can be reloaded later and redrawn in any color scheme
+                layout_key = f"download_layout_{display_id}"
+                st.download_button(
+                    label="Download Word Cloud Layout",
+                    data=get_cached_payload(f"layout_{payload_key}", lambda: layout_to_json(layout)),
+                    file_name=f"{file_stem}.layout.json",
+                    mime="application/json",
+                    key=layout_key
                 )
         
         # Display word frequency
@@ -462,8 +703,8 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
             # Use stored word frequencies
             all_words = st.session_state.word_frequencies
             
-            # Create DataFrame for display
-            df = pd.DataFrame(all_words, columns=["Word", "Count"])
+            # DataFrame view over the table's arrays
+            df = all_words.to_dataframe()
             
             # Display with pagination
             st.dataframe(df, use_container_width=True, height=400)
@@ -472,11 +713,11 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
             csv_download = st.container()
             txt_download = st.container()
             
-            # Download word frequency data
-            csv = df.to_csv(index=False)
+            # Download word frequency data (exports are cached on the table)
+            csv = all_words.to_csv()
             with csv_download:
-                # Use unique keys for each download button
-                csv_key = f"download_csv_{hash(source_text)}_{int(time.time())}"
+                # Keys follow the content and settings shown
+                csv_key = f"download_csv_{display_id}"
                 st.download_button(
                     label="Download Word Frequency CSV",
                     data=csv,
@@ -486,10 +727,10 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
                 )
             
             # Download as TXT file with all words
-            txt_content = "\n".join([f"{word}: {count}" for word, count in all_words])
+            txt_content = all_words.to_txt()
             with txt_download:
-                # Use unique keys for each download button
-                txt_key = f"download_txt_{hash(source_text)}_{int(time.time())}"
+                # Keys follow the content and settings shown
+                txt_key = f"download_txt_{display_id}"
                 st.download_button(
                     label="Download Word Frequency TXT",
                     data=txt_content,
@@ -497,12 +738,269 @@ def display_word_cloud(text, max_words=100, width=800, height=400, colormap='vir
                     mime="text/plain",
                     key=txt_key
                 )
+    except RenderQueueFull:
+        st.warning("The server is busy rendering other word clouds. Please try again in a moment.")
     except Exception as e:
         st.error(f"Error generating word cloud: {str(e)}")
         import traceback
         st.error(traceback.format_exc())
 
-def save_to_docx(text, filename):
+@st.cache_resource
+def get_process_pool():
+    """Process pool shared by every session on this server, never forked from the server."""
+    return new_process_pool(os.cpu_count())
+
+@st.cache_resource
+def get_render_pool():
+    """Render worker pool shared by every session on this server."""
+    plans = warm_plans() if RENDER_WARM_UP else []
+    warm_masks = [(shape, plan.layout_width, plan.layout_height) for shape in CLOUD_SHAPES for plan in plans]
+    warm_requests = [{
+        'text': "word cloud warm up render",
+        'plan': plan.to_dict(),
+        'max_words': 10,
+        'colormap': 'viridis',
+        'background_color': 'white',
+        'shape': "Rectangle",
+    } for plan in plans]
+    pool = RenderPool(max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_SIZE,
+                      warm_masks=warm_masks, warm_requests=warm_requests)
+    if RENDER_WARM_UP:
+        pool.warm_up()
+    return pool
+
+@st.cache_resource
+def get_corpus_index():
+    """Corpus index shared by every session on this server, None if not configured."""
+    return CorpusIndex(CORPUS_DB) if CORPUS_DB else None
+
+@st.cache_resource
+def get_job_registry():
+    """Background job registry shared by every session on this server."""
+    return JobRegistry(max_workers=4)
+
+def run_document_comparison(files):
+    """Count several uploaded documents in parallel and store the comparison."""
+    progress = st.progress(0.0, text="Processing documents...")
+    statuses = [st.empty() for _ in files]
+    for status in statuses:
+        status.caption("Queued")
+    
+    # Results are kept by upload position, so files with the same name stay apart
+    documents = [(file.name, file.getvalue(), file.type) for file in files]
+    digests = [hashlib.sha1(data).hexdigest() for _, data, _ in documents]
+    corpus = get_corpus_index()
+    results = {}
+    try:
+        for index, name, word_count, word_counts in count_documents(get_process_pool(), documents):
+            results[index] = (word_count, word_counts)
+            if corpus is not None:
+                corpus.add_document(digests[index], name, word_count, word_counts)
+            statuses[index].caption(f"**{name}**: {word_count} words, {len(word_counts)} distinct")
+            progress.progress(len(results) / len(documents), text=f"Processed {len(results)} of {len(documents)}")
+    except Exception as e:
+        st.error(f"Error processing documents: {str(e)}")
+        return
+    
+    # Keep upload order for the grid
+    names = [file.name for file in files]
+    counts = [results[index][1] for index in range(len(files))]
+    combined, global_max, distinctive = compare_counts(counts, max_words=500)
+    put_artifact('comparison', {
+        'names': names,
+        'word_counts': [results[index][0] for index in range(len(files))],
+        'counts': counts,
+        'combined': FrequencyTable.from_counts(combined),
+        'global_max': global_max,
+        'distinctive': distinctive,
+    })
+    progress.empty()
+    for status in statuses:
+        status.empty()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_comparison_cloud(frequencies, max_words, colormap, background_color, color_scale_max=None):
+    """Render a small cloud from frequencies in the render pool, on a shared color scale if one is given.
+    
+    Raises RenderQueueFull when the server is saturated.
+    """
+    request = {
+        'text': None,
+        'frequencies': frequencies,
+        'plan': get_render_plan(*COMPARISON_CLOUD_SIZE).to_dict(),
+        'max_words': max_words,
+        'colormap': colormap,
+        'background_color': background_color,
+        'shape': "Rectangle",
+        'random_state': LAYOUT_RANDOM_STATE,
+        'color_scale_max': color_scale_max,
+    }
+    future = get_render_pool().submit(st.session_state.session_id, request, PREVIEW)
+    try:
+        return future.result(timeout=RENDER_TIMEOUT)[1]
+    except FuturesTimeout:
+        future.cancel()
+        raise RuntimeError(f"Rendering took longer than {RENDER_TIMEOUT} seconds")
+
+def show_comparison_cloud(frequencies, max_words, colormap, background_color, color_scale_max=None):
+    """Show a small cloud from frequencies, or a notice while the server is busy."""
+    try:
+        image = render_comparison_cloud(frequencies, max_words, colormap, background_color, color_scale_max)
+    except RenderQueueFull:
+        st.warning("The server is busy rendering other word clouds. Please try again in a moment.")
+        return
+    st.image(image, use_column_width=True)
+
+def display_document_comparison(comparison, max_words, colormap, background_color, columns=3):
+    """Show a grid of per-document clouds plus the combined frequency table."""
+    st.subheader("Document Comparison")
+    st.caption("Word clouds share one color scale: the same color means the same count in every document.")
+    
+    items = list(zip(comparison['names'], comparison['word_counts'], comparison['counts'],
+                     comparison['distinctive']))
+    for row_start in range(0, len(items), columns):
+        grid = st.columns(columns)
+        for col, (name, word_count, counts, distinctive) in zip(grid, items[row_start:row_start + columns]):
+            with col:
+                st.markdown(f"**{name}**")
+                st.caption(f"{word_count} words")
+                if not counts:
+                    st.info("No words found")
+                    continue
+                show_comparison_cloud(dict(counts), max_words, colormap, background_color,
+                                      comparison['global_max'])
+                with st.expander("Distinctive words (TF-IDF)"):
+                    show_comparison_cloud(distinctive, max_words, colormap, background_color)
+    
+    st.subheader("Combined Word Frequency")
+    combined = comparison['combined']
+    st.dataframe(combined.to_dataframe(), use_container_width=True, height=400)
+    st.download_button(
+        label="Download Combined Frequency CSV",
+        data=combined.to_csv(),
+        file_name="word_frequency_combined.csv",
+        mime="text/csv",
+        key="download_combined_csv"
+    )
+
+def render_timeline_gif(timeline, frames, max_words, colormap, background_color, shape):
+    """Render one cloud per frame in the render pool and encode them as an animated GIF."""
+    width, height = TIMELINE_FRAME_SIZE
+    plan = get_render_plan(width, height).to_dict()
+    requests = [{
+        'text': None,
+        'frequencies': terms.to_dict(),
+        'plan': plan,
+        'max_words': max_words,
+        'colormap': colormap,
+        'color_scheme': get_color_scheme(),
+        'background_color': background_color,
+        'shape': shape,
+        'mask_image': get_mask_image(shape),
+        'random_state': LAYOUT_RANDOM_STATE,
+    } for terms in (timeline.top_terms(start, end, max_words) for start, end in frames) if terms]
+    if not requests:
+        return None
+    
+    # Workers reuse their cached masks and fonts; submit a batch per worker to stay within the queue
+    pool = get_render_pool()
+    images = []
+    progress = st.progress(0.0, text="Rendering frames...")
+    for batch_start in range(0, len(requests), pool.max_workers):
+        futures = [pool.submit(st.session_state.session_id, request, PREVIEW)
+                   for request in requests[batch_start:batch_start + pool.max_workers]]
+        deadline = time.monotonic() + RENDER_TIMEOUT
+        try:
+            images.extend(future.result(timeout=max(deadline - time.monotonic(), 0))[1] for future in futures)
+        except FuturesTimeout:
+            for future in futures:
+                future.cancel()
+            progress.empty()
+            raise RuntimeError(f"Rendering a frame took longer than {RENDER_TIMEOUT} seconds")
+        progress.progress(len(images) / len(requests), text=f"Rendered {len(images)} of {len(requests)} frames")
+    progress.empty()
+    return encode_gif(images)
+
+def display_section_timeline(data, file_type, job_id, max_words, colormap, background_color, shape):
+    """Show clouds over ranges of sections and an animation across the document.
+    
+    Returns True while the sections are still being counted.
+    """
+    timeline_id = f"timeline-{job_id}"
+    timeline = get_artifact('document_timeline') if st.session_state.timeline_applied == timeline_id else None
+    if timeline is None:
+        if st.session_state.timeline_requested != timeline_id:
+            st.caption("Count every page or section once, then compare the words of any range of them.")
+            if not st.button("Build Timeline", key="build_timeline_btn"):
+                return False
+            st.session_state.timeline_requested = timeline_id
+        
+        job = job_registry.submit(timeline_id, count_sections, data, file_type, restart=True)
+        if job.active:
+            st.progress(job.progress, text=f"Building timeline: {job.message}")
+            return True
+        if job.status != DONE:
+            st.error(f"Error building timeline: {job.message}")
+            st.session_state.timeline_requested = None
+            return False
+        timeline = job.result
+        job_registry.forget(timeline_id)
+        put_artifact('document_timeline', timeline)
+        st.session_state.timeline_applied = timeline_id
+    
+    if not len(timeline):
+        st.info("No sections found in the document.")
+        return False
+    
+    # Any range is the difference of two prefix rows, no re-counting needed
+    if len(timeline) > 1:
+        start, end = st.select_slider("Sections", options=list(range(len(timeline))),
+                                      value=(0, len(timeline) - 1), format_func=timeline.labels.__getitem__,
+                                      key=f"timeline_range_{timeline_id}")
+    else:
+        start, end = 0, 0
+    query_start = time.perf_counter()
+    terms = timeline.top_terms(start, end + 1, max_words)
+    query_ms = (time.perf_counter() - query_start) * 1000
+    st.caption(f"Top {len(terms)} words of {timeline.range_label(start, end + 1)} in {query_ms:.1f} ms "
+               f"({len(timeline)} sections; the document's top {len(timeline.vocabulary)} words are counted "
+               f"exactly, other words from the sections where they are among the top {SECTION_TOP_TERMS})")
+    if terms:
+        show_comparison_cloud(terms.to_dict(), max_words, colormap, background_color)
+    
+    # Sliding window of sections, one cloud per frame
+    anim_col1, anim_col2 = st.columns(2)
+    with anim_col1:
+        window = st.number_input("Sections per frame", min_value=1, max_value=len(timeline),
+                                 value=max(1, len(timeline) // 10), key=f"timeline_window_{timeline_id}")
+    with anim_col2:
+        step = st.number_input("Step", min_value=1, max_value=len(timeline), value=window,
+                               key=f"timeline_step_{timeline_id}")
+    frames = timeline.frames(window, step)
+    gif_key = f"gif_{timeline_id}|{window}|{step}|{max_words}|{colormap}|{get_color_scheme()}|{background_color}|{shape}"
+    gif_data = get_cached_payload(gif_key)
+    if gif_data is None and st.button(f"Render Animation ({len(frames)} frames)", key="timeline_animate_btn"):
+        try:
+            gif_data = get_cached_payload(gif_key, lambda: render_timeline_gif(
+                timeline, frames, max_words, colormap, background_color, shape))
+        except RenderQueueFull:
+            st.warning("The server is busy rendering other word clouds. Please try again in a moment.")
+        except RuntimeError as e:
+            st.error(f"Error rendering animation: {str(e)}")
+    if gif_data is not None:
+        st.image(gif_data, use_column_width=True)
+        st.download_button(
+            label="Download Animation as GIF",
+            data=gif_data,
+            file_name="wordcloud_timeline.gif",
+            mime="image/gif",
+            key=f"download_timeline_gif_{timeline_id}"
+        )
+    return False
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def save_to_docx(text):
+    """Build a DOCX of the response in memory."""
     doc = Document()
     doc.add_heading('ChatGPT Response', 0)
     
@@ -511,30 +1009,15 @@ def save_to_docx(text, filename):
         if para.strip():
             doc.add_paragraph(para)
     
-    # Save the document
-    doc_path = f"{filename}.docx"
-    doc.save(doc_path)
-    
-    # Read the file to create a download button
-    with open(doc_path, "rb") as file:
-        return file.read()
+    # Save the document to memory for the download button
+    doc_buf = BytesIO()
+    doc.save(doc_buf)
+    return doc_buf.getvalue()
 
 def get_chatgpt_response(prompt):
     """Get response from ChatGPT API."""
     try:
-        import openai
-        openai.api_key = openai_api_key
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
+        return chat_completion(prompt, api_key=openai_api_key)
     except Exception as e:
         st.error(f"Error getting response from ChatGPT: {str(e)}")
         return None
@@ -557,10 +1040,13 @@ with st.sidebar:
             key="colormap"
         )
         
+        # Colors per word, or a gradient across the whole cloud
+        st.selectbox("Coloring", list(COLORING_OPTIONS), key="color_scheme")
+        
         # Shape selection
         cloud_shape = st.selectbox(
             "Shape",
-            ["Rectangle", "Cloud", "Circle", "Heart", "Star"],
+            CLOUD_SHAPES + [CUSTOM_IMAGE_SHAPE],
             key="cloud_shape"
         )
     
@@ -575,78 +1061,53 @@ with st.sidebar:
         # Border toggle
         show_border = st.checkbox("Show Shape Border", value=False, key="show_border")
     
+    # An uploaded image replaces the shape once it is provided
+    if cloud_shape == CUSTOM_IMAGE_SHAPE:
+        mask_file = st.file_uploader(
+            "Mask Image",
+            type=["png", "jpg", "jpeg", "webp", "svg"],
+            key="mask_upload",
+            help="Words fill the dark or opaque parts of the image."
+        )
+        cloud_shape = register_mask_image(mask_file.getvalue()) if mask_file is not None else "Rectangle"
+    
+    # Counting options
+    st.subheader("Counting")
+    count_col1, count_col2 = st.columns(2)
+    with count_col1:
+        st.selectbox("Terms", list(TERM_LENGTHS), key="term_length",
+                     help="Phrases are counted alongside their words, so a word ranks at least as high as its phrases.")
+    with count_col2:
+        st.selectbox("Word Forms", list(WORD_FORM_OPTIONS), key="word_form")
+    
     # Resolution options
     st.subheader("Resolution Settings")
     
     # Aspect ratio selection
     aspect_ratio = st.selectbox(
         "Aspect Ratio",
-        ["16:9", "9:16", "8:10", "10:8", "5:7", "7:5", "6:4", "4:6", "10:4", "10:3", "Square (1:1)", "Custom"],
+        list(ASPECT_RATIOS) + [CUSTOM],
         key="aspect_ratio"
     )
     
     # Resolution presets
     resolution_preset = st.selectbox(
         "Resolution Preset",
-        ["HD (1280x720)", "Full HD (1920x1080)", "2K (2560x1440)", "4K (3840x2160)", "Custom"],
+        list(RESOLUTION_PRESETS) + [CUSTOM],
         key="resolution_preset"
     )
     
     # Set width and height based on selections
-    if aspect_ratio == "Custom" or resolution_preset == "Custom":
+    if aspect_ratio == CUSTOM or resolution_preset == CUSTOM:
         # Custom dimensions
         width_col, height_col = st.columns(2)
         with width_col:
-            width = st.number_input("Width (px)", 400, 4000, 800, 100, key="custom_width")
+            width = st.number_input("Width (px)", 400, MAX_CUSTOM_SIZE, 800, 100, key="custom_width")
         with height_col:
-            height = st.number_input("Height (px)", 400, 4000, 800, 100, key="custom_height")
+            height = st.number_input("Height (px)", 400, MAX_CUSTOM_SIZE, 800, 100, key="custom_height")
     else:
         # Calculate dimensions based on preset and aspect ratio
-        if resolution_preset == "HD (1280x720)":
-            base_width, base_height = 1280, 720
-        elif resolution_preset == "Full HD (1920x1080)":
-            base_width, base_height = 1920, 1080
-        elif resolution_preset == "2K (2560x1440)":
-            base_width, base_height = 2560, 1440
-        elif resolution_preset == "4K (3840x2160)":
-            base_width, base_height = 3840, 2160
-        else:
-            base_width, base_height = 1280, 720
-        
-        # Adjust for aspect ratio
-        if aspect_ratio == "Square (1:1)":
-            size = min(base_width, base_height)
-            width, height = size, size
-        elif aspect_ratio == "16:9":
-            height = int(base_width * 9 / 16)
-            width = base_width
-        elif aspect_ratio == "9:16":
-            width = int(base_height * 9 / 16)
-            height = base_height
-        elif aspect_ratio == "8:10":
-            height = int(base_width * 10 / 8)
-            width = base_width
-        elif aspect_ratio == "10:8":
-            width = int(base_height * 10 / 8)
-            height = base_height
-        elif aspect_ratio == "5:7":
-            height = int(base_width * 7 / 5)
-            width = base_width
-        elif aspect_ratio == "7:5":
-            width = int(base_height * 7 / 5)
-            height = base_height
-        elif aspect_ratio == "6:4":
-            height = int(base_width * 4 / 6)
-            width = base_width
-        elif aspect_ratio == "4:6":
-            width = int(base_height * 4 / 6)
-            height = base_height
-        elif aspect_ratio == "10:4":
-            height = int(base_width * 4 / 10)
-            width = base_width
-        elif aspect_ratio == "10:3":
-            height = int(base_width * 3 / 10)
-            width = base_width
+        width, height = preset_size(aspect_ratio, resolution_preset)
         
         # Display the calculated dimensions
         st.caption(f"Dimensions: {width}x{height} pixels")
@@ -654,9 +1115,46 @@ with st.sidebar:
     # Store dimensions in session state
     st.session_state.wc_width = width
     st.session_state.wc_height = height
+    
+    # Decode the uploaded mask once at the size words are laid out at, and check it leaves room for words
+    if is_image_shape(cloud_shape):
+        try:
+            plan = get_render_plan(width, height)
+            prepared_mask = get_mask(cloud_shape, plan.layout_width, plan.layout_height)
+        except ValueError as e:
+            st.error(str(e))
+            cloud_shape = "Rectangle"
+        else:
+            if prepared_mask.free_pixels == 0:
+                st.error("The mask image leaves no room for words.")
+                cloud_shape = "Rectangle"
+            else:
+                st.caption(f"Mask leaves {prepared_mask.free_fraction:.0%} of the canvas for words")
+    
+    # Memory held for this session in the shared artifact store
+    usage = get_artifact_store().usage(st.session_state.session_id)
+    st.caption(
+        f"Session memory: {usage['raw'] / 2**20:.1f} MB, "
+        f"{usage['compressed'] / 2**20:.1f} MB compressed, {usage['disk'] / 2**20:.1f} MB on disk"
+    )
+    st.caption(f"Unclaimed job results (all sessions): {get_job_registry().result_bytes() / 2**20:.1f} MB")
+    
+    # Load on the shared render workers
+    render_metrics = get_render_pool().metrics()
+    st.caption(
+        f"Render queue: {render_metrics['queued_preview']} preview, {render_metrics['queued_full']} full, "
+        f"{render_metrics['in_flight']}/{render_metrics['workers']} rendering, "
+        f"avg wait {render_metrics['mean_wait_s']:.1f}s, render {render_metrics['mean_render_s']:.1f}s"
+    )
+
+job_registry = get_job_registry()
+
+# Every run keeps this session's artifacts alive and releases those of closed sessions
+get_artifact_store().touch(st.session_state.session_id)
+get_artifact_store().release_idle(ARTIFACT_SESSION_TTL)
 
 # Create tabs for different input methods
-document_tab, chatgpt_tab = st.tabs(["Document Upload", "ChatGPT"])
+document_tab, chatgpt_tab, corpus_tab = st.tabs(["Document Upload", "ChatGPT", "Corpus"])
 
 # Store the current tab in session state
 if 'current_tab' not in st.session_state:
@@ -666,60 +1164,172 @@ if 'current_tab' not in st.session_state:
 with document_tab:
     st.session_state.current_tab = "document"
     
-    # File uploader
-    uploaded_file = st.file_uploader("Upload a document (PDF, DOCX, or TXT)", type=["pdf", "docx", "txt"])
+    # Single document, or several documents side by side
+    upload_mode = st.radio("Mode", ["Single Document", "Compare Documents"], horizontal=True, key="upload_mode")
+    uploaded_file = None
+    
+    if upload_mode == "Compare Documents":
+        compare_files = st.file_uploader("Upload documents to compare (PDF, DOCX, or TXT)",
+                                         type=["pdf", "docx", "txt"], accept_multiple_files=True,
+                                         key="compare_files")
+        if compare_files and st.button("Compare Documents", key="compare_generate_btn"):
+            run_document_comparison(compare_files)
+        comparison = get_artifact('comparison')
+        if comparison:
+            display_document_comparison(comparison, max_words, color_map, background_color)
+    else:
+        # File uploader
+        uploaded_file = st.file_uploader("Upload a document (PDF, DOCX, or TXT)", type=["pdf", "docx", "txt"])
+        fast_preview = st.checkbox(
+            "Fast preview for large documents", value=True, key="fast_preview",
+            help="Show a word cloud estimated from a sample of pages while the whole document is processed."
+        )
+    
+    if uploaded_file is None and st.session_state.upload_job_id:
+        # The upload was removed, stop processing it
+        job_registry.cancel(st.session_state.upload_job_id)
+        job_registry.cancel(f"sample-{st.session_state.upload_job_id}")
+        job_registry.cancel(f"timeline-{st.session_state.upload_job_id}")
+        st.session_state.upload_job_id = None
     
     if uploaded_file:
         try:
-            # Extract text based on file type
-            if uploaded_file.type == "application/pdf":
-                text = extract_text_from_pdf(uploaded_file)
-            elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                text = extract_text_from_docx(uploaded_file)
-            else:  # Assume TXT
-                text = uploaded_file.getvalue().decode("utf-8")
-            
-            # Store the document text and file name in session state
-            st.session_state.document_text = text
-            st.session_state.uploaded_file_name = uploaded_file.name
-            st.session_state.wordcloud_source = 'file'
-            st.session_state.last_action = "upload"
+            # Extraction and counting run in the background and survive reruns; job ids are
+            # per session, so one session cancelling or forgetting its job leaves the others alone
+            data = uploaded_file.getvalue()
+            job_id = f"upload-{st.session_state.session_id}-{hashlib.sha1(data).hexdigest()}"
+            new_upload = st.session_state.upload_job_id != job_id
+            if new_upload and st.session_state.upload_job_id:
+                job_registry.cancel(st.session_state.upload_job_id)
+                job_registry.cancel(f"sample-{st.session_state.upload_job_id}")
+                job_registry.cancel(f"timeline-{st.session_state.upload_job_id}")
+            st.session_state.upload_job_id = job_id
             
-            # Process the text for word cloud
-            processed_text = preprocess_text(text)
-            st.session_state.processed_document_text = processed_text
+            if st.session_state.upload_job_applied == job_id:
+                text = get_artifact('document_text')
+                processed_text = get_artifact('processed_document_text')
+                if text is None or processed_text is None:
+                    # The texts were dropped from the artifact store, process the file again
+                    st.session_state.upload_job_applied = None
+                    new_upload = True
             
-            # Display document info
-            st.subheader("Document Information")
-            st.write(f"**File Name:** {uploaded_file.name}")
-            st.write(f"**File Size:** {uploaded_file.size / 1024:.2f} KB")
-            st.write(f"**Word Count:** {len(text.split())}")
-            
-            # Display a sample of the text (not in an expander)
-            st.subheader("Text Preview")
-            st.text_area("Document Content (First 1000 characters)", 
-                        value=text[:1000] + ("..." if len(text) > 1000 else ""), 
-                        height=150, 
-                        disabled=True)
+            if st.session_state.upload_job_applied != job_id:
+                job = job_registry.submit(job_id, process_upload, data, uploaded_file.type, restart=new_upload,
+                                          corpus=get_corpus_index(), name=uploaded_file.name)
+                
+                if job.active:
+                    st.progress(job.progress, text=f"Processing {uploaded_file.name}: {job.message}")
+                    if st.button("Cancel Processing", key="cancel_upload_job"):
+                        job_registry.cancel(job_id)
+                        job_registry.cancel(f"sample-{job_id}")
+                    jobs_pending = True
+                    
+                    # An estimate from a sample of the document is shown until the exact counts are ready
+                    if fast_preview:
+                        preview_id = f"sample-{job_id}"
+                        preview_job = job_registry.submit(preview_id, sample_upload, data, uploaded_file.type,
+                                                          restart=new_upload)
+                        if preview_job.status == DONE and preview_job.result is not None:
+                            preview = preview_job.result
+                            if st.session_state.upload_preview_applied != preview_id:
+                                put_artifact('processed_document_text', preview['processed_text'])
+                                set_current_text(preview['processed_text'], preview['frequencies'])
+                                st.session_state.upload_preview_applied = preview_id
+                                st.session_state.uploaded_file_name = uploaded_file.name
+                                st.session_state.wordcloud_source = 'file'
+                            
+                            st.info(
+                                f"Fast preview from {preview['sampled']} of {preview['total']} {preview['unit']} "
+                                f"({preview['sampled'] / preview['total']:.1%} sampled). "
+                                f"Top-{preview['top_k']} stability: {preview['stability']:.0%}. "
+                                "Exact counts will replace it when processing finishes."
+                            )
+                            with st.expander("Estimated counts"):
+                                estimates = preview['frequencies'].top(25)
+                                st.dataframe(pd.DataFrame({
+                                    'Word': estimates.words,
+                                    'Estimated Count': estimates.counts,
+                                    '± (95%)': [round(preview['margins'][word]) for word in estimates.words],
+                                }), use_container_width=True)
+                elif job.status == FAILED:
+                    st.error(f"Error processing file: {job.message}")
+                elif job.status == CANCELLED:
+                    st.warning("Processing was cancelled. Upload the file again to restart.")
+                else:
+                    # Move the results into the artifact store, once per finished job
+                    text, processed_text, frequencies = job.result
+                    job_registry.forget(job_id)
+                    job_registry.cancel(f"sample-{job_id}")
+                    job_registry.forget(f"sample-{job_id}")
+                    st.session_state.upload_preview_applied = None
+                    put_artifact('document_text', text)
+                    put_artifact('processed_document_text', processed_text)
+                    set_current_text(processed_text, frequencies)
+                    st.session_state.upload_job_applied = job_id
             
-            # Add a button to generate word cloud from document
-            if st.button("Generate Word Cloud from Document", key="doc_generate_btn"):
-                # Display word cloud
-                display_word_cloud(
-                    text=text,
-                    max_words=max_words,
-                    width=st.session_state.wc_width,
-                    height=st.session_state.wc_height,
-                    colormap=color_map,
-                    background_color=background_color,
-                    source_text=uploaded_file.name,
-                    shape=cloud_shape,
-                    show_border=show_border
-                )
+            if st.session_state.upload_job_applied == job_id:
+                # Store the file name in session state
+                st.session_state.uploaded_file_name = uploaded_file.name
+                st.session_state.wordcloud_source = 'file'
+                st.session_state.last_action = "upload"
+                
+                # Display document info
+                st.subheader("Document Information")
+                st.write(f"**File Name:** {uploaded_file.name}")
+                st.write(f"**File Size:** {uploaded_file.size / 1024:.2f} KB")
+                st.write(f"**Word Count:** {len(text.split())}")
+                
+                # Display a sample of the text (not in an expander)
+                st.subheader("Text Preview")
+                st.text_area("Document Content (First 1000 characters)", 
+                            value=text[:1000] + ("..." if len(text) > 1000 else ""), 
+                            height=150, 
+                            disabled=True)
+                
+                # Vocabulary across pages or sections of the document
+                with st.expander("Section Timeline"):
+                    if display_section_timeline(data, uploaded_file.type, job_id, max_words, color_map,
+                                                background_color, cloud_shape):
+                        jobs_pending = True
+                
+                # Add a button to generate word cloud from document
+                if st.button("Generate Word Cloud from Document", key="doc_generate_btn"):
+                    # Display word cloud
+                    display_word_cloud(
+                        text=processed_text,
+                        max_words=max_words,
+                        width=st.session_state.wc_width,
+                        height=st.session_state.wc_height,
+                        colormap=color_map,
+                        background_color=background_color,
+                        source_text=uploaded_file.name,
+                        shape=cloud_shape,
+                        show_border=show_border
+                    )
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
             import traceback
             st.error(traceback.format_exc())
+    
+    # Saved layouts are redrawn with the current colors, without re-running the layout
+    with st.expander("Open Saved Layout"):
+        layout_file = st.file_uploader("Upload a saved layout (JSON or binary)", type=["json", "wcl"],
+                                       key="layout_file")
+        if layout_file:
+            try:
+                saved_layout = recolor_layout(load_layout(layout_file), color_map)
+                st.image(render_layout(saved_layout, background_color=background_color),
+                         use_column_width=True)
+                saved_svg = write_svg(saved_layout, BytesIO(), background_color=background_color)
+                st.download_button(
+                    label="Download as SVG",
+                    data=saved_svg.getvalue(),
+                    file_name=f"{os.path.splitext(layout_file.name)[0]}.svg",
+                    mime="image/svg+xml",
+                    key="download_saved_layout_svg"
+                )
+            except Exception as e:
+                st.error(f"Error loading layout: {str(e)}")
 
 # ChatGPT Tab
 with chatgpt_tab:
@@ -742,9 +1352,13 @@ with chatgpt_tab:
                         st.session_state.wordcloud_source = 'chat'
                         st.session_state.last_action = "chatgpt"
                         
-                        # Process the text for word cloud
-                        processed_text = preprocess_text(response)
-                        st.session_state.processed_chatgpt_text = processed_text
+                        # Process the text for word cloud, indexed by paragraph for later edits
+                        chatgpt_index = IncrementalFrequencyIndex(preprocess_text, resolve_language)
+                        chatgpt_index.update(response)
+                        put_artifact('chatgpt_index', chatgpt_index)
+                        processed_chatgpt_text = chatgpt_index.processed_text
+                        put_artifact('processed_chatgpt_text', processed_chatgpt_text)
+                        set_current_text(processed_chatgpt_text, chatgpt_index.table(max_words=400))
             else:
                 st.warning("Please enter a prompt for ChatGPT.")
     
@@ -762,6 +1376,17 @@ with chatgpt_tab:
                 key="edited_response"
             )
             
+            # Only paragraphs that changed are re-processed and re-counted
+            # The index is counted again if the artifact store dropped it
+            chatgpt_index = get_artifact('chatgpt_index')
+            if chatgpt_index is None:
+                chatgpt_index = IncrementalFrequencyIndex(preprocess_text, resolve_language)
+            if chatgpt_index.update(edited_response):
+                put_artifact('chatgpt_index', chatgpt_index)
+                processed_chatgpt_text = chatgpt_index.processed_text
+                put_artifact('processed_chatgpt_text', processed_chatgpt_text)
+                set_current_text(processed_chatgpt_text, chatgpt_index.table(max_words=400))
+            
             # Create columns for download options
             download_col1, download_col2 = st.columns(2)
             
@@ -777,7 +1402,7 @@ with chatgpt_tab:
             
             with download_col2:
                 # Download as DOCX
-                docx_data = save_to_docx(edited_response, "chatgpt_response")
+                docx_data = save_to_docx(edited_response)
                 st.download_button(
                     label="Download as DOCX",
                     data=docx_data,
@@ -790,7 +1415,7 @@ with chatgpt_tab:
             if st.button("Generate Word Cloud from ChatGPT Response", key="chatgpt_generate_btn"):
                 # Use the edited response for the word cloud
                 display_word_cloud(
-                    text=edited_response,
+                    text=get_artifact('processed_chatgpt_text') or chatgpt_index.processed_text,
                     max_words=max_words,
                     width=st.session_state.wc_width,
                     height=st.session_state.wc_height,
@@ -801,10 +1426,56 @@ with chatgpt_tab:
                     show_border=show_border
                 )
 
+# Corpus Tab
+with corpus_tab:
+    corpus = get_corpus_index()
+    if corpus is None:
+        st.info("Set WORDCLOUD_CORPUS_DB to a file path to keep the word counts of processed documents "
+                "in a corpus index and build clouds over any set of them.")
+    else:
+        st.subheader("Corpus")
+        st.caption("Clouds over indexed documents, without processing the files again.")
+        
+        # Narrow the documents by name and by the words they contain
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            name_filter = st.text_input("Document name contains", key="corpus_name_filter")
+        with filter_col2:
+            containing = st.text_input("Mentioning all of these words", key="corpus_containing").lower().split()
+        
+        documents = corpus.documents(name_like=name_filter or None, containing=containing)
+        if not documents:
+            st.info("No indexed documents match.")
+        else:
+            labels = {doc['id']: f"{doc['name']} ({doc['word_count']} words)" for doc in documents}
+            selected = st.multiselect("Documents", list(labels), default=list(labels),
+                                      format_func=labels.get, key="corpus_documents")
+            
+            # With no filters and every document selected, the precomputed totals are used
+            everything = not name_filter and not containing and len(selected) == len(documents)
+            query_start = time.perf_counter()
+            corpus_terms = corpus.top_terms(max_words, doc_ids=None if everything else selected)
+            query_ms = (time.perf_counter() - query_start) * 1000
+            st.caption(f"{len(selected)} of {len(documents)} documents, "
+                       f"top {len(corpus_terms)} words in {query_ms:.0f} ms")
+            
+            if corpus_terms:
+                show_comparison_cloud(corpus_terms.to_dict(), max_words, color_map, background_color)
+                st.dataframe(corpus_terms.to_dataframe(), use_container_width=True, height=400)
+                st.download_button(
+                    label="Download Corpus Frequency CSV",
+                    data=corpus_terms.to_csv(),
+                    file_name="word_frequency_corpus.csv",
+                    mime="text/csv",
+                    key="download_corpus_csv"
+                )
+
 # Display word cloud based on source
-if st.session_state.wordcloud_source == 'file' and st.session_state.processed_document_text:
+processed_document_text = get_artifact('processed_document_text')
+processed_chatgpt_text = get_artifact('processed_chatgpt_text')
+if st.session_state.wordcloud_source == 'file' and processed_document_text:
     display_word_cloud(
-        st.session_state.processed_document_text, 
+        processed_document_text, 
         max_words=max_words,
         width=st.session_state.wc_width,
         height=st.session_state.wc_height,
@@ -814,9 +1485,9 @@ if st.session_state.wordcloud_source == 'file' and st.session_state.processed_do
         shape=cloud_shape,
         show_border=show_border
     )
-elif st.session_state.wordcloud_source == 'chat' and st.session_state.processed_chatgpt_text:
+elif st.session_state.wordcloud_source == 'chat' and processed_chatgpt_text:
     display_word_cloud(
-        st.session_state.processed_chatgpt_text, 
+        processed_chatgpt_text, 
         max_words=max_words,
         width=st.session_state.wc_width,
         height=st.session_state.wc_height,
@@ -842,9 +1513,10 @@ st.markdown("""
 
 # Regenerate word cloud if settings have changed
 if settings_changed():
-    if st.session_state.current_wordcloud_text:
+    current_wordcloud_text = get_artifact('current_wordcloud_text')
+    if current_wordcloud_text:
         display_word_cloud(
-            st.session_state.current_wordcloud_text, 
+            current_wordcloud_text, 
             max_words=max_words,
             width=st.session_state.wc_width,
             height=st.session_state.wc_height,
@@ -854,3 +1526,8 @@ if settings_changed():
             shape=cloud_shape,
             show_border=show_border
         )
+
+# Keep polling while background jobs are running
+if jobs_pending:
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
@@ -0,0 +1,170 @@
+"""Memory-bounded store for large per-session artifacts.
+
+Sessions keep only string handles in st.session_state; the values (document
+text, rendered images, layouts) live here, shared by all sessions of the
+server. When the in-memory total exceeds the budget, the least recently used
+values are first compressed and then spilled to a local directory. Values
+spilled past the disk budget are dropped, and get() returns None for them.
+Sessions not seen for a while are released with release_idle().
+"""
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+RAW = "raw"
+COMPRESSED = "compressed"
+DISK = "disk"
+
+
+class _Entry:
+    __slots__ = ("session_id", "state", "value", "size")
+
+    def __init__(self, session_id, state, value, size):
+        self.session_id = session_id
+        self.state = state
+        self.value = value
+        self.size = size
+
+
+class ArtifactStore:
+    """LRU of session artifacts with compression and disk spill under pressure."""
+
+    def __init__(self, memory_budget=512 * 2**20, disk_budget=4 * 2**30, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "wordcloud-artifacts")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._last_seen = {}
+        self._lock = threading.RLock()
+
+    def put(self, session_id, name, value):
+        """Store a value for a session and return its handle."""
+        handle = f"{session_id}/{name}"
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+            self._remove(handle)
+            self._entries[handle] = _Entry(session_id, RAW, value, estimate_size(value))
+            self._rebalance()
+        return handle
+
+    def get(self, handle):
+        """Return the value for a handle, or None if it is unknown or was dropped."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            self._last_seen[entry.session_id] = time.monotonic()
+            self._entries.move_to_end(handle)
+            if entry.state == RAW:
+                return entry.value
+
+            if entry.state == COMPRESSED:
+                value = pickle.loads(zlib.decompress(entry.value))
+            else:
+                path = entry.value
+                with open(path, "rb") as file:
+                    value = pickle.loads(zlib.decompress(file.read()))
+                os.remove(path)
+
+            # Recently used values go back to memory uncompressed
+            entry.state = RAW
+            entry.value = value
+            entry.size = estimate_size(value)
+            self._rebalance()
+            return value
+
+    def delete(self, handle):
+        with self._lock:
+            self._remove(handle)
+
+    def touch(self, session_id):
+        """Mark a session as active, so release_idle keeps its artifacts."""
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def release_session(self, session_id):
+        """Drop every artifact belonging to a session."""
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+            for handle in [h for h, entry in self._entries.items() if entry.session_id == session_id]:
+                self._remove(handle)
+
+    def release_idle(self, max_idle):
+        """Release every session not seen for max_idle seconds; returns how many were released."""
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            idle = [session_id for session_id, seen in self._last_seen.items() if seen < cutoff]
+            for session_id in idle:
+                self.release_session(session_id)
+        return len(idle)
+
+    def usage(self, session_id=None):
+        """Bytes held in memory, compressed in memory and on disk, for one session or all."""
+        totals = {RAW: 0, COMPRESSED: 0, DISK: 0, "count": 0}
+        with self._lock:
+            for entry in self._entries.values():
+                if session_id is None or entry.session_id == session_id:
+                    totals[entry.state] += entry.size
+                    totals["count"] += 1
+        return totals
+
+    def _memory_used(self):
+        return sum(entry.size for entry in self._entries.values() if entry.state != DISK)
+
+    def _rebalance(self):
+        # Compress, then spill, the least recently used entries until within budget
+        memory_used = self._memory_used()
+        for handle, entry in self._entries.items():
+            if memory_used <= self.memory_budget:
+                break
+            if entry.state == RAW:
+                data = zlib.compress(pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+                memory_used -= entry.size - len(data)
+                entry.state, entry.value, entry.size = COMPRESSED, data, len(data)
+        for handle, entry in self._entries.items():
+            if memory_used <= self.memory_budget:
+                break
+            if entry.state == COMPRESSED:
+                path = os.path.join(self.spill_dir, handle.replace("/", "_") + ".bin")
+                with open(path, "wb") as file:
+                    file.write(entry.value)
+                memory_used -= entry.size
+                entry.state, entry.value = DISK, path
+
+        # Drop the oldest spilled entries beyond the disk budget
+        disk_used = sum(entry.size for entry in self._entries.values() if entry.state == DISK)
+        for handle in [h for h, entry in self._entries.items() if entry.state == DISK]:
+            if disk_used <= self.disk_budget:
+                break
+            disk_used -= self._entries[handle].size
+            self._remove(handle)
+
+    def _remove(self, handle):
+        entry = self._entries.pop(handle, None)
+        if entry is not None and entry.state == DISK and os.path.exists(entry.value):
+            os.remove(entry.value)
+
+
+def estimate_size(value):
+    """Approximate bytes held by a value, walking containers instead of pickling."""
+    # Cheap enough for put() under the lock; objects holding arrays report
+    # their own size through an nbytes attribute
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
@@ -0,0 +1,66 @@
+"""Compare streaming DOCX extraction with the python-docx object model.
+
+Builds a synthetic document with paragraphs and tables, then reports wall
+time and peak Python memory for both extractors.
+
+    python benchmarks/docx_extraction.py --paragraphs 20000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processing import (count_paragraphs, extract_text_from_docx_object_model,
+                                 iter_docx_paragraphs)
+
+SENTENCE = ("The quarterly report covers revenue growth, infrastructure spending "
+            "and the outlook for cloud computing demand across every region. ")
+
+
+def build_document(paragraphs, table_every):
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Confidential quarterly report"
+    for i in range(paragraphs):
+        doc.add_paragraph(SENTENCE * 3)
+        if table_every and i % table_every == 0:
+            table = doc.add_table(rows=3, cols=3)
+            for cell in table._cells:
+                cell.text = "GPU capacity utilisation"
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.3f} s {peak / 2**20:10.1f} MiB peak")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--table-every", type=int, default=50)
+    args = parser.parse_args()
+
+    data = build_document(args.paragraphs, args.table_every)
+    print(f"Document: {len(data) / 2**20:.1f} MiB, {args.paragraphs} paragraphs")
+
+    measure("python-docx extraction", lambda: extract_text_from_docx_object_model(BytesIO(data)))
+    measure("streaming extraction", lambda: '\n'.join(iter_docx_paragraphs(BytesIO(data))))
+    measure("streaming extract + count", lambda: count_paragraphs(iter_docx_paragraphs(BytesIO(data))))
+
+
+if __name__ == "__main__":
+    main()
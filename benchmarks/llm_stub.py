@@ -0,0 +1,141 @@
+"""Local OpenAI-compatible chat completions server for offline load tests.
+
+Answers POST /v1/chat/completions with generated text after a configurable
+delay, so ChatGPT prompts can be exercised without network access or API
+costs. Point the app at it with OPENAI_API_BASE.
+
+    python benchmarks/llm_stub.py --port 8089 --latency 0.5
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Words the generated answers are drawn from, most common first
+VOCABULARY = (
+    "cloud data model language system word document report analysis growth market customer "
+    "research network security energy design product service platform learning performance "
+    "memory latency throughput capacity infrastructure revenue strategy quality process "
+    "industry technology innovation software hardware storage compute region demand supply"
+).split()
+
+
+def generate_answer(prompt, words):
+    """Deterministic text for a prompt, with a Zipf-like word distribution."""
+    seed = int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    chosen = rng.choices(VOCABULARY, weights=weights, k=words)
+    sentences = [" ".join(chosen[i:i + 12]).capitalize() + "." for i in range(0, len(chosen), 12)]
+    paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return "\n\n".join(paragraphs)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Chat completions and model listing in the OpenAI response format."""
+
+    server_version = "LLMStub/1.0"
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model"}]})
+        else:
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": {"message": "Invalid JSON"}}, status=400)
+            return
+
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+        words = min(self.server.answer_words, int(body.get("max_tokens") or self.server.answer_words))
+        answer = generate_answer(prompt, words)
+
+        # Simulated generation time: a fixed delay plus a per-word cost
+        time.sleep(self.server.latency + words * self.server.per_word)
+        self._send_json({
+            "id": f"chatcmpl-stub-{self.server.count_request()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": words,
+                      "total_tokens": len(prompt.split()) + words},
+        })
+
+    def log_message(self, format, *args):
+        # Keep load test output readable
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, per_word=0.0, answer_words=400):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.per_word = per_word
+        self.answer_words = answer_words
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_stub(host="127.0.0.1", port=0, **options):
+    """Start a stub server on a background thread and return it."""
+    server = StubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each answer")
+    parser.add_argument("--per-word", type=float, default=0.0, help="Extra seconds per generated word")
+    parser.add_argument("--words", type=int, default=400, help="Words per answer")
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), latency=args.latency, per_word=args.per_word,
+                        answer_words=args.words)
+    print(f"Serving chat completions at {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
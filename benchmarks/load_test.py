@@ -0,0 +1,510 @@
+"""Load test the word cloud app with concurrent simulated sessions.
+
+Each session repeatedly uploads a document from a synthetic corpus, sends a
+ChatGPT prompt to a local OpenAI-compatible stub and steps through the
+resolution presets. Every concurrency level runs for a fixed time and
+reports throughput, p50/p95/p99 latency per stage and the server's resident
+memory over time. Runs offline on one machine.
+
+    python benchmarks/load_test.py --target pipeline --sessions 1,4,16 --duration 60
+    python benchmarks/load_test.py --target app --sessions 2,4,8 --duration 120
+    python benchmarks/load_test.py --target nextjs --url http://127.0.0.1:3000 --server-pid 4321
+
+Targets:
+    pipeline  the app's shared back end in this process: background upload
+              jobs, the render worker pool and the ChatGPT call
+    app       app.py under streamlit run (started here unless --url is given),
+              each session a websocket client speaking the browser protocol
+    nextjs    the /api/upload route of a running Next.js server, with the
+              server-side layout at the preset sizes
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from collections import defaultdict
+from io import BytesIO
+
+import nltk
+import numpy as np
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat import chat_completion
+from document_processing import DOCX_MIME, preprocess_text, process_upload
+from jobs import DONE, JobRegistry
+from llm_stub import start_stub
+from presets import get_render_plan, preset_size
+from render_pool import RenderPool, render_priority
+from streamlit_client import ScriptError, StreamlitSession
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+TXT_MIME = "text/plain"
+
+# Presets every session steps through, as (aspect ratio, resolution)
+SESSION_PRESETS = [
+    ("16:9", "HD (1280x720)"),
+    ("16:9", "Full HD (1920x1080)"),
+    ("Square (1:1)", "2K (2560x1440)"),
+    ("16:9", "4K (3840x2160)"),
+]
+
+PROMPTS = [
+    "Summarize the main trends in cloud infrastructure spending this year.",
+    "Write a short report on how retailers use customer data.",
+    "Explain the trade-offs between latency and throughput in distributed systems.",
+    "Describe the market outlook for renewable energy storage.",
+    "List the key risks in a software platform migration.",
+]
+
+# Syllables the synthetic vocabulary is built from; the app strips digits, so words are letters only
+SYLLABLES = ["ka", "lo", "mi", "ner", "tu", "pra", "vel", "sin", "dor", "ja", "qua", "rix", "bel", "mon",
+             "tar", "fe", "gro", "sha", "lin", "cos"]
+
+# Seconds between job status checks, like the app's rerun interval
+POLL_INTERVAL = 0.05
+
+# Seconds to wait for a Streamlit server started by the load test
+SERVER_START_TIMEOUT = 120
+
+DEFAULT_NEXTJS_URL = "http://127.0.0.1:3000"
+
+
+def build_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES, size=rng.integers(2, 5))))
+    return sorted(words)
+
+
+def build_corpus(documents, words, docx_share, seed=0):
+    """Synthetic TXT and DOCX documents with Zipf-distributed words.
+
+    Returns a list of (name, bytes, MIME type); document lengths vary around
+    the given number of words.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(build_vocabulary(5000, rng), dtype=object)
+    weights = 1 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+
+    corpus = []
+    for i in range(documents):
+        length = max(100, int(rng.lognormal(np.log(words), 0.5)))
+        tokens = vocabulary[rng.choice(len(vocabulary), size=length, p=weights)]
+        paragraphs = [" ".join(tokens[start:start + 80]) + "." for start in range(0, length, 80)]
+        if rng.random() < docx_share:
+            doc = Document()
+            for paragraph in paragraphs:
+                doc.add_paragraph(paragraph)
+            buf = BytesIO()
+            doc.save(buf)
+            corpus.append((f"document_{i}.docx", buf.getvalue(), DOCX_MIME))
+        else:
+            corpus.append((f"document_{i}.txt", "\n\n".join(paragraphs).encode("utf-8"), TXT_MIME))
+    return corpus
+
+
+class Recorder:
+    """Latencies and errors per stage, collected from every session thread."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_errors = {}
+        self._lock = threading.Lock()
+
+    def measure(self, stage, func, *args):
+        """Time func(*args) under a stage name; returns its result, or None if it raised."""
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            message = next((line.strip() for line in str(e).splitlines() if line.strip("* ")), "")
+            with self._lock:
+                self.errors[stage] += 1
+                self.first_errors.setdefault(stage, f"{type(e).__name__}: {message}")
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[stage].append(elapsed)
+        return result
+
+
+def process_tree(pid):
+    """A process id followed by the ids of all its descendants."""
+    pids = [pid]
+    for parent in pids:
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the resident memory of a process and its children at an interval."""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.monotonic()
+        while not self._stop_event.is_set():
+            self.samples.append((time.monotonic() - start, sum(rss_bytes(pid) for pid in process_tree(self.pid))))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class PipelineTarget:
+    """The app's shared back end, driven directly in this process."""
+
+    def __init__(self, args, corpus):
+        # The same NLTK data the app downloads at start
+        for resource, package in (("corpora/stopwords", "stopwords"), ("tokenizers/punkt", "punkt")):
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                if not nltk.download(package, quiet=True):
+                    raise SystemExit(f"NLTK {package} is not installed and could not be downloaded; "
+                                     "install it or point NLTK_DATA at a directory that has it")
+
+        import openai
+        openai.api_base = os.environ["OPENAI_API_BASE"]
+        openai.api_key = os.environ["OPENAI_API_KEY"]
+        self.corpus = corpus
+        self.max_words = args.max_words
+        self.timeout = args.timeout
+        self.jobs = JobRegistry(max_workers=4)
+        self.pool = RenderPool(max_queue=args.render_queue)
+        self.pool.warm_up()
+        self.pid = os.getpid()
+
+    def run_session(self, session_id, rng, recorder, deadline):
+        while time.monotonic() < deadline:
+            _, data, file_type = self.corpus[rng.randrange(len(self.corpus))]
+            upload = recorder.measure("upload", self._upload, data, file_type)
+            chat = recorder.measure("chat", self._chat, rng.choice(PROMPTS))
+            text = chat if chat else upload[1] if upload else None
+            if not text:
+                continue
+            for aspect_ratio, resolution in SESSION_PRESETS:
+                if time.monotonic() >= deadline:
+                    break
+                width, height = preset_size(aspect_ratio, resolution)
+                recorder.measure(f"render {width}x{height}", self._render, session_id, text, width, height)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def _upload(self, data, file_type):
+        # A fresh job id per upload, so every upload is processed in full
+        job_id = f"load-{uuid.uuid4().hex}"
+        job = self.jobs.submit(job_id, process_upload, data, file_type)
+        give_up = time.monotonic() + self.timeout
+        while job.active:
+            if time.monotonic() > give_up:
+                self.jobs.cancel(job_id)
+                raise TimeoutError(f"upload took over {self.timeout}s")
+            time.sleep(POLL_INTERVAL)
+        self.jobs.forget(job_id)
+        if job.status != DONE:
+            raise RuntimeError(job.message)
+        return job.result
+
+    def _chat(self, prompt):
+        # Same call and processing as the ChatGPT tab
+        return preprocess_text(chat_completion(prompt))
+
+    def _render(self, session_id, text, width, height):
+        request = {
+            'text': text,
+            'frequencies': None,
+            'plan': get_render_plan(width, height).to_dict(),
+            'max_words': self.max_words,
+            'colormap': 'viridis',
+            'background_color': '#FFFFFF',
+            'shape': "Rectangle",
+            'random_state': 42,
+        }
+        return self.pool.submit(session_id, request, render_priority(width, height)).result(timeout=self.timeout)
+
+
+class AppTarget:
+    """app.py served by streamlit run, with sessions speaking the browser protocol."""
+
+    def __init__(self, args, corpus):
+        self.corpus = corpus
+        self.timeout = args.timeout
+        self.server = None
+        self.url = args.url
+        if self.url is None:
+            self.server, self.url = start_streamlit(args.port)
+        self.pid = self.server.pid if self.server is not None else args.server_pid
+
+    def run_session(self, session_id, rng, recorder, deadline):
+        session = StreamlitSession(self.url, self.timeout)
+        try:
+            if recorder.measure("page load", session.connect) is None:
+                return
+            while time.monotonic() < deadline:
+                name, data, file_type = self.corpus[rng.randrange(len(self.corpus))]
+                recorder.measure("upload", self._upload, session, name, data, file_type)
+                recorder.measure("chat", self._chat, session, rng.choice(PROMPTS))
+                for aspect_ratio, resolution in SESSION_PRESETS:
+                    if time.monotonic() >= deadline:
+                        break
+                    width, height = preset_size(aspect_ratio, resolution)
+                    recorder.measure(f"settings {width}x{height}", self._settings, session, aspect_ratio, resolution)
+        finally:
+            session.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.terminate()
+            self.server.wait(timeout=30)
+
+    def _upload(self, session, name, data, file_type):
+        # Upload, wait until the document is processed and its cloud drawn, then remove it again
+        _, uploader = session.widget(label="Upload a document (PDF, DOCX, or TXT)")
+        session.upload(uploader, name, data, file_type)
+        session.rerun()
+        try:
+            session.widget(key="doc_generate_btn")
+        except KeyError:
+            raise ScriptError(f"{name} was not processed")
+        session.clear(uploader)
+        session.rerun()
+
+    def _chat(self, session, prompt):
+        _, prompt_area = session.widget(label="Enter your prompt for ChatGPT")
+        session.set_text(prompt_area, prompt)
+        _, submit = session.widget(key="submit_to_chatgpt_tab")
+        session.click(submit)
+
+    def _settings(self, session, aspect_ratio, resolution):
+        session.select(session.widget(key="aspect_ratio")[1], aspect_ratio)
+        session.select(session.widget(key="resolution_preset")[1], resolution)
+        session.rerun()
+
+
+def start_streamlit(port):
+    """Start app.py under streamlit run and wait until it answers; returns the process and URL."""
+    log = open(os.path.join(tempfile.gettempdir(), "wordcloud-load-test-server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=os.path.dirname(APP_PATH), stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    give_up = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < give_up:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {server.returncode}, see {log.name}")
+        try:
+            urllib.request.urlopen(f"{url}/_stcore/health", timeout=1).close()
+            print(f"Streamlit server at {url} (pid {server.pid}), log in {log.name}")
+            return server, url
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"streamlit did not start within {SERVER_START_TIMEOUT}s, see {log.name}")
+
+
+class NextTarget:
+    """The /api/upload route of a running Next.js server."""
+
+    def __init__(self, args, corpus):
+        self.url = (args.url or DEFAULT_NEXTJS_URL).rstrip("/") + "/api/upload"
+        self.corpus = corpus
+        self.timeout = args.timeout
+        self.pid = args.server_pid
+
+    def run_session(self, session_id, rng, recorder, deadline):
+        while time.monotonic() < deadline:
+            name, data, file_type = self.corpus[rng.randrange(len(self.corpus))]
+            width, height = preset_size(*rng.choice(SESSION_PRESETS))
+            recorder.measure(f"upload {width}x{height}", self._upload, name, data, file_type, width, height)
+
+    def close(self):
+        pass
+
+    def _upload(self, name, data, file_type, width, height):
+        boundary = uuid.uuid4().hex
+        body = encode_multipart(boundary, {"layoutWidth": str(width), "layoutHeight": str(height)},
+                                [("documents", name, file_type, data)])
+        request = urllib.request.Request(self.url, data=body, method="POST",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.load(response)
+        if payload.get("error"):
+            raise RuntimeError(payload["error"])
+        return payload
+
+
+def encode_multipart(boundary, fields, files):
+    """multipart/form-data body from form fields and (field, file name, type, bytes) tuples."""
+    buf = BytesIO()
+    for name, value in fields.items():
+        buf.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+                  .encode("utf-8"))
+    for field, file_name, file_type, data in files:
+        buf.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; "
+                  f"filename=\"{file_name}\"\r\nContent-Type: {file_type}\r\n\r\n".encode("utf-8"))
+        buf.write(data)
+        buf.write(b"\r\n")
+    buf.write(f"--{boundary}--\r\n".encode("utf-8"))
+    return buf.getvalue()
+
+
+TARGETS = {"pipeline": PipelineTarget, "app": AppTarget, "nextjs": NextTarget}
+
+
+def run_level(target, sessions, duration, server_pid, interval, seed):
+    """Run a number of concurrent sessions for duration seconds and collect the results."""
+    recorder = Recorder()
+    sampler = MemorySampler(server_pid, interval) if server_pid else None
+    if sampler is not None:
+        sampler.start()
+
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=target.run_session, name=f"session-{i}",
+                         args=(f"load-session-{i}", random.Random(seed + i), recorder, deadline))
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if sampler is not None:
+        sampler.stop()
+    return summarize(recorder, sessions, elapsed, sampler.samples if sampler is not None else [])
+
+
+def summarize(recorder, sessions, elapsed, rss_samples):
+    stages = {}
+    for stage in sorted(set(recorder.latencies) | set(recorder.errors)):
+        latencies = np.array(recorder.latencies.get(stage, []))
+        stats = {"count": len(latencies), "errors": recorder.errors.get(stage, 0),
+                 "throughput": len(latencies) / elapsed}
+        if len(latencies):
+            stats.update(zip(("p50", "p95", "p99"), np.percentile(latencies, [50, 95, 99]).tolist()))
+            stats["max"] = float(latencies.max())
+        if stage in recorder.first_errors:
+            stats["first_error"] = recorder.first_errors[stage]
+        stages[stage] = stats
+    return {
+        "sessions": sessions,
+        "elapsed": elapsed,
+        "throughput": sum(stats["count"] for stats in stages.values()) / elapsed,
+        "stages": stages,
+        "rss": rss_samples,
+    }
+
+
+def print_report(result):
+    print(f"\n{result['sessions']} sessions, {result['elapsed']:.1f} s, "
+          f"{result['throughput']:.2f} operations/s")
+    print(f"{'stage':<22}{'count':>7}{'errors':>8}{'ops/s':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}")
+    for stage, stats in result["stages"].items():
+        latencies = "".join(f"{stats[key]:9.3f}" if key in stats else f"{'-':>9}"
+                            for key in ("p50", "p95", "p99", "max"))
+        print(f"{stage:<22}{stats['count']:>7}{stats['errors']:>8}{stats['throughput']:>8.2f}{latencies}")
+    for stage, stats in result["stages"].items():
+        if "first_error" in stats:
+            print(f"  {stage}: {stats['first_error']}")
+
+    samples = result["rss"]
+    if samples:
+        values = [rss for _, rss in samples]
+        print(f"RSS: start {values[0] / 2**20:.0f} MiB, peak {max(values) / 2**20:.0f} MiB, "
+              f"end {values[-1] / 2**20:.0f} MiB")
+        # A coarse timeline, about ten points per level
+        stride = max(1, len(samples) // 10)
+        print("RSS over time: " + ", ".join(f"{t:.0f}s {rss / 2**20:.0f}" for t, rss in samples[::stride]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=list(TARGETS), default="pipeline")
+    parser.add_argument("--sessions", default="1,4,8",
+                        help="Comma-separated concurrency levels, each run in turn")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--documents", type=int, default=20, help="Documents in the synthetic corpus")
+    parser.add_argument("--words", type=int, default=20000, help="Typical words per document")
+    parser.add_argument("--docx-share", type=float, default=0.3, help="Share of DOCX documents in the corpus")
+    parser.add_argument("--max-words", type=int, default=200, help="Words per cloud")
+    parser.add_argument("--render-queue", type=int, default=64, help="Render queue size for the pipeline target")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds before one operation counts as failed")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the LLM stub waits per answer")
+    parser.add_argument("--llm-words", type=int, default=400, help="Words per LLM stub answer")
+    parser.add_argument("--url", help=f"Server to test instead of starting one (nextjs default: {DEFAULT_NEXTJS_URL})")
+    parser.add_argument("--port", type=int, default=8599, help="Port of the Streamlit server started for the app target")
+    parser.add_argument("--server-pid", type=int, help="Process whose memory is sampled, for servers not started here")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="Seconds between memory samples")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.sessions.split(",")]
+    stub = None
+    if args.target != "nextjs":
+        stub = start_stub(latency=args.llm_latency, answer_words=args.llm_words)
+        os.environ["OPENAI_API_BASE"] = stub.api_base
+        os.environ["OPENAI_API_KEY"] = "stub"
+        print(f"LLM stub at {stub.api_base}")
+
+    corpus = build_corpus(args.documents, args.words, args.docx_share, args.seed)
+    print(f"Corpus: {len(corpus)} documents, {sum(len(data) for _, data, _ in corpus) / 2**20:.1f} MiB")
+
+    target = TARGETS[args.target](args, corpus)
+    results = []
+    try:
+        for sessions in levels:
+            result = run_level(target, sessions, args.duration, target.pid, args.rss_interval, args.seed)
+            print_report(result)
+            results.append(result)
+    finally:
+        target.close()
+        if stub is not None:
+            stub.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"target": args.target, "levels": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
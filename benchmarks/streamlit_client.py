@@ -0,0 +1,174 @@
+"""Minimal Streamlit browser session for load tests.
+
+Speaks the same websocket protocol as the Streamlit frontend: it asks for
+script runs with widget values, reads the elements each run produces, and
+uploads files through the upload endpoint. Each session runs its own event
+loop, so one session can be driven from one thread.
+"""
+import asyncio
+import uuid
+import urllib.request
+from http.cookies import SimpleCookie
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+XSRF_COOKIE = "_streamlit_xsrf"
+
+# Alerts with this format are errors shown by the app
+ALERT_ERROR = 1
+
+
+class ScriptError(Exception):
+    """Raised when a script run shows an exception or an error alert."""
+
+
+class StreamlitSession:
+    """One simulated browser tab connected to a running Streamlit server."""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session_id = None
+        self.elements = []
+        self._states = {}
+        self._xsrf = None
+        self._ws = None
+        self._loop = asyncio.new_event_loop()
+
+    def connect(self):
+        """Open the session and run the script once, like loading the page."""
+        # The health check also hands out the XSRF cookie that uploads need
+        with urllib.request.urlopen(f"{self.base_url}/_stcore/health", timeout=self.timeout) as response:
+            cookies = SimpleCookie()
+            for header in response.headers.get_all("Set-Cookie") or []:
+                cookies.load(header)
+            if XSRF_COOKIE in cookies:
+                self._xsrf = cookies[XSRF_COOKIE].value
+
+        ws_url = "ws" + self.base_url[len("http"):] + "/_stcore/stream"
+        self._ws = self._run(websocket_connect, ws_url, subprotocols=["streamlit"])
+        return self.rerun()
+
+    def close(self):
+        if self._ws is not None:
+            self._run(self._close_socket)
+        self._loop.close()
+
+    def widget(self, key=None, label=None):
+        """Widget element of the last run with the given key or label, as (type, proto)."""
+        for kind, element in self.elements:
+            widget_id = getattr(element, "id", "")
+            if key is not None and widget_id.endswith(f"-{key}"):
+                return kind, element
+            if label is not None and widget_id and element.label == label:
+                return kind, element
+        raise KeyError(key or label)
+
+    def set_text(self, element, value):
+        self._states[element.id] = WidgetState(id=element.id, string_value=value)
+
+    def select(self, element, option):
+        self._states[element.id] = WidgetState(id=element.id, int_value=list(element.options).index(option))
+
+    def clear(self, element):
+        self._states.pop(element.id, None)
+
+    def click(self, element):
+        """Run the script with the button pressed."""
+        return self.rerun(triggers=[element.id])
+
+    def upload(self, element, name, data, file_type):
+        """Upload a file into a file uploader; it is sent with every later run until cleared."""
+        request = BackMsg()
+        request.file_urls_request.request_id = uuid.uuid4().hex
+        request.file_urls_request.session_id = self.session_id
+        request.file_urls_request.file_names.append(name)
+        self._send(request)
+        while True:
+            msg = self._receive()
+            if (msg.WhichOneof("type") == "file_urls_response"
+                    and msg.file_urls_response.response_id == request.file_urls_request.request_id):
+                file_urls = msg.file_urls_response.file_urls[0]
+                break
+
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                f"Content-Type: {file_type}\r\n\r\n").encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        if self._xsrf is not None:
+            headers.update({"X-Xsrftoken": self._xsrf, "Cookie": f"{XSRF_COOKIE}={self._xsrf}"})
+        put = urllib.request.Request(self.base_url + file_urls.upload_url, data=body, headers=headers, method="PUT")
+        urllib.request.urlopen(put, timeout=self.timeout).close()
+
+        state = WidgetState(id=element.id)
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.id = 1
+        info.name = name
+        info.size = len(data)
+        info.file_id = file_urls.file_id
+        info.file_urls.CopyFrom(file_urls)
+        state.file_uploader_state_value.max_file_id = 1
+        self._states[element.id] = state
+
+    def rerun(self, triggers=()):
+        """Run the script with the current widget values and wait until it settles.
+
+        Runs the app restarts itself (st.rerun while it polls background work)
+        are followed until one finishes. Returns the elements of that run.
+        """
+        msg = BackMsg()
+        widgets = msg.rerun_script.widget_states.widgets
+        widgets.extend(self._states.values())
+        for widget_id in triggers:
+            widgets.add(id=widget_id, trigger_value=True)
+        self._send(msg)
+
+        elements = []
+        while True:
+            msg = self._receive()
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # Every script run starts with a new_session message
+                self.session_id = msg.new_session.initialize.session_id
+                elements = []
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                element_kind = element.WhichOneof("type")
+                elements.append((element_kind, getattr(element, element_kind)))
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise ScriptError("The script failed to compile")
+                if msg.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    break
+
+        self.elements = elements
+        for element_kind, element in elements:
+            if element_kind == "exception":
+                raise ScriptError(f"{element.type}: {element.message}")
+            if element_kind == "alert" and element.format == ALERT_ERROR and element.body.startswith("Error"):
+                raise ScriptError(element.body.splitlines()[0])
+        return elements
+
+    def _send(self, msg):
+        self._run(self._ws.write_message, msg.SerializeToString(), binary=True)
+
+    def _receive(self):
+        data = self._run(self._read_message)
+        if data is None:
+            raise ConnectionError("The server closed the session")
+        return ForwardMsg.FromString(data)
+
+    async def _close_socket(self):
+        self._ws.close()
+
+    async def _read_message(self):
+        return await asyncio.wait_for(self._ws.read_message(), self.timeout)
+
+    def _run(self, func, *args, **kwargs):
+        # Tornado binds futures to the running loop, so calls are made inside it
+        async def call():
+            return await func(*args, **kwargs)
+        return self._loop.run_until_complete(call())
@@ -0,0 +1,21 @@
+"""ChatGPT requests shared by the app and the load test."""
+import openai
+
+CHAT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+
+def chat_completion(prompt, api_key=None):
+    """Return ChatGPT's reply to a single prompt."""
+    if api_key is not None:
+        openai.api_key = api_key
+    response = openai.ChatCompletion.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1000,
+        temperature=0.7
+    )
+    return response.choices[0].message.content
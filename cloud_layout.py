@@ -0,0 +1,519 @@
+"""Word cloud layouts as plain data.
+
+A layout records where the WordCloud algorithm placed every word, so the
+cloud can be exported or redrawn without running the layout step again.
+A label map records which word covers each pixel of a rasterized layout, so
+the cloud can be recolored with one palette lookup instead of redrawing.
+"""
+import base64
+import json
+import os
+import random
+import struct
+import zlib
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+from matplotlib import colormaps
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from wordcloud.wordcloud import FONT_PATH
+
+LAYOUT_VERSION = 1
+BINARY_MAGIC = b"WCL\x01"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Column types of the binary frequency counts: raw counts or relative weights
+COUNT_TYPES = {b"i": "<i8", b"f": "<f8"}
+
+# Pixel memory write_png may use for the strip being rasterized
+PNG_STRIP_BUDGET = 64 * 2**20
+
+# Copies of a strip alive at once in write_png: image, array, filtered rows, bytes
+PNG_STRIP_COPIES = 4
+
+# Steps in the lookup table of the diagonal gradient, the coloring of the shape border
+GRADIENT_STEPS = 256
+
+
+@lru_cache(maxsize=256)
+def _get_font(font_path, size):
+    # Layouts saved on another machine may point at a font that is not here
+    if not os.path.exists(font_path):
+        font_path = FONT_PATH
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=256)
+def _get_word_font(font_path, size, rotated):
+    # WordCloud places and draws every word through a TransposedFont, whose ink
+    # starts at the word's position; a plain font would add its bbox top
+    return ImageFont.TransposedFont(_get_font(font_path, size), orientation=Image.ROTATE_90 if rotated else None)
+
+
+def layout_from_wordcloud(wordcloud, settings=None, frequencies=None):
+    """Capture the placed words of a generated WordCloud as a layout dict.
+
+    frequencies maps words to the counts the cloud was generated from; the
+    layout keeps the counts of the words WordCloud kept. Without it only the
+    relative weights of words_ are known, and those are stored instead.
+    """
+    if frequencies is None:
+        frequencies = wordcloud.words_.items()
+    else:
+        frequencies = [(word, frequencies[word]) for word in wordcloud.words_]
+    if wordcloud.mask is not None:
+        height, width = wordcloud.mask.shape[:2]
+    else:
+        width, height = wordcloud.width, wordcloud.height
+
+    # Each word is [text, frequency, font_size, x, y, rotated, color]
+    words = []
+    for (word, freq), font_size, position, orientation, color in wordcloud.layout_:
+        words.append([
+            word,
+            float(freq),
+            int(font_size),
+            int(position[1]),
+            int(position[0]),
+            orientation is not None,
+            color,
+        ])
+
+    return {
+        "version": LAYOUT_VERSION,
+        "width": int(width),
+        "height": int(height),
+        "scale": float(wordcloud.scale),
+        "background_color": wordcloud.background_color,
+        "font_path": wordcloud.font_path,
+        "settings": dict(settings or {}),
+        "frequencies": [[word, count] for word, count in frequencies],
+        "words": words,
+    }
+
+
+def word_colors(layout, colormap, scheme="words", random_state=None):
+    """RGB color of every word of the layout under a color scheme, as an n x 3 uint8 array.
+
+    With the gradient scheme a word takes the gradient color at its position,
+    which is what vector exports show.
+    """
+    if scheme == "gradient":
+        extent = layout["width"] + layout["height"]
+        positions = [(x + y) / extent for _, _, _, x, y, _, _ in layout["words"]]
+    else:
+        # Same sampling as WordCloud's colormap_color_func, seeded for repeatability
+        rng = random.Random(random_state)
+        positions = [rng.uniform(0, 1) for _ in layout["words"]]
+    colors = np.maximum(0, 255 * colormaps[colormap](np.asarray(positions, dtype=np.float64))[:, :3])
+    return colors.round().astype(np.uint8).reshape(-1, 3)
+
+
+def count_colors(layout, colormap, color_scale_max):
+    """RGB color of every word from its count on a fixed scale, as an n x 3 uint8 array.
+
+    Layouts colored with the same color_scale_max (the largest count in any of
+    them) give the same count the same color, so clouds can be compared.
+    """
+    counts = np.asarray([freq for _, freq, _, _, _, _, _ in layout["words"]], dtype=np.float64)
+    values = np.log1p(counts) / np.log1p(max(color_scale_max, 1))
+    colors = np.maximum(0, 255 * colormaps[colormap](0.15 + 0.85 * values)[:, :3])
+    return colors.round().astype(np.uint8).reshape(-1, 3)
+
+
+@lru_cache(maxsize=32)
+def gradient_palette(colormap):
+    """Colors of the diagonal gradient, GRADIENT_STEPS x 3 uint8, top left to bottom right."""
+    colors = colormaps[colormap](np.linspace(0, 1, GRADIENT_STEPS))[:, :3]
+    palette = (colors * 255).round().astype(np.uint8)
+    palette.flags.writeable = False
+    return palette
+
+
+def recolor_layout(layout, colormap, random_state=None, scheme="words", colors=None):
+    """Return a copy of the layout with word colors drawn from a colormap.
+
+    Pass colors (from word_colors) when they are already computed.
+    """
+    if colors is None:
+        colors = word_colors(layout, colormap, scheme, random_state)
+    words = [word[:6] + [f"rgb({r}, {g}, {b})"] for word, (r, g, b) in zip(layout["words"], colors.tolist())]
+    return dict(layout, words=words)
+
+
+def render_layout(layout, colormap=None, background_color=None, scale=None):
+    """Rasterize a layout to a PIL image without running the layout step."""
+    if colormap is not None:
+        layout = recolor_layout(layout, colormap)
+    if background_color is None:
+        background_color = layout["background_color"]
+    if scale is None:
+        scale = layout["scale"]
+
+    img = Image.new("RGB", (int(layout["width"] * scale), int(layout["height"] * scale)),
+                    background_color)
+    draw = ImageDraw.Draw(img)
+    for word, _, font_size, x, y, rotated, color in layout["words"]:
+        font = _get_word_font(layout["font_path"], int(font_size * scale), rotated)
+        draw.text((int(x * scale), int(y * scale)), word, fill=color, font=font)
+    return img
+
+
+class LabelMap:
+    """Which word covers each pixel of a rasterized layout.
+
+    labels holds the word index plus one per pixel, 0 for background.
+    Anti-aliased glyph edges are kept apart as flat pixel indices with their
+    coverage, so painting is a palette lookup plus a blend of the edges only.
+    """
+
+    def __init__(self, labels, edges, edge_coverage):
+        self.labels = labels
+        self.edges = edges
+        self.edge_coverage = edge_coverage
+        self._gradient_index = None
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    @property
+    def gradient_index(self):
+        """Step of the diagonal gradient at each pixel, built on first use."""
+        if self._gradient_index is None:
+            height, width = self.labels.shape
+            rows = np.arange(height, dtype=np.uint32)[:, None]
+            cols = np.arange(width, dtype=np.uint32)[None, :]
+            index = (rows + cols) * GRADIENT_STEPS // (height + width)
+            self._gradient_index = index.astype(np.uint8)
+        return self._gradient_index
+
+    @property
+    def nbytes(self):
+        """Bytes held by the label, edge and gradient arrays."""
+        size = self.labels.nbytes + self.edges.nbytes + self.edge_coverage.nbytes
+        if self._gradient_index is not None:
+            size += self._gradient_index.nbytes
+        return size
+
+    def __getstate__(self):
+        # The gradient index is cheap to rebuild, so it is not pickled
+        return dict(self.__dict__, _gradient_index=None)
+
+
+def label_layout(layout, scale=None):
+    """Rasterize a layout into a LabelMap, drawing the words as render_layout does."""
+    if scale is None:
+        scale = layout["scale"]
+    width = int(layout["width"] * scale)
+    height = int(layout["height"] * scale)
+    labels = np.zeros((height, width), dtype=np.uint16 if len(layout["words"]) < 2**16 else np.int32)
+    coverage = np.zeros((height, width), dtype=np.uint8)
+
+    for label, (word, _, font_size, x, y, rotated, _) in enumerate(layout["words"], start=1):
+        font = _get_word_font(layout["font_path"], max(int(font_size * scale), 1), rotated)
+        left, top, right, bottom = font.getbbox(word)
+        if right <= left or bottom <= top:
+            continue
+
+        # Draw the word alone, then copy its ink into the canvas-sized maps
+        glyph = Image.new("L", (right - left, bottom - top))
+        ImageDraw.Draw(glyph).text((-left, -top), word, fill=255, font=font)
+        x0, y0 = int(x * scale) + left, int(y * scale) + top
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x0 + glyph.width, width), min(y0 + glyph.height, height)
+        if cx1 <= cx0 or cy1 <= cy0:
+            continue
+        ink = np.asarray(glyph)[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+        region = coverage[cy0:cy1, cx0:cx1]
+        # Later words are drawn over earlier ones where their ink is at least as dense
+        covered = (ink > 0) & (ink >= region)
+        region[covered] = ink[covered]
+        labels[cy0:cy1, cx0:cx1][covered] = label
+
+    flat = coverage.ravel()
+    # uint32 indices halve what is sent back from the render workers
+    edges = np.flatnonzero((flat > 0) & (flat < 255)).astype(np.uint32)
+    return LabelMap(labels, edges, flat[edges])
+
+
+def paint_labels(label_map, background_color, colors=None, gradient_colormap=None):
+    """Paint a label map as an RGB array.
+
+    Words take their row of colors (n x 3 uint8), or with gradient_colormap
+    the gradient color of each pixel. Glyph edges are blended with the
+    background by their coverage.
+    """
+    background = np.array(ImageColor.getrgb(background_color)[:3], dtype=np.uint8)
+    if gradient_colormap is not None:
+        # One lookup over gradient steps, with an extra last entry for the background
+        palette = np.empty((GRADIENT_STEPS + 1, 3), dtype=np.uint8)
+        palette[:GRADIENT_STEPS] = gradient_palette(gradient_colormap)
+        palette[GRADIENT_STEPS] = background
+        index = np.where(label_map.labels > 0, label_map.gradient_index, GRADIENT_STEPS)
+        image = np.take(palette, index, axis=0)
+    else:
+        palette = np.empty((len(colors) + 1, 3), dtype=np.uint8)
+        palette[0] = background
+        palette[1:] = colors
+        image = np.take(palette, label_map.labels, axis=0)
+
+    # Anti-aliased edges: ink color weighted by coverage over the background
+    pixels = image.reshape(-1, 3)
+    ink = pixels[label_map.edges].astype(np.uint16)
+    alpha = label_map.edge_coverage[:, None].astype(np.uint16)
+    pixels[label_map.edges] = (ink * alpha + background * (255 - alpha) + 127) // 255
+    return image
+
+
+def layout_to_json(layout):
+    """Serialize a layout to a compact JSON string."""
+    return json.dumps(layout, separators=(",", ":"))
+
+
+def layout_from_json(data):
+    """Load a layout from a JSON string or bytes."""
+    layout = json.loads(data)
+    _check_version(layout)
+    return layout
+
+
+def layout_to_bytes(layout):
+    """Serialize a layout to the compact binary format.
+
+    The word and frequency tables are stored as NumPy columns next to a
+    NUL-separated string pool, and the whole body is zlib-compressed. The
+    frequency counts are int64 unless some are fractional weights, and
+    their column starts with a one-byte code from COUNT_TYPES.
+    """
+    meta = {key: value for key, value in layout.items() if key not in ("words", "frequencies")}
+    words = layout["words"]
+    frequencies = layout["frequencies"]
+
+    colors = np.array([ImageColor.getrgb(word[6])[:3] for word in words], dtype=np.uint8).reshape(-1, 3)
+    # Raw counts stay integers so both formats load the same values; relative weights are floats
+    counts = [count for _, count in frequencies]
+    count_code = b"i" if all(isinstance(count, int) for count in counts) else b"f"
+    sections = [
+        json.dumps(meta, separators=(",", ":")).encode("utf-8"),
+        "\0".join(word[0] for word in words).encode("utf-8"),
+        np.array([word[1] for word in words], dtype=np.float32).tobytes(),
+        np.array([word[2] for word in words], dtype=np.uint16).tobytes(),
+        np.array([[word[3], word[4]] for word in words], dtype=np.int32).tobytes(),
+        np.array([word[5] for word in words], dtype=np.uint8).tobytes(),
+        colors.tobytes(),
+        "\0".join(word for word, _ in frequencies).encode("utf-8"),
+        count_code + np.array(counts, dtype=COUNT_TYPES[count_code]).tobytes(),
+    ]
+
+    body = struct.pack("<II", len(words), len(frequencies))
+    for section in sections:
+        body += struct.pack("<I", len(section)) + section
+    return BINARY_MAGIC + zlib.compress(body, 9)
+
+
+def layout_from_bytes(data):
+    """Load a layout from the binary format produced by layout_to_bytes."""
+    if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("Not a binary word cloud layout")
+    body = zlib.decompress(data[len(BINARY_MAGIC):])
+    n_words, n_freq = struct.unpack_from("<II", body)
+
+    sections = []
+    offset = 8
+    while offset < len(body):
+        (size,) = struct.unpack_from("<I", body, offset)
+        sections.append(body[offset + 4:offset + 4 + size])
+        offset += 4 + size
+    meta, texts, freqs, sizes, positions, rotated, colors, freq_words, counts = sections
+
+    layout = json.loads(meta)
+    _check_version(layout)
+    texts = texts.decode("utf-8").split("\0") if n_words else []
+    freqs = np.frombuffer(freqs, dtype=np.float32)
+    sizes = np.frombuffer(sizes, dtype=np.uint16)
+    positions = np.frombuffer(positions, dtype=np.int32).reshape(-1, 2)
+    rotated = np.frombuffer(rotated, dtype=np.uint8)
+    colors = np.frombuffer(colors, dtype=np.uint8).reshape(-1, 3)
+    layout["words"] = [
+        [texts[i], float(freqs[i]), int(sizes[i]), int(positions[i, 0]), int(positions[i, 1]),
+         bool(rotated[i]), "rgb({}, {}, {})".format(*colors[i])]
+        for i in range(n_words)
+    ]
+
+    freq_words = freq_words.decode("utf-8").split("\0") if n_freq else []
+    counts = np.frombuffer(counts[1:], dtype=COUNT_TYPES[counts[:1]])
+    layout["frequencies"] = [[freq_words[i], counts[i].item()] for i in range(n_freq)]
+    return layout
+
+
+def save_layout(layout, path):
+    """Save a layout to disk, as JSON for .json paths and binary otherwise."""
+    if str(path).lower().endswith(".json"):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(layout_to_json(layout))
+    else:
+        with open(path, "wb") as file:
+            file.write(layout_to_bytes(layout))
+
+
+def load_layout(source):
+    """Load a layout from a path, bytes or an uploaded file, in either format."""
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    elif hasattr(source, "read"):
+        data = source.read()
+    else:
+        with open(source, "rb") as file:
+            data = file.read()
+
+    if data[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        return layout_from_bytes(data)
+    return layout_from_json(data)
+
+
+def _check_version(layout):
+    if layout.get("version") != LAYOUT_VERSION:
+        raise ValueError(f"Unsupported layout version: {layout.get('version')}")
+
+
+def write_svg(layout, out, background_color=None, embed_font=False):
+    """Write the layout as an SVG document to a binary file-like object."""
+    scale = layout["scale"]
+    width = int(layout["width"] * scale)
+    height = int(layout["height"] * scale)
+    font_path = layout["font_path"]
+    if not os.path.exists(font_path):
+        font_path = FONT_PATH
+    if background_color is None:
+        background_color = layout["background_color"]
+
+    family = _get_font(font_path, 12).getname()[0]
+
+    out.write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">\n'.encode("utf-8")
+    )
+    if embed_font:
+        with open(font_path, "rb") as font_file:
+            font_data = base64.b64encode(font_file.read()).decode("ascii")
+        out.write(
+            f"<style>@font-face{{font-family:{quoteattr(family)};"
+            f"src:url(data:font/ttf;base64,{font_data});}}</style>\n".encode("utf-8")
+        )
+    if background_color is not None:
+        out.write(f'<rect width="100%" height="100%" fill={quoteattr(str(background_color))}/>\n'.encode("utf-8"))
+
+    out.write(f'<g font-family={quoteattr(family)}>\n'.encode("utf-8"))
+    for word, _, font_size, x, y, rotated, color in layout["words"]:
+        size = int(font_size * scale)
+        font = _get_font(font_path, size)
+        ascent, _ = font.getmetrics()
+        x *= scale
+        y *= scale
+
+        # Match WordCloud's placement: the position is the top-left corner of
+        # the ink, which starts bbox_top below the ascender line; rotated words
+        # are turned 90 degrees counter-clockwise
+        _, bbox_top, text_width, _ = font.getbbox(word)
+        if rotated:
+            transform = f"translate({x + ascent - bbox_top:g},{y + text_width:g}) rotate(-90)"
+        else:
+            transform = f"translate({x:g},{y + ascent - bbox_top:g})"
+
+        out.write(
+            f'<text transform="{transform}" font-size="{size}" fill={quoteattr(color)}>'
+            f"{escape(word)}</text>\n".encode("utf-8")
+        )
+    out.write(b"</g>\n</svg>\n")
+    return out
+
+
+def write_png(layout, out, scale=None, background_color=None, dpi=None, contour=None, contour_colormap="viridis",
+              memory_budget=PNG_STRIP_BUDGET, size=None, progress=None):
+    """Rasterize the layout as a PNG in horizontal strips, streamed to a binary file-like object.
+
+    Only one strip of pixels exists at a time, so memory stays within
+    memory_budget whatever the output size. size, a (width, height) pair,
+    sets the exact image size instead of scale; positions are then scaled on
+    each axis and font sizes by the smaller factor. contour, a boolean mask at
+    any resolution, is stretched to the image and drawn as a gradient in
+    contour_colormap, like the shape border on screen. progress, if given, is
+    called with the fraction of rows written after each strip.
+    """
+    if size is not None:
+        width, height = size
+        scale_x, scale_y = width / layout["width"], height / layout["height"]
+    else:
+        if scale is None:
+            scale = layout["scale"]
+        width = int(layout["width"] * scale)
+        height = int(layout["height"] * scale)
+        scale_x = scale_y = scale
+    if background_color is None:
+        background_color = layout["background_color"]
+    font_scale = min(scale_x, scale_y)
+    strip_height = max(1, min(height, memory_budget // (width * 3 * PNG_STRIP_COPIES)))
+
+    # Vertical extent of every word, so each strip only draws the words crossing it
+    placed = []
+    for word, _, font_size, x, y, rotated, color in layout["words"]:
+        font = _get_word_font(layout["font_path"], max(int(font_size * font_scale), 1), rotated)
+        x, y = int(x * scale_x), int(y * scale_y)
+        _, top, _, bottom = font.getbbox(word)
+        placed.append((y + top, y + bottom, x, y, word, font, color))
+
+    if contour is not None:
+        cmap = colormaps[contour_colormap]
+        contour_cols = np.arange(width) * contour.shape[1] // width
+
+    out.write(PNG_SIGNATURE)
+    _write_png_chunk(out, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    if dpi:
+        pixels_per_meter = round(dpi / 0.0254)
+        _write_png_chunk(out, b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+
+    compressor = zlib.compressobj(6)
+    previous_row = np.zeros(width * 3, dtype=np.uint8)
+    for strip_top in range(0, height, strip_height):
+        strip_bottom = min(strip_top + strip_height, height)
+        strip = Image.new("RGB", (width, strip_bottom - strip_top), background_color)
+        draw = ImageDraw.Draw(strip)
+        for word_top, word_bottom, x, y, word, font, color in placed:
+            if word_top < strip_bottom and word_bottom > strip_top:
+                draw.text((x, y - strip_top), word, fill=color, font=font)
+        pixels = np.array(strip)
+        del strip, draw
+
+        if contour is not None:
+            contour_rows = np.arange(strip_top, strip_bottom) * contour.shape[0] // height
+            ys, xs = np.nonzero(contour[np.ix_(contour_rows, contour_cols)])
+            positions = (ys + strip_top + xs) / (height + width)
+            pixels[ys, xs] = (cmap(positions)[:, :3] * 255).astype(np.uint8)
+
+        # PNG "Up" filter: each row minus the row above it, wrapping mod 256
+        rows = pixels.reshape(len(pixels), width * 3)
+        filtered = np.empty((len(rows), width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[0, 1:] = rows[0] - previous_row
+        filtered[1:, 1:] = rows[1:] - rows[:-1]
+        previous_row = rows[-1].copy()
+        del pixels, rows
+
+        data = compressor.compress(filtered.tobytes())
+        if data:
+            _write_png_chunk(out, b"IDAT", data)
+        if progress is not None:
+            progress(strip_bottom / height)
+
+    _write_png_chunk(out, b"IDAT", compressor.flush())
+    _write_png_chunk(out, b"IEND", b"")
+    return out
+
+
+def _write_png_chunk(out, kind, data):
+    out.write(struct.pack(">I", len(data)))
+    out.write(kind)
+    out.write(data)
+    out.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
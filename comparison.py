@@ -0,0 +1,58 @@
+"""Side-by-side comparison of several documents.
+
+Documents are counted in a process pool, then combined into one sparse
+document-term matrix for the shared color scale and TF-IDF weighting.
+"""
+from collections import Counter
+from concurrent.futures import as_completed
+
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.feature_extraction.text import TfidfTransformer
+
+from document_processing import count_document
+from render_pool import pool_submit
+
+
+def count_documents(executor, documents):
+    """Count (name, data, file_type) documents concurrently.
+
+    Yields (index, name, word_count, Counter) tuples in completion order so
+    callers can report progress per document; index is the position in
+    documents, as names need not be unique.
+    """
+    futures = {pool_submit(executor, count_document, name, data, file_type): index
+               for index, (name, data, file_type) in enumerate(documents)}
+    for future in as_completed(futures):
+        yield (futures[future],) + tuple(future.result())
+
+
+def compare_counts(counts, max_words=200):
+    """Combine per-document Counters.
+
+    Returns the combined Counter, the largest count of any word in any single
+    document (for a shared color scale), and one {word: tf-idf weight} dict per
+    document holding its most distinctive words.
+    """
+    vectorizer = DictVectorizer(dtype=np.float64)
+    matrix = vectorizer.fit_transform(counts).tocsr()
+    vocabulary = vectorizer.get_feature_names_out()
+
+    combined_counts = np.asarray(matrix.sum(axis=0)).ravel()
+    order = np.argsort(-combined_counts, kind="stable")
+    combined = Counter(dict(zip(vocabulary[order], combined_counts[order].astype(np.int64).tolist())))
+    global_max = matrix.max() if matrix.nnz else 1
+
+    tfidf = TfidfTransformer(sublinear_tf=True).fit_transform(matrix).tocsr()
+    distinctive = []
+    for row in range(tfidf.shape[0]):
+        start, end = tfidf.indptr[row], tfidf.indptr[row + 1]
+        weights = tfidf.data[start:end]
+        columns = tfidf.indices[start:end]
+        if len(weights) > max_words:
+            top = np.argpartition(-weights, max_words)[:max_words]
+            weights, columns = weights[top], columns[top]
+        distinctive.append(dict(zip(vocabulary[columns], weights.tolist())))
+
+    return combined, float(global_max), distinctive
+
@@ -0,0 +1,159 @@
+"""Persistent index of per-document word counts.
+
+Documents are stored once, keyed by the SHA-1 of their bytes, with their
+word counts in a SQLite database, so clouds over any subset of a corpus can
+be built later without parsing the source files again. Corpus-wide totals
+are kept up to date on every append, so the unfiltered top-K query reads a
+single table.
+"""
+import sqlite3
+import threading
+import time
+
+from frequency_table import FrequencyTable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    sha1 TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    word_count INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vocab (
+    id INTEGER PRIMARY KEY,
+    word TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS counts (
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    word_id INTEGER NOT NULL REFERENCES vocab(id),
+    count INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, word_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_word ON counts (word_id, doc_id);
+CREATE TABLE IF NOT EXISTS totals (
+    word_id INTEGER PRIMARY KEY REFERENCES vocab(id),
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS totals_by_count ON totals (count DESC);
+"""
+
+# SQLite limits the number of parameters in one statement
+BATCH_SIZE = 500
+
+
+class CorpusIndex:
+    """Word counts of many documents, queryable by document subset."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def add_document(self, sha1, name, word_count, counts):
+        """Add a document's counts unless it is already indexed; returns its id."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM documents WHERE sha1 = ?", (sha1,)).fetchone()
+            if row is not None:
+                return row[0]
+
+            doc_id = self._conn.execute(
+                "INSERT INTO documents (sha1, name, word_count, added_at) VALUES (?, ?, ?, ?)",
+                (sha1, name, int(word_count), time.time())
+            ).lastrowid
+            items = [(word, int(count)) for word, count in counts.items() if count > 0]
+            word_ids = self._word_ids([word for word, _ in items])
+            rows = [(doc_id, word_ids[word], count) for word, count in items]
+            self._conn.executemany("INSERT INTO counts (doc_id, word_id, count) VALUES (?, ?, ?)", rows)
+            self._conn.executemany(
+                "INSERT INTO totals (word_id, count) VALUES (?, ?) "
+                "ON CONFLICT (word_id) DO UPDATE SET count = count + excluded.count",
+                [(word_id, count) for _, word_id, count in rows]
+            )
+            return doc_id
+
+    def remove_document(self, doc_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE totals SET count = count - "
+                "(SELECT count FROM counts WHERE counts.doc_id = ? AND counts.word_id = totals.word_id) "
+                "WHERE word_id IN (SELECT word_id FROM counts WHERE doc_id = ?)",
+                (doc_id, doc_id)
+            )
+            self._conn.execute("DELETE FROM totals WHERE count <= 0")
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def has_document(self, sha1):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE sha1 = ?", (sha1,)).fetchone() is not None
+
+    def documents(self, name_like=None, containing=None):
+        """Indexed documents, optionally filtered by name pattern and by words they contain."""
+        where, params = _document_filter(name_like=name_like, containing=containing)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, name, word_count, added_at FROM documents {where} ORDER BY added_at, id", params
+            ).fetchall()
+        return [{'id': doc_id, 'name': name, 'word_count': word_count, 'added_at': added_at}
+                for doc_id, name, word_count, added_at in rows]
+
+    def top_terms(self, k=200, doc_ids=None, name_like=None, containing=None):
+        """The k most frequent words over the documents matching every given filter."""
+        with self._lock:
+            if doc_ids is None and name_like is None and not containing:
+                rows = self._conn.execute(
+                    "SELECT vocab.word, totals.count FROM totals JOIN vocab ON vocab.id = totals.word_id "
+                    "ORDER BY totals.count DESC, vocab.word LIMIT ?", (k,)
+                ).fetchall()
+            else:
+                where, params = _document_filter(doc_ids, name_like, containing)
+                rows = self._conn.execute(
+                    "SELECT vocab.word, SUM(counts.count) AS total FROM counts "
+                    "JOIN vocab ON vocab.id = counts.word_id "
+                    f"WHERE counts.doc_id IN (SELECT id FROM documents {where}) "
+                    "GROUP BY counts.word_id ORDER BY total DESC, vocab.word LIMIT ?", params + [k]
+                ).fetchall()
+        return FrequencyTable.from_counts(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _word_ids(self, words):
+        # Called with the lock held, inside a transaction
+        self._conn.executemany("INSERT OR IGNORE INTO vocab (word) VALUES (?)", ((word,) for word in words))
+        word_ids = {}
+        for start in range(0, len(words), BATCH_SIZE):
+            batch = words[start:start + BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            word_ids.update(self._conn.execute(
+                f"SELECT word, id FROM vocab WHERE word IN ({placeholders})", batch
+            ).fetchall())
+        return word_ids
+
+
+def _document_filter(doc_ids=None, name_like=None, containing=None):
+    """WHERE clause over documents for the given filters, and its parameters."""
+    clauses = []
+    params = []
+    if doc_ids is not None:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            clauses.append("0")
+        else:
+            clauses.append(f"id IN ({','.join('?' * len(doc_ids))})")
+            params.extend(doc_ids)
+    if name_like:
+        clauses.append("name LIKE ?")
+        params.append(f"%{name_like}%")
+    for word in containing or ():
+        clauses.append(
+            "id IN (SELECT counts.doc_id FROM counts JOIN vocab ON vocab.id = counts.word_id "
+            "WHERE vocab.word = ?)"
+        )
+        params.append(word)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
@@ -0,0 +1,357 @@
+"""Text extraction and preprocessing.
+
+Kept outside app.py so worker processes can import it without running the
+Streamlit script.
+"""
+import hashlib
+import itertools
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+from io import BytesIO
+
+import PyPDF2
+from docx import Document
+
+from frequency_table import FrequencyTable
+from sampling import choose_units, estimate_totals
+from timeline import SectionTimeline
+from tokenization import CHUNK_SIZE, iter_chunks, preprocess_words, resolve_language
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# WordprocessingML tags read by the streaming DOCX extractor
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BREAKS = (W_NS + "br", W_NS + "cr")
+W_TBL = W_NS + "tbl"
+DOCX_EXTRA_PARTS = re.compile(r"word/(header\d*|footer\d*|footnotes|endnotes)\.xml$")
+
+# DOCX paragraphs are sampled in blocks of this many
+DOCX_SAMPLE_BLOCK = 50
+
+
+def extract_text_from_pdf(file):
+    pdf_reader = PyPDF2.PdfReader(file)
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def iter_docx_paragraphs(file, include_extra_parts=True):
+    """Yield paragraph text from a DOCX file without building its object model.
+
+    The XML parts are streamed out of the zip and parsed incrementally, and
+    each paragraph is cleared once yielded, so memory stays bounded for large
+    documents. Paragraphs inside tables are included; headers, footers,
+    footnotes and endnotes follow the body when include_extra_parts is set.
+    """
+    with zipfile.ZipFile(file) as docx_zip:
+        parts = ["word/document.xml"]
+        if include_extra_parts:
+            parts += sorted(name for name in docx_zip.namelist() if DOCX_EXTRA_PARTS.match(name))
+        for part_name in parts:
+            with docx_zip.open(part_name) as part:
+                yield from _iter_part_paragraphs(part)
+
+
+def _iter_part_paragraphs(part):
+    pieces = []
+    # Open elements, so finished paragraphs and tables can be removed from their parent
+    parents = []
+    for event, elem in ET.iterparse(part, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        tag = elem.tag
+        if tag == W_T:
+            pieces.append(elem.text or "")
+        elif tag == W_TAB:
+            pieces.append("\t")
+        elif tag in W_BREAKS:
+            pieces.append("\n")
+        elif tag == W_P:
+            yield "".join(pieces)
+            pieces = []
+            _discard(elem, parents)
+        elif tag == W_TBL:
+            _discard(elem, parents)
+
+
+def _discard(elem, parents):
+    # Clearing alone leaves an empty element behind in the parent for every paragraph
+    elem.clear()
+    if parents:
+        parents[-1].remove(elem)
+
+
+def extract_text_from_docx(file):
+    """Extract text from a DOCX file."""
+    return '\n'.join(iter_docx_paragraphs(file))
+
+
+def extract_text_from_docx_object_model(file):
+    """Extract body paragraphs through python-docx (reference path for benchmarks)."""
+    doc = Document(file)
+    full_text = []
+    for para in doc.paragraphs:
+        full_text.append(para.text)
+    return '\n'.join(full_text)
+
+
+def extract_text_from_txt(file):
+    return file.getvalue().decode("utf-8")
+
+
+def extract_text(file, file_type):
+    """Extract text from an uploaded file based on its MIME type."""
+    if file_type == PDF_MIME:
+        return extract_text_from_pdf(file)
+    elif file_type == DOCX_MIME:
+        return extract_text_from_docx(file)
+    else:  # Assume TXT
+        return extract_text_from_txt(file)
+
+
+def preprocess_text(text, language=None):
+    """Lowercase, strip punctuation and digits, and drop stopwords and short words.
+
+    The language is detected from the text unless given, with a fast path
+    for English text.
+    """
+    return ' '.join(preprocess_words(text, language))
+
+
+def count_document(name, data, file_type):
+    """Extract, preprocess and count one document given its raw bytes.
+
+    Runs in worker processes, so it only takes and returns picklable values.
+    """
+    if file_type == DOCX_MIME:
+        word_count, word_counts = count_paragraphs(iter_docx_paragraphs(BytesIO(data)))
+        return name, word_count, word_counts
+
+    text = extract_text(BytesIO(data), file_type)
+    word_counts = Counter(preprocess_text(text).split())
+    return name, len(text.split()), word_counts
+
+
+def count_paragraphs(paragraphs):
+    """Count words from an iterable of paragraphs, one paragraph at a time.
+
+    The language is resolved once from the opening paragraphs and used for
+    all of them. Returns the raw word count and a Counter of preprocessed
+    words.
+    """
+    language, paragraphs = resolve_leading_language(paragraphs)
+    word_count = 0
+    word_counts = Counter()
+    for paragraph in paragraphs:
+        word_count += len(paragraph.split())
+        word_counts.update(preprocess_text(paragraph, language).split())
+    return word_count, word_counts
+
+
+def resolve_leading_language(parts, size=CHUNK_SIZE):
+    """Resolve the language of a stream of text parts from about size characters at its start.
+
+    Returns the language and an iterator over all the parts, including the
+    ones read to resolve it.
+    """
+    parts = iter(parts)
+    head = []
+    length = 0
+    for part in parts:
+        head.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    return resolve_language('\n'.join(head)), itertools.chain(head, parts)
+
+
+def split_blocks(data, file_type):
+    """Split a DOCX into blocks of paragraphs, or a text file into chunks.
+
+    Returns the blocks and the name of the unit.
+    """
+    if file_type == DOCX_MIME:
+        paragraphs = list(iter_docx_paragraphs(BytesIO(data)))
+        blocks = ['\n'.join(paragraphs[i:i + DOCX_SAMPLE_BLOCK])
+                  for i in range(0, len(paragraphs), DOCX_SAMPLE_BLOCK)]
+        return blocks, "paragraph blocks"
+    return list(iter_chunks(data.decode("utf-8"))), "text chunks"
+
+
+def sample_docx_blocks(data):
+    """Return the paragraph block count of a DOCX and the text of the sampled blocks.
+
+    The paragraphs are streamed twice: once to count them and once to join
+    only the chosen blocks, so the full text is never held in memory. The
+    chosen block indices are None when the document is too small to sample.
+    """
+    total_paragraphs = sum(1 for _ in iter_docx_paragraphs(BytesIO(data)))
+    total = -(-total_paragraphs // DOCX_SAMPLE_BLOCK)
+    chosen = choose_units(total)
+    if chosen is None:
+        return total, None, []
+    wanted = set(chosen)
+    blocks = {}
+    for i, paragraph in enumerate(iter_docx_paragraphs(BytesIO(data))):
+        block = i // DOCX_SAMPLE_BLOCK
+        if block in wanted:
+            blocks.setdefault(block, []).append(paragraph)
+    return total, chosen, ['\n'.join(blocks.get(i, [])) for i in chosen]
+
+
+def sample_text_chunks(data, size=CHUNK_SIZE):
+    """Return the chunk count of UTF-8 text and the text of the sampled chunks.
+
+    Chunks are byte ranges of about size bytes, so only the sampled ranges
+    are decoded. Each boundary is moved to the next space or line break
+    within size bytes, so every shorter word belongs to exactly one chunk. Text
+    without either (Chinese, Japanese) is cut at the first character
+    boundary instead; neither cut falls inside a multi-byte character.
+    """
+    total = -(-len(data) // size)
+    chosen = choose_units(total)
+    if chosen is None:
+        return total, None, []
+    return total, chosen, [_text_chunk(data, i, size) for i in chosen]
+
+
+def _text_chunk(data, index, size):
+    start = _next_break(data, index * size, size) if index else 0
+    end = _next_break(data, (index + 1) * size, size)
+    return data[start:end].decode("utf-8")
+
+
+def _next_break(data, position, window):
+    end = position + window
+    breaks = [found for found in (data.find(b" ", position, end), data.find(b"\n", position, end)) if found != -1]
+    if breaks:
+        return min(breaks) + 1
+    # Skip UTF-8 continuation bytes to the start of the next character
+    while position < len(data) and data[position] & 0xC0 == 0x80:
+        position += 1
+    return min(position, len(data))
+
+
+def process_upload(job, data, file_type, max_words=400, corpus=None, name=None):
+    """Background job: extract, preprocess and count an uploaded document.
+
+    Reports progress per PDF page or per block of DOCX paragraphs and stops
+    as soon as the job is cancelled. The full counts are added to the corpus
+    index when one is given. Returns the raw text, the preprocessed text and
+    a FrequencyTable of the top words.
+    """
+    if file_type == PDF_MIME:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(data))
+        total = len(pdf_reader.pages)
+        pages = []
+        for i, page in enumerate(pdf_reader.pages):
+            job.set_progress(0.8 * i / total, f"Extracting page {i + 1} of {total}")
+            pages.append(page.extract_text())
+        text = "".join(pages)
+    elif file_type == DOCX_MIME:
+        paragraphs = []
+        for paragraph in iter_docx_paragraphs(BytesIO(data)):
+            paragraphs.append(paragraph)
+            if len(paragraphs) % 500 == 0:
+                job.set_progress(0.4, f"Extracted {len(paragraphs)} paragraphs")
+        text = '\n'.join(paragraphs)
+    else:
+        text = data.decode("utf-8")
+
+    job.set_progress(0.85, "Preprocessing text")
+    processed_text = preprocess_text(text)
+
+    job.set_progress(0.95, "Counting words")
+    word_counts = Counter(processed_text.split())
+    if corpus is not None:
+        corpus.add_document(hashlib.sha1(data).hexdigest(), name, len(text.split()), word_counts)
+    frequencies = FrequencyTable.from_counts(word_counts).top(max_words)
+    return text, processed_text, frequencies
+
+
+def sample_upload(job, data, file_type, max_words=400):
+    """Background job: estimate the word counts of a large document from a sample.
+
+    PDFs are sampled by page, so only the sampled pages are extracted; DOCX
+    files by blocks of paragraphs and text files by byte chunks, keeping and
+    decoding only the sampled ones. Returns None when
+    the document is too small for sampling to pay off, otherwise the
+    estimates from sampling.estimate_totals plus the sampled processed text
+    and the sample size.
+    """
+    if file_type == PDF_MIME:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(data))
+        total = len(pdf_reader.pages)
+        unit = "pages"
+        chosen = choose_units(total)
+        if chosen is None:
+            return None
+        units = []
+        for i, page_number in enumerate(chosen):
+            job.set_progress(0.5 * i / len(chosen), f"Sampling page {page_number + 1}")
+            units.append(pdf_reader.pages[page_number].extract_text())
+    else:
+        if file_type == DOCX_MIME:
+            job.set_progress(0.0, "Counting paragraphs")
+            total, chosen, units = sample_docx_blocks(data)
+            unit = "paragraph blocks"
+        else:
+            total, chosen, units = sample_text_chunks(data)
+            unit = "text chunks"
+        if chosen is None:
+            return None
+
+    # One language for the whole sample, so every unit is filtered the same way
+    language = resolve_language('\n'.join(units))
+    processed = []
+    for i, unit_text in enumerate(units):
+        job.set_progress(0.5 + 0.4 * i / len(units), "Preprocessing sample")
+        processed.append(preprocess_text(unit_text, language))
+
+    job.set_progress(0.9, "Estimating counts")
+    estimate = estimate_totals([Counter(text.split()) for text in processed], total, max_words=max_words)
+    estimate.update({
+        'processed_text': ' '.join(filter(None, processed)),
+        'sampled': len(chosen),
+        'total': total,
+        'unit': unit,
+    })
+    return estimate
+
+
+def count_sections(job, data, file_type):
+    """Background job: count each page or block of a document for a timeline.
+
+    PDFs are split by page, DOCX files by blocks of paragraphs and text
+    files by chunks, all counted in the language of the opening sections.
+    Returns a SectionTimeline.
+    """
+    if file_type == PDF_MIME:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(data))
+        sections = (page.extract_text() for page in pdf_reader.pages)
+        total = len(pdf_reader.pages)
+        labels = [f"Page {i + 1}" for i in range(total)]
+    else:
+        sections, _ = split_blocks(data, file_type)
+        total = len(sections)
+        name = "Block" if file_type == DOCX_MIME else "Chunk"
+        labels = [f"{name} {i + 1}" for i in range(total)]
+
+    language, sections = resolve_leading_language(sections)
+    section_counts = []
+    for i, section in enumerate(sections):
+        job.set_progress(0.9 * i / max(total, 1), f"Counting section {i + 1} of {total}")
+        section_counts.append(Counter(preprocess_text(section, language).split()))
+
+    job.set_progress(0.95, "Building timeline")
+    return SectionTimeline.from_sections(section_counts, labels)
@@ -0,0 +1,271 @@
+"""Compact word frequency tables.
+
+Words live in a single string pool addressed by an offsets array and counts
+in a NumPy array, sorted once by descending count. Exports are generated on
+first use and cached on the table.
+"""
+import csv
+import io
+import json
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Paragraphs are separated by blank lines
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class FrequencyTable:
+    """Word counts sorted by descending frequency."""
+
+    def __init__(self, pool, offsets, counts):
+        self._pool = pool
+        self._offsets = offsets
+        self.counts = counts
+        self._exports = {}
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Build a table from a mapping or an iterable of (word, count) pairs."""
+        items = counts.items() if hasattr(counts, "items") else counts
+        words = []
+        values = []
+        for word, count in items:
+            words.append(word)
+            values.append(count)
+        values = np.asarray(values, dtype=np.int64)
+
+        # Stable sort keeps insertion order for ties, like Counter.most_common
+        order = np.argsort(-values, kind="stable")
+        words = [words[i] for i in order]
+        lengths = np.fromiter((len(word) for word in words), dtype=np.int64, count=len(words))
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls("".join(words), offsets, values[order])
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __bool__(self):
+        return len(self.counts) > 0
+
+    def __iter__(self):
+        for i in range(len(self.counts)):
+            yield self.word(i), int(self.counts[i])
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the string pool and arrays, not counting cached exports."""
+        return sys.getsizeof(self._pool) + self._offsets.nbytes + self.counts.nbytes
+
+    def word(self, i):
+        return self._pool[self._offsets[i]:self._offsets[i + 1]]
+
+    @property
+    def words(self):
+        """Words as a NumPy object array, built once per table."""
+        if "words" not in self._exports:
+            self._exports["words"] = np.array([self.word(i) for i in range(len(self))], dtype=object)
+        return self._exports["words"]
+
+    def top(self, k):
+        """Return the k most frequent words; the slices share memory with this table."""
+        if k >= len(self):
+            return self
+        return FrequencyTable(self._pool, self._offsets[:k + 1], self.counts[:k])
+
+    def to_dict(self):
+        return dict(self)
+
+    def to_dataframe(self):
+        """Word/Count DataFrame over the table's arrays, without copying counts."""
+        if "dataframe" not in self._exports:
+            self._exports["dataframe"] = pd.DataFrame({"Word": self.words, "Count": self.counts}, copy=False)
+        return self._exports["dataframe"]
+
+    def to_csv(self):
+        if "csv" not in self._exports:
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator="\n")
+            writer.writerow(["Word", "Count"])
+            writer.writerows(self)
+            self._exports["csv"] = buf.getvalue()
+        return self._exports["csv"]
+
+    def to_txt(self):
+        if "txt" not in self._exports:
+            self._exports["txt"] = "\n".join(f"{word}: {count}" for word, count in self)
+        return self._exports["txt"]
+
+    def to_json(self):
+        if "json" not in self._exports:
+            self._exports["json"] = json.dumps([{"text": word, "value": count} for word, count in self])
+        return self._exports["json"]
+
+
+class IncrementalFrequencyIndex:
+    """Word counts for a text that is edited a paragraph at a time.
+
+    On update the new text is split into paragraphs and only paragraphs that
+    were not in the previous version are preprocessed; counts of removed and
+    added paragraphs are applied as deltas.
+
+    The language is resolved from the whole text and every paragraph is
+    preprocessed with it, so short paragraphs are filtered like long ones.
+    If an edit changes the language, everything is counted again.
+    """
+
+    def __init__(self, preprocess, resolve_language):
+        self._preprocess = preprocess
+        self._resolve_language = resolve_language
+        self.language = None
+        self._reset()
+
+    def _reset(self):
+        self._paragraphs = Counter()
+        self._order = []
+        self._processed = {}
+        self.counts = Counter()
+
+    def update(self, text):
+        """Bring the index up to date with text; returns True if anything changed."""
+        order = [paragraph for paragraph in PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+        if order == self._order:
+            return False
+        language = self._resolve_language(text)
+        if language != self.language:
+            self._reset()
+            self.language = language
+        paragraphs = Counter(order)
+
+        for paragraph, times in (self._paragraphs - paragraphs).items():
+            self._apply(paragraph, -times)
+        for paragraph, times in (paragraphs - self._paragraphs).items():
+            self._apply(paragraph, times)
+
+        # Forget paragraphs that are gone from the text
+        for paragraph in self._paragraphs.keys() - paragraphs.keys():
+            del self._processed[paragraph]
+        self._paragraphs = paragraphs
+        self._order = order
+        return True
+
+    @property
+    def processed_text(self):
+        """Preprocessed text of the whole document, in paragraph order."""
+        return ' '.join(filter(None, (self._processed[paragraph][0] for paragraph in self._order)))
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the paragraphs, their preprocessed text and the counts."""
+        size = sys.getsizeof(self.counts) + sum(sys.getsizeof(word) for word in self.counts)
+        for paragraph, (processed, counts) in self._processed.items():
+            size += sys.getsizeof(paragraph) + sys.getsizeof(processed) + sys.getsizeof(counts)
+        return size
+
+    def table(self, max_words=None):
+        table = FrequencyTable.from_counts(self.counts)
+        return table if max_words is None else table.top(max_words)
+
+    def _apply(self, paragraph, times):
+        if paragraph not in self._processed:
+            processed = self._preprocess(paragraph, self.language)
+            self._processed[paragraph] = (processed, Counter(processed.split()))
+        for word, count in self._processed[paragraph][1].items():
+            total = self.counts[word] + count * times
+            if total > 0:
+                self.counts[word] = total
+            else:
+                del self.counts[word]
+
+
+# Word forms for counting: words as written, WordNet lemmas or Porter stems
+WORD_FORMS = ("words", "lemmas", "stems")
+
+
+@lru_cache(maxsize=None)
+def _get_normalizer(word_form):
+    if word_form == "lemmas":
+        import nltk
+        from nltk.stem import WordNetLemmatizer
+
+        # WordNet is only fetched once lemmatized counting is first used
+        try:
+            nltk.data.find('corpora/wordnet')
+            nltk.data.find('corpora/omw-1.4')
+        except LookupError:
+            nltk.download('wordnet')
+            nltk.download('omw-1.4')
+        return lru_cache(maxsize=200000)(WordNetLemmatizer().lemmatize)
+    if word_form == "stems":
+        from nltk.stem import PorterStemmer
+        return lru_cache(maxsize=200000)(PorterStemmer().stem)
+    raise ValueError(f"Unknown word form: {word_form}")
+
+
+def count_terms(words, max_n=1, word_form="words", max_terms=None):
+    """Count words and n-grams of up to max_n words in a token sequence.
+
+    Tokens are mapped to integer ids once; lemmatization or stemming is applied
+    to the unique vocabulary only (memoized across calls) and the ids remapped
+    with a NumPy lookup. Each n-gram is hashed to a single int64 code so that
+    counting is one np.unique per n. Ties are ordered by first occurrence, like
+    Counter.most_common.
+
+    Every n-gram length is counted over the whole sequence, so the words of a
+    phrase are also counted on their own and rank at least as high as it.
+    """
+    index = {}
+    ids = np.fromiter((index.setdefault(word, len(index)) for word in words), dtype=np.int64, count=len(words))
+    vocabulary = list(index)
+
+    if word_form != "words" and vocabulary:
+        normalize = _get_normalizer(word_form)
+        normalized_index = {}
+        remap = np.fromiter(
+            (normalized_index.setdefault(normalize(word), len(normalized_index)) for word in vocabulary),
+            dtype=np.int64, count=len(vocabulary)
+        )
+        ids = remap[ids]
+        vocabulary = list(normalized_index)
+
+    vocabulary = np.array(vocabulary, dtype=object)
+    size = max(len(vocabulary), 1)
+    terms = []
+    counts = []
+    for n in range(1, max_n + 1):
+        if len(ids) < n:
+            break
+        windows = [ids[k:len(ids) - n + 1 + k] for k in range(n)]
+        if size ** n < 2 ** 63:
+            codes = np.zeros(len(windows[0]), dtype=np.int64)
+            for window in windows:
+                codes = codes * size + window
+            codes, first, ngram_counts = np.unique(codes, return_index=True, return_counts=True)
+            ngrams = np.empty((len(codes), n), dtype=np.int64)
+            for k in range(n - 1, -1, -1):
+                codes, ngrams[:, k] = np.divmod(codes, size)
+        else:
+            ngrams, first, ngram_counts = np.unique(np.stack(windows, axis=1), axis=0,
+                                                    return_index=True, return_counts=True)
+
+        # Only build strings for n-grams that can make the cut; ties at the cut go to the first seen
+        keep = np.arange(len(ngram_counts))
+        if max_terms is not None and len(ngram_counts) > max_terms:
+            cut = np.partition(ngram_counts, len(ngram_counts) - max_terms)[len(ngram_counts) - max_terms]
+            keep = np.flatnonzero(ngram_counts >= cut)
+        keep = keep[np.lexsort((first[keep], -ngram_counts[keep]))][:max_terms]
+        ngrams, ngram_counts = ngrams[keep], ngram_counts[keep]
+        if n == 1:
+            terms.extend(vocabulary[ngrams[:, 0]])
+        else:
+            terms.extend(' '.join(vocabulary[row]) for row in ngrams)
+        counts.append(ngram_counts)
+
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    table = FrequencyTable.from_counts(zip(terms, counts.tolist()))
+    return table if max_terms is None else table.top(max_terms)
@@ -0,0 +1,163 @@
+"""Background jobs that outlive a single Streamlit script run.
+
+The app submits long-running work (document extraction and counting) to a
+shared JobRegistry and polls it on each rerun. Jobs are keyed by an id derived
+from the session and its input, so a rerun finds the job already running
+instead of starting over, and a job can be cancelled when its input goes away.
+Finished jobs keep their results only until the session picks them up: they
+are pruned by count, age and total result size.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_store import estimate_size
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when the job has been cancelled."""
+
+
+class Job:
+    """Status, progress and result of one background job."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.result_size = 0
+        self.error = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def set_progress(self, fraction, message=None):
+        """Report progress from inside the job, stopping if it was cancelled."""
+        self.check_cancelled()
+        self.progress = min(max(fraction, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.status == QUEUED:
+            self._finish(CANCELLED, "Cancelled")
+
+    def _finish(self, status, message):
+        self.status = status
+        self.message = message
+        self.finished_at = time.monotonic()
+
+
+class JobRegistry:
+    """Thread pool plus a registry of jobs by id.
+
+    Finished jobs are kept for at most max_finished_age seconds, and only the
+    newest keep_finished of them whose results fit in max_finished_bytes.
+    Jobs finished less than grace seconds ago are always kept, so the session
+    polling them can pick up the result.
+    """
+
+    def __init__(self, max_workers=4, keep_finished=64, max_finished_age=300,
+                 max_finished_bytes=128 * 2**20, grace=30):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wordcloud-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._keep_finished = keep_finished
+        self._max_finished_age = max_finished_age
+        self._max_finished_bytes = max_finished_bytes
+        self._grace = grace
+
+    def submit(self, job_id, func, *args, restart=False, **kwargs):
+        """Start func(job, *args, **kwargs) unless a job with this id exists.
+
+        An existing job is returned as is, except that failed or cancelled
+        jobs are started again when restart is set.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not (restart and (job.cancelled or job.status == FAILED)):
+                return job
+
+            job = Job(job_id)
+            self._jobs[job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        """Drop a finished job and its result from the registry."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.active:
+                del self._jobs[job_id]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None and job.active:
+            job.cancel()
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancelled:
+            job._finish(CANCELLED, "Cancelled")
+            return
+        job.status = RUNNING
+        job.message = "Running"
+        try:
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED, "Cancelled")
+        except Exception as e:
+            job.error = f"{e}\n{traceback.format_exc()}"
+            job._finish(FAILED, str(e))
+        else:
+            job.result = result
+            job.result_size = estimate_size(result)
+            job.progress = 1.0
+            job._finish(DONE, "Done")
+        with self._lock:
+            self._prune()
+
+    def result_bytes(self):
+        """Approximate bytes held by the results of finished jobs."""
+        with self._lock:
+            return sum(job.result_size for job in self._jobs.values() if not job.active)
+
+    def _prune(self):
+        # Keep the newest finished jobs within the count, age and size limits
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if not job.active]
+        finished.sort(key=lambda job: job.finished_at, reverse=True)
+        kept = 0
+        kept_bytes = 0
+        for job in finished:
+            age = now - job.finished_at
+            if age >= self._grace and (kept >= self._keep_finished or age > self._max_finished_age
+                                        or kept_bytes + job.result_size > self._max_finished_bytes):
+                del self._jobs[job.id]
+                continue
+            kept += 1
+            kept_bytes += job.result_size
@@ -0,0 +1,208 @@
+"""Shape masks for word clouds.
+
+Masks are plain 2-D uint8 arrays: 0 where words may be placed, 255 outside
+the shape. Besides the built-in shapes, an uploaded image can be used as a
+mask: it is registered once under a shape name derived from its SHA-256, and
+get_mask decodes, fits and thresholds it once per (image, width, height).
+Every prepared mask also carries its free pixel count and contour.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+# Shape names of uploaded images start with this, followed by the image hash
+IMAGE_SHAPE_PREFIX = "image:"
+
+# Image pixels darker than this are inside the shape
+MASK_THRESHOLD = 128
+
+# Uploaded images kept for decoding at new sizes
+MAX_MASK_IMAGES = 16
+
+_mask_images = OrderedDict()
+_mask_images_lock = threading.Lock()
+
+
+def create_shape_mask(shape, width, height):
+    """Create a mask image for the word cloud in the specified shape."""
+    mask = Image.new("L", (width, height), 255)  # White background
+    draw = ImageDraw.Draw(mask)
+
+    if shape == "Cloud":
+        # Draw a cloud-like shape
+        center_x, center_y = width // 2, height // 2
+        radius_x, radius_y = width // 2 - 50, height // 2 - 50
+
+        # Main ellipse
+        draw.ellipse([center_x - radius_x, center_y - radius_y, 
+                      center_x + radius_x, center_y + radius_y], fill=0)
+
+        # Additional bumps to make it cloud-like
+        draw.ellipse([center_x - radius_x//2, center_y - radius_y - 30, 
+                      center_x + radius_x//2, center_y - radius_y//2], fill=0)
+
+        draw.ellipse([center_x + radius_x//2, center_y - radius_y//2, 
+                      center_x + radius_x + 30, center_y + radius_y//2], fill=0)
+
+        draw.ellipse([center_x - radius_x - 30, center_y - radius_y//2, 
+                      center_x - radius_x//2, center_y + radius_y//2], fill=0)
+
+    elif shape == "Circle":
+        # Simple circle with minimal margin
+        padding = 20  # Reduced from 50
+        draw.ellipse([padding, padding, width - padding, height - padding], fill=0)
+
+    elif shape == "Rectangle":
+        # Rectangle with rounded corners
+        padding = 50
+        draw.rectangle([padding, padding, width - padding, height - padding], fill=0)
+
+    elif shape == "Heart":
+        # Heart shape with minimal margin
+        center_x, center_y = width // 2, height // 2
+        size = min(width, height) // 2 - 20  # Reduced from 50
+
+        # Create a proper heart shape
+        # Define the heart as a polygon with carefully placed points
+        points = []
+
+        # Use parametric equation for heart shape
+        # x = 16 * sin(t)^3
+        # y = 13 * cos(t) - 5 * cos(2t) - 2 * cos(3t) - cos(4t)
+        scale = size / 16  # Scale to fit our desired size
+
+        for t in np.linspace(0, 2*np.pi, 100):
+            x = center_x + scale * 16 * np.sin(t)**3
+            # Flip the y-coordinate to make the heart right-side up
+            y = center_y - scale * (13*np.cos(t) - 5*np.cos(2*t) - 2*np.cos(3*t) - np.cos(4*t))
+            points.append((x, y))
+
+        # Draw the heart shape
+        draw.polygon(points, fill=0)
+
+    elif shape == "Star":
+        # Star shape with minimal margin
+        center_x, center_y = width // 2, height // 2
+        outer_radius = min(width, height) // 2 - 20  # Reduced from 50
+        inner_radius = outer_radius // 2
+        num_points = 5
+
+        # Calculate star points
+        points = []
+        for i in range(num_points * 2):
+            radius = outer_radius if i % 2 == 0 else inner_radius
+            angle = i * 3.14159 / num_points
+            x = center_x + radius * np.sin(angle)
+            y = center_y + radius * np.cos(angle)
+            points.append((x, y))
+
+        draw.polygon(points, fill=0)
+
+    else:  # Default to rectangle if shape not recognized
+        padding = 50
+        draw.rectangle([padding, padding, width - padding, height - padding], fill=0)
+
+    return np.array(mask)
+
+
+def register_mask_image(data):
+    """Remember an uploaded image and return the shape name that refers to it."""
+    shape = IMAGE_SHAPE_PREFIX + hashlib.sha256(data).hexdigest()
+    with _mask_images_lock:
+        _mask_images[shape] = data
+        _mask_images.move_to_end(shape)
+        while len(_mask_images) > MAX_MASK_IMAGES:
+            _mask_images.popitem(last=False)
+    return shape
+
+
+def get_mask_image(shape):
+    """Registered image bytes for an image shape, None for built-in shapes."""
+    with _mask_images_lock:
+        return _mask_images.get(shape)
+
+
+def is_image_shape(shape):
+    return shape.startswith(IMAGE_SHAPE_PREFIX)
+
+
+def open_mask_image(data):
+    """Decode PNG, JPEG, WebP or SVG bytes into a PIL image."""
+    if b"<svg" in data[:1024]:
+        try:
+            import cairosvg
+        except ImportError:
+            raise ValueError("SVG masks need the cairosvg package")
+        data = cairosvg.svg2png(bytestring=data)
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Could not read mask image: {e}")
+    return image
+
+
+def create_image_mask(data, width, height):
+    """Fit an image into the canvas and threshold it; dark or opaque pixels are the shape."""
+    image = open_mask_image(data)
+
+    # Transparent pixels count as background whatever their color
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        gray = Image.new("L", image.size, 255)
+        gray.paste(image.convert("L"), mask=image.getchannel("A"))
+    else:
+        gray = image.convert("L")
+
+    # Keep the aspect ratio and center the image on a white canvas
+    gray = ImageOps.contain(gray, (width, height), Image.LANCZOS)
+    canvas = Image.new("L", (width, height), 255)
+    canvas.paste(gray, ((width - gray.width) // 2, (height - gray.height) // 2))
+    return np.where(np.asarray(canvas) < MASK_THRESHOLD, 0, 255).astype(np.uint8)
+
+
+class PreparedMask:
+    """A read-only mask with its free pixel count and contour."""
+
+    def __init__(self, mask):
+        mask.setflags(write=False)
+        self.mask = mask
+        self.free_pixels = int((mask == 0).sum())
+
+        self.contour = find_contour(mask > 0)
+        self.contour.setflags(write=False)
+
+    @property
+    def free_fraction(self):
+        return self.free_pixels / self.mask.size
+
+
+def find_contour(outside):
+    """Pixels inside the shape with a neighbor outside it, ignoring the image edge."""
+    height, width = outside.shape
+    padded = np.pad(outside, 1)
+    near_outside = np.zeros_like(outside)
+    for dy in range(3):
+        for dx in range(3):
+            near_outside |= padded[dy:dy + height, dx:dx + width]
+
+    contour = near_outside & ~outside
+    contour[[0, -1], :] = False
+    contour[:, [0, -1]] = False
+    return contour
+
+
+@lru_cache(maxsize=32)
+def get_mask(shape, width, height):
+    """Prepared mask for a built-in or registered image shape, built once per size."""
+    if is_image_shape(shape):
+        data = get_mask_image(shape)
+        if data is None:
+            raise KeyError(f"Mask image {shape} is not registered")
+        return PreparedMask(create_image_mask(data, width, height))
+    return PreparedMask(create_shape_mask(shape, width, height))
@@ -0,0 +1,148 @@
+"""Aspect-ratio and resolution presets, with a render plan for each size.
+
+A render plan says how a cloud of a given output size is produced: the
+resolution words are laid out at, the scale WordCloud draws them at, and
+whether the drawing is downsampled afterwards. Placing words costs time in
+proportion to the layout area, so large clouds are laid out at a reduced
+resolution and drawn scaled up; small clouds are laid out at full size and
+drawn at twice the size, then downsampled for smoother text.
+"""
+import math
+
+CUSTOM = "Custom"
+
+# Largest output drawn at 2x and downsampled, and largest laid out at full size
+SUPERSAMPLE_MAX_PIXELS = 1280 * 720
+DIRECT_MAX_PIXELS = 1920 * 1080
+
+# Larger outputs are only rasterized when exported; renders return a preview
+FULL_RASTER_MAX_PIXELS = 3840 * 2160
+
+# Largest custom width or height
+MAX_CUSTOM_SIZE = 16384
+
+
+class AspectRatio:
+    """A width:height ratio and which side of the resolution preset it keeps."""
+
+    def __init__(self, width, height, keep):
+        self.width = width
+        self.height = height
+        self.keep = keep
+
+    def apply(self, base_width, base_height):
+        if self.keep == "shorter":
+            size = min(base_width, base_height)
+            return size, size
+        if self.keep == "width":
+            return base_width, int(base_width * self.height / self.width)
+        return int(base_height * self.width / self.height), base_height
+
+
+class ResolutionPreset:
+    """Base output size, and the render plan settings used for it."""
+
+    def __init__(self, width, height, scale=1, supersample=False):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.supersample = supersample
+
+
+class RenderPlan:
+    """How to produce a width x height cloud."""
+
+    def __init__(self, width, height, scale=1, supersample=False):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.supersample = supersample
+        if supersample:
+            # Lay out at full size, draw larger, downsample
+            self.layout_width, self.layout_height = width, height
+        else:
+            # Lay out smaller and draw scaled up to the output size
+            self.layout_width = max(1, round(width / scale))
+            self.layout_height = max(1, round(height / scale))
+        # Above Full HD the PNG export is rasterized in strips from the layout
+        self.tiled_png = width * height > DIRECT_MAX_PIXELS
+        self.preview_only = width * height > FULL_RASTER_MAX_PIXELS
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "layout_width": self.layout_width,
+            "layout_height": self.layout_height,
+            "scale": self.scale,
+            "supersample": self.supersample,
+            "preview_only": self.preview_only,
+        }
+
+
+ASPECT_RATIOS = {
+    "16:9": AspectRatio(16, 9, "width"),
+    "9:16": AspectRatio(9, 16, "height"),
+    "8:10": AspectRatio(8, 10, "width"),
+    "10:8": AspectRatio(10, 8, "height"),
+    "5:7": AspectRatio(5, 7, "width"),
+    "7:5": AspectRatio(7, 5, "height"),
+    "6:4": AspectRatio(6, 4, "width"),
+    "4:6": AspectRatio(4, 6, "height"),
+    "10:4": AspectRatio(10, 4, "width"),
+    "10:3": AspectRatio(10, 3, "width"),
+    "Square (1:1)": AspectRatio(1, 1, "shorter"),
+}
+
+RESOLUTION_PRESETS = {
+    "HD (1280x720)": ResolutionPreset(1280, 720, scale=2, supersample=True),
+    "Full HD (1920x1080)": ResolutionPreset(1920, 1080),
+    "2K (2560x1440)": ResolutionPreset(2560, 1440, scale=2),
+    "4K (3840x2160)": ResolutionPreset(3840, 2160, scale=2),
+}
+
+# Presets whose masks and fonts render workers load at start
+WARM_PRESETS = [
+    ("16:9", "HD (1280x720)"),
+    ("16:9", "Full HD (1920x1080)"),
+    ("16:9", "4K (3840x2160)"),
+]
+
+
+def preset_size(aspect_ratio, resolution):
+    """Output size of an aspect ratio applied to a resolution preset."""
+    base = RESOLUTION_PRESETS[resolution]
+    return ASPECT_RATIOS[aspect_ratio].apply(base.width, base.height)
+
+
+def plan_for_size(width, height):
+    """Render plan for a custom size, following the same rules as the presets."""
+    pixels = width * height
+    if pixels <= SUPERSAMPLE_MAX_PIXELS:
+        return RenderPlan(width, height, scale=2, supersample=True)
+    if pixels <= DIRECT_MAX_PIXELS:
+        return RenderPlan(width, height)
+    return RenderPlan(width, height, scale=math.ceil(math.sqrt(pixels / DIRECT_MAX_PIXELS)))
+
+
+def _build_preset_plans():
+    plans = {}
+    for aspect_ratio in ASPECT_RATIOS:
+        for resolution, preset in RESOLUTION_PRESETS.items():
+            width, height = preset_size(aspect_ratio, resolution)
+            plans.setdefault((width, height), RenderPlan(width, height, preset.scale, preset.supersample))
+    return plans
+
+
+# Plans for every preset combination, by output size
+PRESET_PLANS = _build_preset_plans()
+
+
+def get_render_plan(width, height):
+    """Precomputed plan for a preset size, or one derived for a custom size."""
+    plan = PRESET_PLANS.get((width, height))
+    return plan if plan is not None else plan_for_size(width, height)
+
+
+def warm_plans():
+    return [get_render_plan(*preset_size(aspect_ratio, resolution)) for aspect_ratio, resolution in WARM_PRESETS]
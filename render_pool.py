@@ -0,0 +1,341 @@
+"""Shared pool of worker processes for word cloud rendering.
+
+Rendering runs in a fixed number of worker processes, preloaded with the
+font, the stopword sets and the masks for common sizes. Requests wait in a
+bounded queue with two priorities (interactive previews before full
+resolution renders) and are taken round-robin across users, so one session
+asking for several large renders cannot starve the others. If a worker dies
+(for example out of memory), the process pool is replaced.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image, ImageFont
+from wordcloud import WordCloud
+from wordcloud.wordcloud import FONT_PATH
+
+from cloud_layout import count_colors, label_layout, layout_from_wordcloud, paint_labels, recolor_layout, word_colors
+from masks import get_mask, register_mask_image
+from tokenization import get_stopwords
+
+PREVIEW = 0
+FULL = 1
+
+# Renders up to this many pixels count as previews
+PREVIEW_PIXELS = 1920 * 1080
+
+# Font sizes loaded into each worker at start
+WARM_FONT_SIZES = (8, 16, 32, 64, 128)
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render queue is at capacity."""
+
+
+def new_process_pool(max_workers, **kwargs):
+    """Process pool whose workers are never forked from the server.
+
+    The server is multithreaded, and forking it can copy locks held by other
+    threads into the child, so workers come from a fork server (or are spawned
+    where there is none) and load what they need in their initializer. Such
+    pools start workers lazily, one per submit while none is idle, so work
+    must go through pool_submit.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context, **kwargs)
+
+
+def pool_submit(executor, fn, *args, **kwargs):
+    """executor.submit, with the app script hidden from any worker it starts."""
+    with _script_main_hidden():
+        return executor.submit(fn, *args, **kwargs)
+
+
+@contextmanager
+def _script_main_hidden():
+    # Spawned and fork server children import the parent's __main__ by path.
+    # Streamlit installs the app script as __main__, and it must not run in a
+    # worker; pool functions live in importable modules, so a bare module
+    # stands in while workers start.
+    main = sys.modules.get("__main__")
+    if getattr(main, "__spec__", None) is not None or not getattr(main, "__file__", None):
+        yield
+        return
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _init_worker(warm_masks, warm_requests):
+    # Load everything a render touches once, before the first request arrives.
+    # Warm-up is only an optimization: an error raised from an initializer would
+    # break the whole pool, so failures are logged and the worker starts cold.
+    steps = [(ImageFont.truetype, (FONT_PATH, size)) for size in WARM_FONT_SIZES]
+    steps.append((get_stopwords, ("english",)))
+    steps.extend((get_mask, mask) for mask in warm_masks)
+    steps.extend((render_cloud, (request,)) for request in warm_requests)
+    for func, args in steps:
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Render worker warm-up step %s failed", func.__name__)
+
+
+def _ready():
+    return os.getpid()
+
+
+def render_cloud(request):
+    """Lay out and draw one cloud in a worker following its render plan.
+
+    Words are placed at the plan's layout resolution and labelled at its scale;
+    the image is painted from the label map by paint_cloud. Poster-sized plans
+    are only labelled at layout resolution as a preview; the full size is
+    written in strips on export. Returns (layout, RGB array, label map).
+    """
+    # Uploaded mask images travel with the request; workers cache them by hash
+    if request.get("mask_image") is not None:
+        register_mask_image(request["mask_image"])
+
+    plan = request["plan"]
+    wordcloud = WordCloud(
+        width=plan["layout_width"],
+        height=plan["layout_height"],
+        max_words=request["max_words"],
+        background_color=request["background_color"],
+        colormap=request["colormap"],
+        prefer_horizontal=0.9,
+        collocations=request.get("frequencies") is None,
+        min_font_size=4,
+        mode="RGB",
+        scale=plan["scale"],
+        mask=get_mask(request["shape"], plan["layout_width"], plan["layout_height"]).mask,
+        random_state=request.get("random_state")
+    )
+    # Same steps as WordCloud.generate, keeping the counts for the layout
+    frequencies = request.get("frequencies")
+    if frequencies is None:
+        frequencies = wordcloud.process_text(request["text"])
+    wordcloud.generate_from_frequencies(frequencies)
+
+    layout = layout_from_wordcloud(wordcloud, settings=request.get("settings"), frequencies=frequencies)
+    label_map = label_layout(layout, scale=1 if plan.get("preview_only") else plan["scale"])
+    layout, image = paint_cloud(layout, label_map, request)
+    return layout, image, label_map
+
+
+def paint_cloud(layout, label_map, request):
+    """Color a labelled layout with the request's colormap, scheme and background.
+
+    Cheap enough to run in the app for every change of colors, as the layout
+    and its label map stay the same. Requests with a color_scale_max color
+    words by count on that shared scale. Returns the recolored layout and the
+    RGB array at the plan's output size.
+    """
+    plan = request["plan"]
+    scheme = request.get("color_scheme", "words")
+    if request.get("color_scale_max") is not None:
+        colors = count_colors(layout, request["colormap"], request["color_scale_max"])
+    else:
+        colors = word_colors(layout, request["colormap"], scheme, request.get("random_state"))
+    layout = recolor_layout(layout, request["colormap"], colors=colors)
+    layout = dict(layout, background_color=request["background_color"],
+                  settings=dict(request.get("settings") or {}))
+
+    if scheme == "gradient":
+        image = paint_labels(label_map, request["background_color"], gradient_colormap=request["colormap"])
+    else:
+        image = paint_labels(label_map, request["background_color"], colors)
+
+    # Supersampled or rounded drawings are resized to the output size
+    if not plan.get("preview_only") and image.shape[:2] != (plan["height"], plan["width"]):
+        image = np.asarray(Image.fromarray(image).resize((plan["width"], plan["height"]), Image.LANCZOS))
+    return layout, image
+
+
+def render_priority(width, height):
+    return PREVIEW if width * height <= PREVIEW_PIXELS else FULL
+
+
+class RenderPool:
+    """Bounded, fair, two-priority front end to a process pool."""
+
+    def __init__(self, max_workers=None, max_queue=32, warm_masks=(), warm_requests=()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._initargs = (tuple(warm_masks), tuple(warm_requests))
+        self._executor = self._new_executor()
+        self._queues = {PREVIEW: OrderedDict(), FULL: OrderedDict()}
+        self._queued = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "restarts": 0}
+        self._recent_waits = deque(maxlen=200)
+        self._recent_renders = deque(maxlen=200)
+
+    def submit(self, user_id, request, priority=FULL):
+        """Queue a render for a user and return a Future of (layout, image, label map).
+
+        Raises RenderQueueFull when max_queue requests are already waiting.
+        """
+        future = Future()
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise RenderQueueFull(f"{self._queued} renders are already waiting")
+            users = self._queues[priority]
+            users.setdefault(user_id, deque()).append((future, request, time.monotonic()))
+            self._queued += 1
+            self._stats["submitted"] += 1
+            started, failed = self._dispatch()
+        self._start(started, failed)
+        return future
+
+    def position(self, user_id):
+        """Number of requests waiting ahead of, and including, this user's oldest."""
+        with self._lock:
+            ahead = 0
+            for priority in (PREVIEW, FULL):
+                for queued_user, jobs in self._queues[priority].items():
+                    if queued_user == user_id:
+                        return ahead + 1
+                    ahead += len(jobs)
+        return 0
+
+    def metrics(self):
+        """Queue depth, concurrency and recent latency figures."""
+        with self._lock:
+            metrics = dict(self._stats)
+            metrics["queued_preview"] = sum(len(jobs) for jobs in self._queues[PREVIEW].values())
+            metrics["queued_full"] = sum(len(jobs) for jobs in self._queues[FULL].values())
+            metrics["in_flight"] = self._in_flight
+            metrics["workers"] = self.max_workers
+            metrics["mean_wait_s"] = _mean(self._recent_waits)
+            metrics["mean_render_s"] = _mean(self._recent_renders)
+        return metrics
+
+    def warm_up(self):
+        """Start every worker now, so their warm-up runs before the first request."""
+        for _ in range(self.max_workers):
+            pool_submit(self._executor, _ready)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_executor(self):
+        return new_process_pool(self.max_workers, initializer=_init_worker, initargs=self._initargs)
+
+    def _restart_executor(self):
+        # Called with the lock held; renders still running on the old pool fail on their own
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+        self._stats["restarts"] += 1
+
+    def _dispatch(self):
+        # Called with the lock held: hand queued work to free workers. Futures are
+        # only resolved and callbacks only added by _start, once the lock is released.
+        started = []
+        failed = []
+        while self._in_flight < self.max_workers:
+            item = self._next_item()
+            if item is None:
+                break
+            future, request, queued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                pool_future = pool_submit(self._executor, render_cloud, request)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # The pool broke before its failed renders reported back: fail everything
+                # waiting on it and carry on with a fresh pool
+                failed.append((future, e))
+                failed.extend((waiting, e) for waiting in self._drain())
+                self._restart_executor()
+                break
+            started_at = time.monotonic()
+            self._recent_waits.append(started_at - queued_at)
+            self._in_flight += 1
+            started.append((future, pool_future, started_at, self._executor))
+        return started, failed
+
+    def _start(self, started, failed):
+        for future, error in failed:
+            future.set_exception(error)
+        for future, pool_future, started_at, executor in started:
+            # May run the callback right away if the render already finished
+            pool_future.add_done_callback(
+                lambda done, future=future, started_at=started_at, executor=executor:
+                    self._finish(future, done, started_at, executor)
+            )
+
+    def _drain(self):
+        # Called with the lock held: remove every queued request, returning their futures
+        futures = []
+        for priority in (PREVIEW, FULL):
+            for jobs in self._queues[priority].values():
+                futures.extend(future for future, _, _ in jobs if future.set_running_or_notify_cancel())
+            self._queues[priority].clear()
+        self._queued = 0
+        return futures
+
+    def _next_item(self):
+        # Previews first; within a priority, rotate through users
+        for priority in (PREVIEW, FULL):
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_id, jobs = next(iter(users.items()))
+            item = jobs.popleft()
+            del users[user_id]
+            if jobs:
+                users[user_id] = jobs
+            self._queued -= 1
+            return item
+        return None
+
+    def _finish(self, future, done, started_at, executor):
+        if done.cancelled():
+            error = BrokenProcessPool("The render pool was restarted")
+        else:
+            error = done.exception()
+        with self._lock:
+            self._in_flight -= 1
+            self._recent_renders.append(time.monotonic() - started_at)
+            if error is None:
+                self._stats["completed"] += 1
+            else:
+                self._stats["failed"] += 1
+            # A dead worker breaks the whole pool; replace it once, before queued work goes to it
+            if isinstance(error, BrokenProcessPool) and executor is self._executor:
+                self._restart_executor()
+
+        # Resolve the caller's future before starting the next renders
+        if error is None:
+            future.set_result(done.result())
+        else:
+            future.set_exception(error)
+
+        with self._lock:
+            started, failed = self._dispatch()
+        self._start(started, failed)
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
@@ -0,0 +1,106 @@
+"""Word count estimates for large documents from a sample of their pages.
+
+Pages (or text chunks) are treated as clusters in simple random sampling
+without replacement. Totals are estimated as N times the mean per-unit
+count, with a 95% confidence interval from the between-unit variance and the
+finite population correction. The stability of the estimated top K words is
+measured by bootstrapping the sampled units.
+"""
+import math
+import random
+from collections import Counter
+
+import numpy as np
+
+from frequency_table import FrequencyTable
+
+# Share of units sampled, and bounds on the sample size
+SAMPLE_RATIO = 0.05
+MIN_SAMPLED_UNITS = 30
+MAX_SAMPLED_UNITS = 200
+
+# Normal quantile for 95% confidence intervals
+Z_95 = 1.96
+
+# Words compared for top-K stability, and bootstrap resamples
+STABILITY_TOP_K = 50
+BOOTSTRAP_SAMPLES = 200
+
+# Bootstrap totals are only computed for this many leading candidates
+BOOTSTRAP_CANDIDATES = 1000
+
+
+def choose_units(total_units, ratio=SAMPLE_RATIO, random_state=0):
+    """Sorted indices of the units to sample, or None if the document is too small to be worth it."""
+    size = min(max(math.ceil(ratio * total_units), MIN_SAMPLED_UNITS), MAX_SAMPLED_UNITS)
+    if size * 2 > total_units:
+        return None
+    return sorted(random.Random(random_state).sample(range(total_units), size))
+
+
+def estimate_totals(unit_counts, total_units, max_words=400, top_k=STABILITY_TOP_K,
+                    bootstraps=BOOTSTRAP_SAMPLES, random_state=0):
+    """Estimate document-wide word counts from the Counters of sampled units.
+
+    Returns a dict with the estimated counts as a FrequencyTable, the 95%
+    margin of error of each listed word, and the top-K stability: the mean
+    share of the top K words that a bootstrap resample keeps in its top K.
+    """
+    n = len(unit_counts)
+    sums = Counter()
+    squares = Counter()
+    for counts in unit_counts:
+        sums.update(counts)
+        for word, count in counts.items():
+            squares[word] += count * count
+
+    words = list(sums)
+    totals = np.fromiter((sums[word] for word in words), dtype=np.float64, count=len(words))
+    square_totals = np.fromiter((squares[word] for word in words), dtype=np.float64, count=len(words))
+
+    # Cluster estimator of the total and its standard error
+    means = totals / n
+    if n > 1:
+        variances = np.maximum(square_totals - n * means ** 2, 0) / (n - 1)
+    else:
+        variances = np.zeros(len(words))
+    estimates = total_units * means
+    errors = total_units * np.sqrt((1 - n / total_units) * variances / n)
+
+    order = np.argsort(-estimates, kind="stable")
+    top = order[:max_words]
+    frequencies = FrequencyTable.from_counts(
+        (words[i], max(int(round(estimates[i])), 1)) for i in top
+    )
+    margins = {words[i]: float(Z_95 * errors[i]) for i in top}
+
+    return {
+        'frequencies': frequencies,
+        'margins': margins,
+        'stability': _top_k_stability(unit_counts, [words[i] for i in order[:BOOTSTRAP_CANDIDATES]],
+                                      top_k, bootstraps, random_state),
+        'top_k': min(top_k, len(words)),
+    }
+
+
+def _top_k_stability(unit_counts, candidates, top_k, bootstraps, random_state):
+    k = min(top_k, len(candidates))
+    if k == 0 or len(unit_counts) < 2:
+        return 1.0
+
+    # Units x candidate words, in candidate (estimated rank) order
+    index = {word: j for j, word in enumerate(candidates)}
+    matrix = np.zeros((len(unit_counts), len(candidates)), dtype=np.float64)
+    for i, counts in enumerate(unit_counts):
+        for word, count in counts.items():
+            j = index.get(word)
+            if j is not None:
+                matrix[i, j] = count
+
+    # Each resample draws units with replacement; weights count the draws
+    rng = np.random.default_rng(random_state)
+    n = len(unit_counts)
+    weights = rng.multinomial(n, np.full(n, 1 / n), size=bootstraps)
+    resampled = weights @ matrix
+    top = np.argpartition(-resampled, k - 1, axis=1)[:, :k]
+    return float((top < k).sum(axis=1).mean() / k)
@@ -0,0 +1,151 @@
+"""End-to-end checks of the Streamlit script, with ChatGPT replaced by a fixed reply."""
+import os
+
+import nltk
+import pytest
+
+import chat
+from render_pool import FULL, RenderPool
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+RESPONSE = ("Cloud security means protecting cloud data, cloud accounts and cloud workloads.\n\n"
+            + "Good security practices keep data safe in every cloud region. " * 4)
+
+
+def nltk_data_available():
+    try:
+        nltk.data.find('tokenizers/punkt')
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        return False
+    return True
+
+
+pytestmark = pytest.mark.skipif(not nltk_data_available(), reason="NLTK data not downloaded")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The app after a ChatGPT reply has been turned into a word cloud."""
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setattr(chat, "chat_completion", lambda prompt, api_key=None: RESPONSE)
+    at = AppTest.from_file(APP_PATH, default_timeout=300).run()
+    at.text_area[0].set_value("Write about cloud security")
+    at.button(key="submit_to_chatgpt_tab").click().run()
+    assert not at.exception
+    return at
+
+
+def download_labels(at):
+    return [button.proto.label for button in at.get("download_button")]
+
+
+def prepare_png_button(at):
+    return [button for button in at.button if button.key and button.key.startswith("prepare_png")]
+
+
+def test_png_is_only_built_when_asked_for(app):
+    assert "Download Word Cloud as PNG" not in download_labels(app)
+    assert "Download Word Cloud as SVG" in download_labels(app)
+
+    prepare_png_button(app)[0].click().run()
+    assert "Download Word Cloud as PNG" in download_labels(app)
+
+
+def test_prepared_png_is_reused_across_reruns(app):
+    prepare_png_button(app)[0].click().run()
+    app.run()
+    assert not app.exception
+    assert "Download Word Cloud as PNG" in download_labels(app)
+    assert not prepare_png_button(app)
+
+
+@pytest.fixture
+def render_submits(monkeypatch):
+    """Requests sent to the render pool."""
+    submits = []
+    submit = RenderPool.submit
+
+    def spy(self, user_id, request, priority=FULL):
+        submits.append(request)
+        return submit(self, user_id, request, priority)
+
+    monkeypatch.setattr(RenderPool, "submit", spy)
+    return submits
+
+
+def test_reruns_reuse_the_render(app, render_submits):
+    app.run()
+    assert not app.exception
+    assert render_submits == []
+
+
+def test_color_changes_repaint_without_rendering(app, render_submits):
+    render_key = app.session_state["render_key"]
+    layout_key = app.session_state["layout_key"]
+    app.selectbox(key="colormap").set_value("plasma").run()
+    assert not app.exception
+    assert render_submits == []
+    assert app.session_state["layout_key"] == layout_key
+    assert app.session_state["render_key"] != render_key
+
+    # A new shape needs a new layout
+    app.selectbox(key="cloud_shape").set_value("Circle").run()
+    assert len(render_submits) == 1
+
+
+def test_large_png_is_rendered_by_a_background_job(app):
+    app.selectbox(key="resolution_preset").set_value("2K (2560x1440)").run()
+    prepare_png_button(app)[0].click().run()
+    # The script reruns on its own until the job is done
+    assert not app.exception
+    assert "Download Word Cloud as PNG" in download_labels(app)
+    png = next(button for button in app.get("download_button")
+               if button.proto.label == "Download Word Cloud as PNG")
+    assert png.proto.url
+
+
+def test_session_keeps_only_artifact_handles(app):
+    prepare_png_button(app)[0].click().run()
+    payloads = app.session_state["download_payloads"]
+    assert payloads and all(isinstance(handle, str) for handle in payloads.values())
+    assert isinstance(app.session_state["chatgpt_index"], str)
+
+
+class FakeUpload:
+    def __init__(self, name, text):
+        self.name = name
+        self.type = "text/plain"
+        self._data = text.encode("utf-8")
+
+    def getvalue(self):
+        return self._data
+
+
+def test_compares_three_documents(monkeypatch):
+    import streamlit
+    from streamlit.testing.v1 import AppTest
+
+    uploads = [FakeUpload(f"{topic}.txt", f"{topic} notes cover {topic} systems and {topic} research. " * 20)
+               for topic in ("ocean", "forest", "desert")]
+    file_uploader = streamlit.file_uploader
+
+    def fake_file_uploader(label, *args, key=None, **kwargs):
+        # AppTest cannot upload files
+        if key == "compare_files":
+            return uploads
+        return file_uploader(label, *args, key=key, **kwargs)
+
+    monkeypatch.setattr(streamlit, "file_uploader", fake_file_uploader)
+    at = AppTest.from_file(APP_PATH, default_timeout=300).run()
+    at.radio(key="upload_mode").set_value("Compare Documents").run()
+    at.button(key="compare_generate_btn").click().run()
+    assert not at.exception
+    assert not [element.value for element in at.error if element.value.startswith("Error")]
+    assert not at.warning
+    assert [element.body for element in at.markdown if element.body.endswith(".txt**")] == [
+        "**ocean.txt**", "**forest.txt**", "**desert.txt**"]
+    assert len(at.get("imgs")) >= 3
+    assert isinstance(at.session_state["comparison"], str)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from artifact_store import COMPRESSED, DISK, RAW, ArtifactStore, estimate_size
+from frequency_table import IncrementalFrequencyIndex
+
+
+def test_put_and_get(tmp_path):
+    store = ArtifactStore(spill_dir=str(tmp_path))
+    handle = store.put("session", "text", "cloud " * 10)
+    assert handle == "session/text"
+    assert store.get(handle) == "cloud " * 10
+    assert store.get("session/missing") is None
+
+
+def test_values_over_budget_are_compressed_then_spilled(tmp_path):
+    store = ArtifactStore(memory_budget=10_000, spill_dir=str(tmp_path))
+    first = store.put("session", "first", np.zeros(8_000, dtype=np.uint8))
+    store.put("session", "second", np.ones(8_000, dtype=np.uint8))
+    assert store.usage()[COMPRESSED] + store.usage()[DISK] > 0
+    # Spilled or compressed values come back unchanged
+    assert np.array_equal(store.get(first), np.zeros(8_000, dtype=np.uint8))
+
+
+def test_release_session_drops_only_its_artifacts(tmp_path):
+    store = ArtifactStore(spill_dir=str(tmp_path))
+    mine = store.put("mine", "text", "a")
+    theirs = store.put("theirs", "text", "b")
+    store.release_session("mine")
+    assert store.get(mine) is None
+    assert store.get(theirs) == "b"
+
+
+def test_estimate_size_uses_nbytes():
+    array = np.zeros(1000, dtype=np.int64)
+    assert estimate_size(array) == 8000
+    assert estimate_size({"key": array}) > 8000
+
+
+def lowercase(paragraph, language):
+    return paragraph.lower()
+
+
+def english(text):
+    return "english"
+
+
+def test_spilled_frequency_index_keeps_counting(tmp_path):
+    store = ArtifactStore(memory_budget=1, spill_dir=str(tmp_path))
+    index = IncrementalFrequencyIndex(lowercase, english)
+    index.update("Cloud data\n\nCloud " + "words " * 200)
+    assert estimate_size(index) > 1000
+    handle = store.put("session", "chatgpt_index", index)
+    store.put("session", "other", np.zeros(100, dtype=np.uint8))
+    assert store.usage()[RAW] == 0
+
+    restored = store.get(handle)
+    assert restored.counts == index.counts
+    assert restored.update("Cloud data\n\nMore cloud")
+    assert restored.counts == {"cloud": 2, "data": 1, "more": 1}
@@ -0,0 +1,118 @@
+import io
+import re
+
+import pytest
+import numpy as np
+from PIL import Image, ImageColor, ImageFont
+from wordcloud import WordCloud
+
+from cloud_layout import (label_layout, layout_from_bytes, layout_from_json, layout_from_wordcloud, layout_to_bytes,
+                          layout_to_json, load_layout, paint_labels, render_layout, save_layout, write_png,
+                          write_svg)
+
+FREQUENCIES = {"alpha": 10, "beta": 5, "gamma": 2}
+
+
+@pytest.fixture(scope="module")
+def layout():
+    wordcloud = WordCloud(width=200, height=100, random_state=1).generate_from_frequencies(FREQUENCIES)
+    return layout_from_wordcloud(wordcloud, settings={"max_words": 3}, frequencies=FREQUENCIES)
+
+
+def test_layout_keeps_raw_counts(layout):
+    assert layout["frequencies"] == [["alpha", 10], ["beta", 5], ["gamma", 2]]
+    assert [word[0] for word in layout["words"]] == ["alpha", "beta", "gamma"]
+
+
+def test_json_round_trip(layout):
+    assert layout_from_json(layout_to_json(layout)) == layout
+    assert load_layout(layout_to_json(layout).encode("utf-8")) == layout
+
+
+def test_unsupported_version_is_rejected(layout):
+    with pytest.raises(ValueError):
+        layout_from_json(layout_to_json(dict(layout, version=99)))
+
+
+@pytest.mark.parametrize("suffix", [".json", ".wcl"])
+def test_saved_layout_renders_like_the_original_cloud(tmp_path, suffix):
+    wordcloud = WordCloud(width=300, height=200, prefer_horizontal=0.5, mode="RGB",
+                          random_state=3).generate_from_frequencies(FREQUENCIES)
+    path = tmp_path / f"layout{suffix}"
+    save_layout(layout_from_wordcloud(wordcloud, frequencies=FREQUENCIES), path)
+    image = np.asarray(render_layout(load_layout(path)))
+    assert np.array_equal(image, wordcloud.to_array())
+
+
+def test_svg_has_one_text_per_word(layout):
+    svg = write_svg(layout, io.BytesIO()).getvalue().decode("utf-8")
+    assert svg.startswith("<svg")
+    assert svg.count("<text ") == len(layout["words"])
+
+
+def test_binary_round_trip_keeps_integer_counts(layout):
+    loaded = layout_from_bytes(layout_to_bytes(layout))
+    assert loaded["frequencies"] == layout["frequencies"]
+    assert all(isinstance(count, int) for _, count in loaded["frequencies"])
+    assert loaded["frequencies"] == layout_from_json(layout_to_json(layout))["frequencies"]
+
+
+def test_binary_round_trip_keeps_relative_weights():
+    wordcloud = WordCloud(width=200, height=100, random_state=1).generate_from_frequencies(FREQUENCIES)
+    layout = layout_from_wordcloud(wordcloud)
+    loaded = layout_from_bytes(layout_to_bytes(layout))
+    assert loaded["frequencies"] == [["alpha", 1.0], ["beta", 0.5], ["gamma", 0.2]]
+
+
+@pytest.mark.parametrize("prefer_horizontal", [1.0, 0.0])
+def test_svg_baselines_put_the_ink_where_wordcloud_draws_it(prefer_horizontal):
+    wordcloud = WordCloud(width=200, height=200, prefer_horizontal=prefer_horizontal,
+                          random_state=1).generate_from_frequencies(FREQUENCIES)
+    layout = layout_from_wordcloud(wordcloud, frequencies=FREQUENCIES)
+    assert all(word[5] == (prefer_horizontal == 0.0) for word in layout["words"])
+    svg = write_svg(layout, io.BytesIO()).getvalue().decode("utf-8")
+    transforms = re.findall(r'translate\(([-\d.]+),([-\d.]+)\)( rotate)?', svg)
+    for (word, _, font_size, x, y, rotated, _), (tx, ty, _) in zip(layout["words"], transforms):
+        font = ImageFont.truetype(layout["font_path"], font_size)
+        if rotated:
+            # Turned counter-clockwise, the ink's left edge is baseline minus the glyphs' height above it
+            ink_left = float(tx) - (font.getmetrics()[0] - font.getbbox(word)[1])
+            assert ink_left == pytest.approx(x)
+        else:
+            # The ink top of text drawn on this baseline is where WordCloud's TransposedFont puts it
+            ink_top = ImageFont.TransposedFont(font).getbbox(word)[1] + y
+            assert font.getbbox(word, anchor="ls")[1] + float(ty) == pytest.approx(ink_top)
+
+
+def test_png_strips_match_wordcloud():
+    wordcloud = WordCloud(width=300, height=200, prefer_horizontal=0.5, mode="RGB",
+                          random_state=3).generate_from_frequencies(FREQUENCIES)
+    fractions = []
+    png = write_png(layout_from_wordcloud(wordcloud), io.BytesIO(), dpi=300, memory_budget=300 * 3 * 4 * 16,
+                    progress=fractions.append).getvalue()
+    image = Image.open(io.BytesIO(png))
+    image.load()
+    assert image.size == (300, 200)
+    assert round(image.info["dpi"][0]) == 300
+    assert np.array_equal(np.asarray(image), wordcloud.to_array())
+    # Several strips were written
+    assert len(fractions) > 1 and fractions[-1] == 1
+
+
+def test_png_size_is_exact():
+    layout = layout_from_wordcloud(WordCloud(width=1706, height=960, random_state=1)
+                                   .generate_from_frequencies(FREQUENCIES))
+    png = write_png(layout, io.BytesIO(), size=(3840, 2160)).getvalue()
+    image = Image.open(io.BytesIO(png))
+    image.load()
+    assert image.size == (3840, 2160)
+
+
+@pytest.mark.parametrize("prefer_horizontal", [1.0, 0.5])
+def test_label_map_paints_the_wordcloud_image(prefer_horizontal):
+    wordcloud = WordCloud(width=300, height=200, prefer_horizontal=prefer_horizontal, mode="RGB",
+                          random_state=3).generate_from_frequencies(FREQUENCIES)
+    layout = layout_from_wordcloud(wordcloud, frequencies=FREQUENCIES)
+    colors = np.array([ImageColor.getrgb(word[6]) for word in layout["words"]], dtype=np.uint8)
+    image = paint_labels(label_layout(layout), layout["background_color"], colors)
+    assert np.array_equal(image, wordcloud.to_array())
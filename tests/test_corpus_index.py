@@ -0,0 +1,35 @@
+from collections import Counter
+
+import pytest
+
+from corpus_index import CorpusIndex
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    corpus = CorpusIndex(str(tmp_path / "corpus.db"))
+    yield corpus
+    corpus.close()
+
+
+def test_top_terms_over_all_documents_and_subsets(corpus):
+    first = corpus.add_document("a", "first.txt", 10, Counter({"cloud": 3, "data": 1}))
+    second = corpus.add_document("b", "second.txt", 8, Counter({"cloud": 1, "word": 4}))
+    assert corpus.add_document("a", "again.txt", 10, Counter({"other": 1})) == first
+
+    assert list(corpus.top_terms(10)) == [("cloud", 4), ("word", 4), ("data", 1)]
+    assert list(corpus.top_terms(10, doc_ids=[second])) == [("word", 4), ("cloud", 1)]
+    assert [doc["name"] for doc in corpus.documents(containing=["data"])] == ["first.txt"]
+
+
+def test_tied_terms_are_ordered_by_word(corpus):
+    corpus.add_document("a", "a.txt", 4, Counter({"zeta": 2, "beta": 2, "alpha": 2}))
+    assert [word for word, _ in corpus.top_terms(3)] == ["alpha", "beta", "zeta"]
+    assert [word for word, _ in corpus.top_terms(2, name_like="a%")] == ["alpha", "beta"]
+
+
+def test_removed_documents_leave_the_totals(corpus):
+    doc_id = corpus.add_document("a", "a.txt", 4, Counter({"cloud": 2}))
+    corpus.add_document("b", "b.txt", 4, Counter({"cloud": 1, "data": 1}))
+    corpus.remove_document(doc_id)
+    assert list(corpus.top_terms(10)) == [("cloud", 1), ("data", 1)]
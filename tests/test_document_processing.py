@@ -0,0 +1,60 @@
+from io import BytesIO
+
+from docx import Document
+
+import document_processing
+from document_processing import count_paragraphs, iter_docx_paragraphs, resolve_leading_language
+
+
+def make_docx():
+    document = Document()
+    document.add_paragraph("First paragraph")
+    table = document.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = "Inside a table"
+    document.add_paragraph("Last paragraph")
+    buf = BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+def test_iter_docx_paragraphs_includes_tables():
+    paragraphs = [p for p in iter_docx_paragraphs(BytesIO(make_docx())) if p]
+    assert paragraphs == ["First paragraph", "Inside a table", "Last paragraph"]
+
+
+def test_resolve_leading_language_keeps_every_part(monkeypatch):
+    seen = []
+    monkeypatch.setattr(document_processing, "resolve_language", lambda text: seen.append(text) or "english")
+    language, parts = resolve_leading_language(iter(["one", "two", "three"]), size=6)
+    assert language == "english"
+    assert seen == ["one\ntwo"]
+    assert list(parts) == ["one", "two", "three"]
+
+
+def test_count_paragraphs_resolves_the_language_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(document_processing, "resolve_language", lambda text: calls.append(text) or "english")
+    monkeypatch.setattr(document_processing, "preprocess_words",
+                        lambda text, language: [language + ":" + word.lower() for word in text.split()])
+    word_count, counts = count_paragraphs(["Best cloud", "Best"])
+    assert len(calls) == 1
+    assert word_count == 3
+    assert counts == {"english:best": 2, "english:cloud": 1}
+
+
+def test_sampled_text_chunks_never_split_words(monkeypatch):
+    words = [f"word{i}é" for i in range(4000)]
+    data = " ".join(words).encode("utf-8")
+    monkeypatch.setattr(document_processing, "choose_units", lambda total: list(range(total)))
+    total, chosen, chunks = document_processing.sample_text_chunks(data, size=100)
+    assert len(chunks) == total == len(chosen)
+    assert " ".join(chunks).split() == words
+
+
+def test_text_without_spaces_is_cut_at_character_boundaries(monkeypatch):
+    text = "词云显示文本中最常见的词语" * 500
+    monkeypatch.setattr(document_processing, "choose_units", lambda total: list(range(total)))
+    total, _, chunks = document_processing.sample_text_chunks(text.encode("utf-8"), size=100)
+    assert len(chunks) == total
+    assert "".join(chunks) == text
+    assert max(len(chunk.encode("utf-8")) for chunk in chunks) <= 102
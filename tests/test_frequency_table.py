@@ -0,0 +1,78 @@
+from collections import Counter
+
+from frequency_table import FrequencyTable, IncrementalFrequencyIndex, count_terms
+
+
+def test_from_counts_sorts_by_count_and_keeps_ties_in_order():
+    table = FrequencyTable.from_counts({"beta": 2, "alpha": 5, "gamma": 2})
+    assert list(table) == [("alpha", 5), ("beta", 2), ("gamma", 2)]
+
+
+def test_top_and_exports():
+    table = FrequencyTable.from_counts(Counter({"cloud": 3, "word": 2, "data": 1}))
+    top = table.top(2)
+    assert len(top) == 2
+    assert top.to_dict() == {"cloud": 3, "word": 2}
+    assert top.to_csv() == "Word,Count\ncloud,3\nword,2\n"
+    assert top.to_txt() == "cloud: 3\nword: 2"
+    assert top.to_json() == '[{"text": "cloud", "value": 3}, {"text": "word", "value": 2}]'
+    assert list(top.to_dataframe()["Count"]) == [3, 2]
+
+
+def test_empty_table():
+    table = FrequencyTable.from_counts({})
+    assert not table
+    assert list(table) == []
+
+
+def test_top_shares_memory_with_the_table():
+    table = FrequencyTable.from_counts({"cloud": 3, "word": 2, "data": 1})
+    assert table.top(10) is table
+    assert table.top(2).counts.base is not None
+
+
+def test_count_terms_counts_words_and_bigrams():
+    table = count_terms("cloud data cloud data cloud".split(), max_n=2)
+    counts = table.to_dict()
+    assert counts["cloud"] == 3
+    assert counts["data"] == 2
+    assert counts["cloud data"] == 2
+    assert counts["data cloud"] == 2
+
+
+def test_count_terms_breaks_ties_by_first_occurrence():
+    table = count_terms("zeta alpha zeta alpha".split())
+    assert [word for word, _ in table] == ["zeta", "alpha"]
+
+
+def lowercase(text, language):
+    return text.lower()
+
+
+def test_incremental_index_matches_full_recount():
+    index = IncrementalFrequencyIndex(lowercase, lambda text: "english")
+    index.update("Cloud Data\n\nWord Cloud")
+    assert index.counts == Counter({"cloud": 2, "data": 1, "word": 1})
+
+    assert index.update("Cloud Data\n\nWord Word")
+    assert index.counts == Counter({"cloud": 1, "data": 1, "word": 2})
+    assert index.processed_text == "cloud data word word"
+    assert not index.update("Cloud Data\n\nWord Word")
+
+
+def test_incremental_index_preprocesses_every_paragraph_in_one_language():
+    calls = []
+
+    def preprocess(text, language):
+        calls.append((text, language))
+        return text.lower()
+
+    index = IncrementalFrequencyIndex(preprocess, lambda text: "spanish" if "casa" in text else "english")
+    index.update("Best\n\nA longer paragraph")
+    assert {language for _, language in calls} == {"english"}
+
+    # A change of language recounts the paragraphs that were kept
+    calls.clear()
+    index.update("Best\n\nLa casa")
+    assert sorted(calls) == [("Best", "spanish"), ("La casa", "spanish")]
+    assert index.counts == Counter({"best": 1, "la": 1, "casa": 1})
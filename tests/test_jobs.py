@@ -0,0 +1,61 @@
+import time
+
+import jobs
+from jobs import CANCELLED, DONE, FAILED, JobRegistry
+
+
+def wait(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_submit_returns_the_running_job_and_its_result():
+    registry = JobRegistry(max_workers=1)
+    job = registry.submit("a", lambda job, value: value * 2, 21)
+    assert registry.submit("a", lambda job: None) is job
+    assert wait(job).status == DONE
+    assert job.result == 42
+
+
+def test_failures_and_cancellation():
+    registry = JobRegistry(max_workers=1)
+    failed = wait(registry.submit("fail", lambda job: 1 / 0))
+    assert failed.status == FAILED
+    assert "ZeroDivisionError" in failed.error
+
+    def slow(job):
+        while True:
+            job.set_progress(0.5)
+            time.sleep(0.01)
+
+    running = registry.submit("slow", slow)
+    time.sleep(0.05)
+    registry.cancel("slow")
+    assert wait(running).status == CANCELLED
+
+
+def test_finished_results_are_pruned_by_size():
+    registry = JobRegistry(max_workers=1, max_finished_bytes=3000, grace=0)
+    first = wait(registry.submit("first", lambda job: "x" * 2000))
+    second = wait(registry.submit("second", lambda job: "y" * 2000))
+    assert second.result_size > 2000
+    # Only the newest result fits in the budget
+    assert registry.get("first") is None
+    assert registry.get("second") is second
+    assert registry.result_bytes() == second.result_size
+    assert first.status == DONE
+
+
+def test_finished_results_are_pruned_by_age_after_the_grace_period(monkeypatch):
+    registry = JobRegistry(max_workers=1, max_finished_age=60, grace=10)
+    job = wait(registry.submit("old", lambda job: "done"))
+    clock = job.finished_at
+    monkeypatch.setattr(jobs.time, "monotonic", lambda: clock + 30)
+    wait(registry.submit("new", lambda job: "done"))
+    assert registry.get("old") is job
+
+    monkeypatch.setattr(jobs.time, "monotonic", lambda: clock + 120)
+    registry.submit("newer", lambda job: "done")
+    assert registry.get("old") is None
@@ -0,0 +1,51 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from masks import create_shape_mask, get_mask, register_mask_image
+
+
+def png_bytes(image):
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_get_mask_is_built_once_per_size_and_read_only():
+    mask = get_mask("Circle", 300, 200)
+    assert get_mask("Circle", 300, 200) is mask
+    assert get_mask("Circle", 400, 200) is not mask
+    assert mask.mask.shape == (200, 300)
+    assert np.array_equal(mask.mask, create_shape_mask("Circle", 300, 200))
+    with pytest.raises(ValueError):
+        mask.mask[0, 0] = 0
+
+
+def test_prepared_mask_counts_free_pixels_and_finds_the_contour():
+    mask = get_mask("Rectangle", 200, 150)
+    # The rectangle is drawn from 50 to 150 by 50 to 100, edges included
+    assert mask.free_pixels == 101 * 51
+    assert mask.free_fraction == pytest.approx(101 * 51 / (200 * 150))
+    assert mask.contour[50, 50] and mask.contour[100, 150]
+    assert not mask.contour[75, 100]
+    assert not mask.contour[10, 10]
+
+
+def test_image_masks_fit_the_canvas_and_treat_transparency_as_outside():
+    image = Image.new("RGBA", (100, 50), (0, 0, 0, 0))
+    image.paste((0, 0, 0, 255), (0, 0, 50, 50))
+    shape = register_mask_image(png_bytes(image))
+    assert register_mask_image(png_bytes(image)) == shape
+
+    mask = get_mask(shape, 200, 200).mask
+    # Scaled to 200 x 100 and centred vertically; the opaque left half is the shape
+    assert mask[100, 50] == 0
+    assert mask[100, 150] == 255
+    assert mask[20, 50] == 255
+
+
+def test_unregistered_image_shapes_are_an_error():
+    with pytest.raises(KeyError):
+        get_mask("image:" + "0" * 64, 100, 100)
@@ -0,0 +1,49 @@
+import pytest
+
+from presets import (ASPECT_RATIOS, DIRECT_MAX_PIXELS, PRESET_PLANS, RESOLUTION_PRESETS, get_render_plan,
+                     plan_for_size, preset_size)
+
+
+def old_sidebar_size(aspect_ratio, resolution_preset):
+    # The sidebar's if/elif chains the preset tables replaced
+    base_width, base_height = {
+        "HD (1280x720)": (1280, 720),
+        "Full HD (1920x1080)": (1920, 1080),
+        "2K (2560x1440)": (2560, 1440),
+        "4K (3840x2160)": (3840, 2160),
+    }[resolution_preset]
+    if aspect_ratio == "Square (1:1)":
+        size = min(base_width, base_height)
+        return size, size
+    keeps_width = {"16:9": True, "9:16": False, "8:10": True, "10:8": False, "5:7": True, "7:5": False,
+                   "6:4": True, "4:6": False, "10:4": True, "10:3": True}[aspect_ratio]
+    ratio_width, ratio_height = (int(side) for side in aspect_ratio.split(":"))
+    if keeps_width:
+        return base_width, int(base_width * ratio_height / ratio_width)
+    return int(base_height * ratio_width / ratio_height), base_height
+
+
+@pytest.mark.parametrize("resolution", list(RESOLUTION_PRESETS))
+@pytest.mark.parametrize("aspect_ratio", list(ASPECT_RATIOS))
+def test_preset_sizes_match_the_old_sidebar(aspect_ratio, resolution):
+    assert preset_size(aspect_ratio, resolution) == old_sidebar_size(aspect_ratio, resolution)
+
+
+def test_every_preset_size_has_a_precomputed_plan():
+    for aspect_ratio in ASPECT_RATIOS:
+        for resolution in RESOLUTION_PRESETS:
+            size = preset_size(aspect_ratio, resolution)
+            assert get_render_plan(*size) is PRESET_PLANS[size]
+
+
+def test_plans_for_custom_sizes():
+    small = plan_for_size(800, 600)
+    assert small.supersample and (small.layout_width, small.layout_height) == (800, 600)
+
+    direct = plan_for_size(1600, 1000)
+    assert direct.scale == 1 and not direct.tiled_png
+
+    large = plan_for_size(5000, 5000)
+    assert large.layout_width * large.layout_height <= DIRECT_MAX_PIXELS
+    assert large.tiled_png and large.preview_only
+    assert large.to_dict()["layout_width"] == large.layout_width
@@ -0,0 +1,62 @@
+"""Checks of the Next.js app's document processing script."""
+import importlib.util
+import os
+
+import nltk
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from wordcloud.wordcloud import FONT_PATH
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "wordcloud-app", "scripts", "process_document.py")
+
+
+def nltk_data_available():
+    try:
+        nltk.data.find('tokenizers/punkt')
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        return False
+    return True
+
+
+# The script downloads missing NLTK data when imported
+pytestmark = pytest.mark.skipif(not nltk_data_available(), reason="NLTK data not downloaded")
+
+
+@pytest.fixture(scope="module")
+def script():
+    spec = importlib.util.spec_from_file_location("process_document", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def word_box(word, x, y, font_size, rotation, text_length):
+    _, top, _, bottom = ImageFont.truetype(FONT_PATH, font_size).getbbox(word, anchor="lt")
+    width, height = text_length, bottom - top
+    if rotation:
+        width, height = height, width
+    return round(x - width / 2), round(y - height / 2), round(x + width / 2), round(y + height / 2)
+
+
+def test_placed_words_do_not_cover_each_other(script):
+    # WordCloud places each word where its box holds no ink of the words before
+    # it; drawing the words at the returned centers must keep that true
+    words = ["cloud", "security", "data", "network", "storage", "server", "region", "account",
+             "backup", "policy", "access", "identity", "traffic", "cluster", "replica"]
+    data = [{"text": word, "value": len(words) - rank} for rank, word in enumerate(words)]
+    layout = script.compute_layout(data, 600, 400)
+    assert any(rotation for _, _, _, _, rotation, _ in layout["words"])
+
+    canvas = Image.new("L", (600, 400))
+    draw = ImageDraw.Draw(canvas)
+    for word in layout["words"]:
+        left, top, right, bottom = word_box(*word)
+        ink = np.asarray(canvas)
+        # Centers are rounded to whole pixels
+        assert not ink[top + 1:bottom - 1, left + 1:right - 1].any(), word
+        font = ImageFont.TransposedFont(ImageFont.truetype(FONT_PATH, word[3]),
+                                        orientation=Image.ROTATE_90 if word[4] else None)
+        draw.text((left, top), word[0], fill=255, font=font)
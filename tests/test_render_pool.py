@@ -0,0 +1,130 @@
+import sys
+import time
+import types
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import render_pool
+from render_pool import FULL, PREVIEW, RenderPool, RenderQueueFull, new_process_pool, pool_submit
+
+
+class FakeExecutor:
+    """Stands in for the process pool; renders finish when a test resolves them."""
+
+    def __init__(self):
+        self.submitted = []
+        self.broken = False
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("worker died")
+        future = Future()
+        self.submitted.append((args[0] if args else None, future))
+        return future
+
+    def finish(self, index=0, error=None):
+        _, future = self.submitted.pop(index)
+        if error is None:
+            future.set_result(("layout", "image", "labels"))
+        else:
+            future.set_exception(error)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    created = []
+
+    def new_executor(self):
+        created.append(FakeExecutor())
+        return created[-1]
+
+    monkeypatch.setattr(RenderPool, "_new_executor", new_executor)
+    return created
+
+
+def test_previews_go_before_full_renders(executors):
+    pool = RenderPool(max_workers=1)
+    pool.submit("a", "first")
+    pool.submit("b", "full", FULL)
+    pool.submit("c", "preview", PREVIEW)
+    executors[0].finish()
+    assert [request for request, _ in executors[0].submitted] == ["preview"]
+
+
+def test_users_take_turns(executors):
+    pool = RenderPool(max_workers=1)
+    for request in ("a1", "a2", "a3"):
+        pool.submit("a", request)
+    pool.submit("b", "b1")
+    assert pool.position("b") == 3
+    order = []
+    for _ in range(4):
+        order.append(executors[0].submitted[0][0])
+        executors[0].finish()
+    assert order == ["a1", "a2", "b1", "a3"]
+
+
+def test_full_queue_rejects_requests(executors):
+    pool = RenderPool(max_workers=1, max_queue=1)
+    pool.submit("a", "running")
+    pool.submit("a", "waiting")
+    with pytest.raises(RenderQueueFull):
+        pool.submit("b", "rejected")
+    metrics = pool.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["queued_full"] == 1
+    assert metrics["in_flight"] == 1
+
+
+def test_dead_worker_restarts_the_pool(executors):
+    pool = RenderPool(max_workers=1)
+    failed = pool.submit("a", "dies")
+    waiting = pool.submit("b", "next")
+    executors[0].finish(error=BrokenProcessPool("worker died"))
+    with pytest.raises(BrokenProcessPool):
+        failed.result(timeout=1)
+    # Queued work goes to the new pool
+    assert len(executors) == 2
+    assert [request for request, _ in executors[1].submitted] == ["next"]
+    executors[1].finish()
+    assert waiting.result(timeout=1) == ("layout", "image", "labels")
+    assert pool.metrics()["restarts"] == 1
+
+
+def test_broken_pool_on_submit_fails_the_queue_and_restarts(executors):
+    pool = RenderPool(max_workers=1)
+    executors[0].broken = True
+    future = pool.submit("a", "lost")
+    with pytest.raises(BrokenProcessPool):
+        future.result(timeout=1)
+    assert len(executors) == 2
+    pool.submit("a", "retry")
+    assert [request for request, _ in executors[1].submitted] == ["retry"]
+
+
+def test_workers_do_not_run_the_script_main(tmp_path, monkeypatch):
+    # Streamlit installs the app script as __main__, and spawned workers import
+    # it by path; every submit may start a worker, not only the first
+    marker = tmp_path / "ran"
+    script = tmp_path / "fake_app.py"
+    script.write_text(f"open({str(marker)!r}, 'a').write('ran')\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    main.__spec__ = None
+    monkeypatch.setitem(sys.modules, "__main__", main)
+
+    executor = new_process_pool(3)
+    try:
+        futures = [pool_submit(executor, time.sleep, 0.5) for _ in range(3)]
+        futures.append(pool_submit(executor, render_pool._ready))
+        for future in futures:
+            future.result(timeout=60)
+    finally:
+        executor.shutdown()
+    assert sys.modules["__main__"] is main
+    assert not marker.exists()
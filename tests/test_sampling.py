@@ -0,0 +1,23 @@
+from collections import Counter
+
+from sampling import MIN_SAMPLED_UNITS, choose_units, estimate_totals
+
+
+def test_choose_units_skips_small_documents():
+    assert choose_units(2 * MIN_SAMPLED_UNITS - 1) is None
+
+
+def test_choose_units_is_sorted_and_repeatable():
+    chosen = choose_units(1000)
+    assert chosen == sorted(set(chosen))
+    assert chosen == choose_units(1000)
+    assert all(0 <= i < 1000 for i in chosen)
+
+
+def test_estimate_totals_scales_sample_means():
+    units = [Counter({"cloud": 2, "word": 1})] * 10
+    estimate = estimate_totals(units, total_units=100)
+    assert estimate["frequencies"].to_dict() == {"cloud": 200, "word": 100}
+    # Identical units have no between-unit variance
+    assert estimate["margins"] == {"cloud": 0.0, "word": 0.0}
+    assert estimate["stability"] == 1.0
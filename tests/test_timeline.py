@@ -0,0 +1,55 @@
+import io
+from collections import Counter
+
+import numpy as np
+from PIL import Image
+
+from timeline import SectionTimeline, encode_gif
+
+
+def make_timeline():
+    sections = [
+        Counter({"intro": 3, "cloud": 1}),
+        Counter({"cloud": 4, "data": 2}),
+        Counter({"data": 5, "summary": 1}),
+    ]
+    return SectionTimeline.from_sections(sections, ["Page 1", "Page 2", "Page 3"])
+
+
+def test_range_counts_match_section_sums():
+    timeline = make_timeline()
+    counts = dict(zip(timeline.vocabulary, timeline.range_counts(1, 3).tolist()))
+    assert counts == {"intro": 0, "cloud": 4, "data": 7, "summary": 1}
+
+
+def test_top_terms_drops_absent_words():
+    top = make_timeline().top_terms(0, 1, k=10)
+    assert top.to_dict() == {"intro": 3, "cloud": 1}
+
+
+def test_frames_and_labels():
+    timeline = make_timeline()
+    assert timeline.frames(2) == [(0, 2), (1, 3)]
+    assert timeline.range_label(0, 1) == "Page 1"
+    assert timeline.range_label(0, 3) == "Page 1 to Page 3"
+
+
+def test_words_outside_the_vocabulary_come_from_section_top_lists():
+    sections = [
+        Counter({"cloud": 9, "data": 8}),
+        Counter({"cloud": 9, "data": 8, "local": 5, "rare": 1}),
+        Counter({"cloud": 9, "data": 8, "local": 4}),
+    ]
+    timeline = SectionTimeline.from_sections(sections, ["A", "B", "C"], max_vocabulary=2, section_top_terms=1)
+    assert list(timeline.vocabulary) == ["cloud", "data"]
+    # "local" is frequent only late in the document, "rare" is below its section's top list
+    assert timeline.top_terms(1, 3, k=3).to_dict() == {"cloud": 18, "data": 16, "local": 9}
+    assert timeline.top_terms(0, 1, k=3).to_dict() == {"cloud": 9, "data": 8}
+    assert timeline.nbytes > timeline.prefix.nbytes
+
+
+def test_encode_gif_keeps_every_frame():
+    frames = [np.full((20, 30, 3), value, dtype=np.uint8) for value in (0, 128, 255)]
+    image = Image.open(io.BytesIO(encode_gif(frames)))
+    assert image.n_frames == 3
+    assert image.size == (30, 20)
@@ -0,0 +1,84 @@
+import pytest
+
+import tokenization
+from tokenization import clean_text, detect_language, preprocess_words, resolve_language, tokenize
+
+ENGLISH = {"a", "and", "for", "the", "of", "is", "to", "in", "y"}
+# Like NLTK's hinglish list: every English stopword plus some common English words
+TABLES = {
+    "english": ENGLISH,
+    "hinglish": ENGLISH | {"best", "good", "help", "example"},
+    "spanish": {"el", "la", "y", "de", "que", "en", "los"},
+    "french": {"le", "la", "et", "de", "les", "des", "est"},
+}
+
+
+@pytest.fixture
+def small_tables(monkeypatch):
+    """Detect against small fixed stopword tables instead of NLTK's."""
+    monkeypatch.setattr(tokenization, "stopword_languages", lambda: frozenset(TABLES))
+    monkeypatch.setattr(tokenization, "get_stopwords", lambda language: frozenset(TABLES.get(language, ())))
+    tokenization.candidate_languages.cache_clear()
+    yield
+    tokenization.candidate_languages.cache_clear()
+
+
+def nltk_stopwords_available():
+    try:
+        return "english" in tokenization.stopword_languages()
+    except LookupError:
+        return False
+
+
+real_stopwords = pytest.mark.skipif(not nltk_stopwords_available(), reason="NLTK stopwords not downloaded")
+
+
+def test_clean_text():
+    assert clean_text("Hello, World! 42 times.") == "hello world times"
+
+
+def test_tokenize_chinese_bigrams():
+    assert tokenize("词云生成", "chinese") == ["词云", "云生", "生成"]
+
+
+def test_supersets_of_english_are_not_candidates(small_tables):
+    assert tokenization.candidate_languages() == ("french", "spanish")
+
+
+def test_short_english_stays_english(small_tables):
+    assert detect_language("best practices for cloud security and a good example") == "english"
+
+
+def test_english_wins_without_a_clear_margin(small_tables):
+    # One Spanish stopword more than English is not enough to switch
+    assert detect_language("the cloud and el mapa de la") == "english"
+
+
+def test_other_language_wins_by_a_clear_margin(small_tables):
+    assert detect_language("el perro y la casa de los vecinos") == "spanish"
+    assert detect_language("le chat et la maison des voisins est grande") == "french"
+
+
+def test_resolve_language_uses_the_whole_text(small_tables):
+    text = "el perro y la casa de los vecinos " * 30
+    assert resolve_language(text) == "spanish"
+    assert preprocess_words(text, "english") == ["perro", "casa", "los", "vecinos"] * 30
+
+
+@real_stopwords
+def test_short_english_keeps_its_words():
+    assert preprocess_words("Best practices for cloud security and a good example") == [
+        "best", "practices", "cloud", "security", "good", "example"]
+
+
+@real_stopwords
+def test_accented_english_is_english():
+    text = "The café served a crème brûlée and the naïve critic wrote a glowing review"
+    assert resolve_language(text) == "english"
+    assert "café" in preprocess_words(text)
+    assert "review" in preprocess_words(text)
+
+
+@real_stopwords
+def test_spanish_is_detected():
+    assert resolve_language("El perro de los vecinos duerme en la casa que está junto al río") == "spanish"
@@ -0,0 +1,151 @@
+"""Word counts of a document section by section, for timelines.
+
+Each section (a PDF page, a block of DOCX paragraphs or a text chunk) is
+counted once. Counts are stored as cumulative sums over a shared vocabulary,
+one row per section boundary, so the counts of any range of sections are the
+difference of two rows and its top words take one pass over the vocabulary.
+
+The shared vocabulary is capped at the document's most frequent words, so each
+section also keeps its own top words outside it. Those are merged into range
+queries, so words that are frequent only in some sections still show up there.
+"""
+import sys
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from frequency_table import FrequencyTable
+
+# Only the most frequent words of the whole document are kept per section
+MAX_TIMELINE_VOCABULARY = 5000
+
+# Long documents keep fewer words so the prefix sums stay within this many bytes,
+# but never fewer than MIN_TIMELINE_VOCABULARY
+MAX_TIMELINE_PREFIX_BYTES = 16 * 1024 * 1024
+MIN_TIMELINE_VOCABULARY = 500
+
+# Words outside the shared vocabulary kept for each section
+SECTION_TOP_TERMS = 25
+
+# Most frames in one animation
+MAX_TIMELINE_FRAMES = 48
+
+
+class SectionTimeline:
+    """Prefix sums of per-section word counts over a shared vocabulary."""
+
+    def __init__(self, vocabulary, prefix, labels, section_vocabulary, section_offsets, section_ids,
+                 section_counts):
+        self.vocabulary = vocabulary
+        self.prefix = prefix
+        self.labels = labels
+        # Per-section top words outside the vocabulary: the entries of section i are
+        # section_ids and section_counts from section_offsets[i] to section_offsets[i + 1]
+        self.section_vocabulary = section_vocabulary
+        self.section_offsets = section_offsets
+        self.section_ids = section_ids
+        self.section_counts = section_counts
+        self._text_bytes = sum(sys.getsizeof(word) for words in (vocabulary, section_vocabulary, labels)
+                               for word in words)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the prefix sums, section top words, vocabularies and labels."""
+        arrays = (self.prefix, self.vocabulary, self.section_vocabulary, self.section_offsets,
+                  self.section_ids, self.section_counts)
+        return sum(array.nbytes for array in arrays) + self._text_bytes
+
+    @classmethod
+    def from_sections(cls, section_counts, labels, max_vocabulary=MAX_TIMELINE_VOCABULARY,
+                      section_top_terms=SECTION_TOP_TERMS):
+        """Build a timeline from one Counter per section.
+
+        The vocabulary is capped so the prefix sums fit in
+        MAX_TIMELINE_PREFIX_BYTES, which matters for documents with thousands
+        of sections. Each section keeps its section_top_terms most frequent
+        words outside the vocabulary.
+        """
+        row_budget = MAX_TIMELINE_PREFIX_BYTES // (4 * (len(section_counts) + 1))
+        max_vocabulary = min(max_vocabulary, max(row_budget, MIN_TIMELINE_VOCABULARY))
+        totals = {}
+        for counts in section_counts:
+            for word, count in counts.items():
+                totals[word] = totals.get(word, 0) + count
+        vocabulary = sorted(totals, key=totals.get, reverse=True)[:max_vocabulary]
+        index = {word: j for j, word in enumerate(vocabulary)}
+
+        prefix = np.zeros((len(section_counts) + 1, len(vocabulary)), dtype=np.int32)
+        for i, counts in enumerate(section_counts):
+            row = prefix[i + 1]
+            for word, count in counts.items():
+                j = index.get(word)
+                if j is not None:
+                    row[j] = count
+        np.cumsum(prefix, axis=0, out=prefix)
+
+        section_index = {}
+        section_offsets = np.zeros(len(section_counts) + 1, dtype=np.int64)
+        section_ids = []
+        section_values = []
+        for i, counts in enumerate(section_counts):
+            outside = sorted(((count, word) for word, count in counts.items() if word not in index),
+                             key=lambda item: (-item[0], item[1]))[:section_top_terms]
+            for count, word in outside:
+                section_ids.append(section_index.setdefault(word, len(section_index)))
+                section_values.append(count)
+            section_offsets[i + 1] = len(section_ids)
+        return cls(np.array(vocabulary, dtype=object), prefix, list(labels),
+                   np.array(list(section_index), dtype=object), section_offsets,
+                   np.array(section_ids, dtype=np.int32), np.array(section_values, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def range_counts(self, start, end):
+        """Counts of every vocabulary word over sections start to end - 1."""
+        return self.prefix[end] - self.prefix[start]
+
+    def top_terms(self, start, end, k=200):
+        """The k most frequent words over sections start to end - 1.
+
+        Words outside the shared vocabulary are counted from the sections
+        where they were among the top words, so their counts are lower bounds.
+        """
+        counts = self.range_counts(start, end)
+        words = self.vocabulary
+        first, last = self.section_offsets[start], self.section_offsets[end]
+        if last > first:
+            ids, inverse = np.unique(self.section_ids[first:last], return_inverse=True)
+            extra = np.bincount(inverse, weights=self.section_counts[first:last]).astype(np.int64)
+            counts = np.concatenate([counts, extra])
+            words = np.concatenate([words, self.section_vocabulary[ids]])
+        if k < len(counts):
+            top = np.argpartition(-counts, k)[:k]
+        else:
+            top = np.arange(len(counts))
+        top = top[counts[top] > 0]
+        return FrequencyTable.from_counts(zip(words[top], counts[top].tolist()))
+
+    def frames(self, window, step=1):
+        """(start, end) section ranges of a sliding window, at most MAX_TIMELINE_FRAMES of them."""
+        window = min(max(window, 1), len(self))
+        starts = list(range(0, len(self) - window + 1, max(step, 1)))
+        if len(starts) > MAX_TIMELINE_FRAMES:
+            picks = np.linspace(0, len(starts) - 1, MAX_TIMELINE_FRAMES).round().astype(int)
+            starts = [starts[i] for i in picks]
+        return [(start, start + window) for start in starts]
+
+    def range_label(self, start, end):
+        if end - start == 1:
+            return self.labels[start]
+        return f"{self.labels[start]} to {self.labels[end - 1]}"
+
+
+def encode_gif(images, duration_ms=800):
+    """Encode RGB arrays of the same size as a looping animated GIF."""
+    frames = [Image.fromarray(image).convert("P", palette=Image.ADAPTIVE) for image in images]
+    buf = BytesIO()
+    frames[0].save(buf, format="GIF", save_all=True, append_images=frames[1:],
+                   duration=duration_ms, loop=0)
+    return buf.getvalue()
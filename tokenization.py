@@ -0,0 +1,168 @@
+"""Language-aware tokenization and stopword removal.
+
+English text takes the original fast path: strip punctuation and digits,
+split on whitespace and drop English stopwords. Other text has its language
+detected once, from stopword overlap (or from the script for Chinese and
+Japanese), and is tokenized with that language's rules. Detection defaults
+to English and only switches on a clear margin. Stopword sets are loaded
+once per process.
+"""
+import re
+from functools import lru_cache
+
+from nltk.corpus import stopwords
+
+NON_WORD = re.compile(r'[^\w\s]')
+DIGITS = re.compile(r'\d+')
+SPACES = re.compile(r'\s+')
+
+# Han ideographs and Japanese kana are written without spaces between words
+CJK_RUN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+KANA = re.compile(r'[\u3040-\u30ff]')
+
+# Languages whose words are tokenized as overlapping character bigrams
+BIGRAM_LANGUAGES = ("chinese", "japanese")
+
+# Tokens inspected when detecting the language of a chunk
+DETECTION_SAMPLE = 400
+
+# Share of English stopwords above which ASCII text skips detection
+ENGLISH_FAST_PATH_RATIO = 0.2
+
+# ASCII text shorter than this is too short for the stopword ratio and is always detected
+MIN_DETECTION_WORDS = 20
+
+# Another language must match this many times as many stopwords as English,
+# and at least MIN_DETECTION_LEAD more, to be picked over it
+DETECTION_MARGIN = 2
+MIN_DETECTION_LEAD = 2
+
+# Text is split into chunks of about this many characters for sampling and timelines
+CHUNK_SIZE = 5000
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language):
+    """Stopword set for a language, loaded once per process (empty if NLTK has none)."""
+    if language not in stopword_languages():
+        return frozenset()
+    return frozenset(stopwords.words(language))
+
+
+@lru_cache(maxsize=1)
+def stopword_languages():
+    return frozenset(stopwords.fileids())
+
+
+@lru_cache(maxsize=1)
+def candidate_languages():
+    """Languages detection can pick over English.
+
+    Lists that contain every English stopword (like NLTK's hinglish) always
+    match English text at least as well as English does, so they are left out.
+    """
+    english = get_stopwords("english")
+    return tuple(sorted(language for language in stopword_languages()
+                        if language != "english" and not english <= get_stopwords(language)))
+
+
+def clean_text(text):
+    """Lowercase and strip punctuation, digits and extra whitespace."""
+    text = NON_WORD.sub('', text)
+    text = DIGITS.sub('', text)
+    text = SPACES.sub(' ', text).strip()
+    return text.lower()
+
+
+def detect_language(text):
+    """Guess the language of cleaned text, defaulting to English."""
+    cjk_chars = sum(len(run) for run in CJK_RUN.findall(text))
+    if cjk_chars > 0.3 * len(text.replace(' ', '')):
+        return "japanese" if KANA.search(text) else "chinese"
+
+    # Sample words from across the text rather than only its opening
+    words = text.split()
+    step = max(len(words) // DETECTION_SAMPLE, 1)
+    words = set(words[::step])
+    english_score = len(words & get_stopwords("english"))
+    best_language, best_score = "english", english_score
+    for language in candidate_languages():
+        score = len(words & get_stopwords(language))
+        if score > best_score:
+            best_language, best_score = language, score
+    if best_score < max(DETECTION_MARGIN * english_score, english_score + MIN_DETECTION_LEAD):
+        return "english"
+    return best_language
+
+
+def tokenize(text, language):
+    """Split cleaned text into words for a language."""
+    if language not in BIGRAM_LANGUAGES:
+        return text.split()
+
+    tokens = []
+    for word in text.split():
+        if not CJK_RUN.search(word):
+            tokens.append(word)
+            continue
+        # Runs of ideographs become overlapping bigrams, other characters stay whole
+        tokens.extend(part for part in CJK_RUN.split(word) if part)
+        for run in CJK_RUN.findall(word):
+            tokens.extend(run[j:j + 2] for j in range(len(run) - 1))
+    return tokens
+
+
+def filter_tokens(tokens, language):
+    """Drop stopwords and short words; CJK bigrams are kept at two characters."""
+    stop_words = get_stopwords(language)
+    if language in BIGRAM_LANGUAGES:
+        return [word for word in tokens if word not in stop_words
+                and (len(word) > 2 or (len(word) == 2 and CJK_RUN.fullmatch(word)))]
+    return [word for word in tokens if word not in stop_words and len(word) > 2]
+
+
+def is_english_ascii(text):
+    """Cheap check for the common case: ASCII text with plenty of English stopwords."""
+    if not text.isascii():
+        return False
+    words = text.split(None, DETECTION_SAMPLE)[:DETECTION_SAMPLE]
+    if len(words) < MIN_DETECTION_WORDS:
+        return False
+    english = get_stopwords("english")
+    return sum(word in english for word in words) >= ENGLISH_FAST_PATH_RATIO * len(words)
+
+
+def iter_chunks(text, size=CHUNK_SIZE):
+    """Split text into chunks of roughly size characters on paragraph or line breaks."""
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            # Prefer to cut at a paragraph, then a line, then a space
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start, end)
+                if cut > start:
+                    end = cut
+                    break
+        yield text[start:end]
+        start = end
+
+
+def resolve_language(text):
+    """Language of a whole document, for passing to preprocess_words."""
+    cleaned = clean_text(text)
+    if is_english_ascii(cleaned):
+        return "english"
+    return detect_language(cleaned)
+
+
+def preprocess_words(text, language=None):
+    """Return the filtered words of a text, detecting its language if not given.
+
+    Pass the language when a document is processed in parts, so every part
+    is filtered the same way.
+    """
+    cleaned = clean_text(text)
+    if language is None:
+        language = "english" if is_english_ascii(cleaned) else detect_language(cleaned)
+    return filter_tokens(tokenize(cleaned, language), language)
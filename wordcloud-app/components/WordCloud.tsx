@@ -2,11 +2,21 @@ import React, { useEffect, useRef, useState } from 'react';
 import { select, scaleLinear, scaleOrdinal } from 'd3';
 import cloud from 'd3-cloud';
 
+// A word placed by the server: [text, center x, center y, font size, rotation, text length]
+export type PlacedWord = [string, number, number, number, number, number];
+
+export interface PlacedLayout {
+  width: number;
+  height: number;
+  words: PlacedWord[];
+}
+
 interface WordCloudProps {
   words: Array<{
     text: string;
     value: number;
   }>;
+  layout?: PlacedLayout | null;
   width?: number;
   height?: number;
   colors?: string[];
@@ -25,6 +35,7 @@ interface CloudWord {
 
 const WordCloud: React.FC<WordCloudProps> = ({
   words,
+  layout: placedLayout = null,
   width = 800,
   height = 600,
   colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b'],
@@ -43,6 +54,36 @@ const WordCloud: React.FC<WordCloudProps> = ({
     // Clear previous content
     select(svgRef.current).selectAll('*').remove();
 
+    // Words already placed on the server are drawn as they are; the viewBox
+    // scales them to the element, so resizing needs no new layout
+    if (placedLayout) {
+      const colorScale = scaleOrdinal<string>().range(colors);
+      const shown = new Set(words.map(w => w.text));
+
+      select(svgRef.current)
+        .attr('viewBox', `0 0 ${placedLayout.width} ${placedLayout.height}`)
+        .append('g')
+        .selectAll('text')
+        .data(placedLayout.words.filter(w => shown.has(w[0])))
+        .enter()
+        .append('text')
+        .style('font-size', (d: PlacedWord) => `${d[3]}px`)
+        .style('font-family', 'Inter, sans-serif')
+        .style('fill', (_, i: number) => colorScale(i.toString()))
+        .attr('text-anchor', 'middle')
+        .attr('dominant-baseline', 'central')
+        // Stretch each word to the width it was placed with, whatever the font
+        .attr('textLength', (d: PlacedWord) => d[5])
+        .attr('lengthAdjust', 'spacingAndGlyphs')
+        .attr('transform', (d: PlacedWord) => `translate(${d[1]},${d[2]}) rotate(${d[4]})`)
+        .text((d: PlacedWord) => d[0]);
+
+      setIsRendered(true);
+      return;
+    }
+
+    select(svgRef.current).attr('viewBox', null);
+
     const layout = cloud<CloudWord>()
       .size([width, height])
       .words(words.map(d => ({ ...d })))
@@ -83,7 +124,7 @@ const WordCloud: React.FC<WordCloudProps> = ({
 
       setIsRendered(true);
     }
-  }, [words, width, height, colors, fontSizes, rotations]);
+  }, [words, placedLayout, width, height, colors, fontSizes, rotations]);
 
   const handleDownload = () => {
     if (!svgRef.current || !isRendered) return;
@@ -25,6 +25,22 @@ interface NextApiRequestWithFiles extends NextApiRequest {
   files: MulterFile[];
 }
 
+// Words placed by the server-side layout, and the canvas size limits it accepts
+const LAYOUT_MAX_WORDS = 300;
+const LAYOUT_MIN_SIZE = 100;
+const LAYOUT_MAX_SIZE = 4000;
+
+// Canvas size requested by the client, or null if it did not ask for a layout
+function parseLayoutSize(body: any): { width: number; height: number } | null {
+  const width = parseInt(body?.layoutWidth, 10);
+  const height = parseInt(body?.layoutHeight, 10);
+  const inRange = (value: number) => value >= LAYOUT_MIN_SIZE && value <= LAYOUT_MAX_SIZE;
+  if (!inRange(width) || !inRange(height)) {
+    return null;
+  }
+  return { width, height };
+}
+
 // Configure multer for file uploads
 const upload = multer({
   storage: multer.diskStorage({
@@ -192,7 +208,13 @@ if __name__ == "__main__":
     main()
 `;
     
-    await fs.writeFile(scriptPath, pythonScript);
+    // Only write the bundled copy when the script is missing, so the
+    // maintained scripts/process_document.py is never overwritten
+    try {
+      await fs.access(scriptPath);
+    } catch {
+      await fs.writeFile(scriptPath, pythonScript);
+    }
     
     // Execute the Python script
     const { stdout, stderr } = await execPromise(`python ${scriptPath} "${filePath}"`);
@@ -210,6 +232,32 @@ if __name__ == "__main__":
   }
 }
 
+// Place the combined words on the requested canvas; the Python side caches
+// layouts by content and size. Returns null if no layout could be computed,
+// in which case the client lays the words out itself.
+async function computeLayoutWithPython(
+  words: Array<{ text: string; value: number }>,
+  size: { width: number; height: number }
+): Promise<any> {
+  const scriptPath = path.join(process.cwd(), 'scripts', 'process_document.py');
+  const wordsPath = path.join(
+    process.cwd(), 'uploads', `${Date.now()}-${Math.round(Math.random() * 1E9)}-words.json`
+  );
+  try {
+    await fs.writeFile(wordsPath, JSON.stringify(words.slice(0, LAYOUT_MAX_WORDS)));
+    const { stdout } = await execPromise(
+      `python ${scriptPath} --words "${wordsPath}" --layout ${size.width}x${size.height}`
+    );
+    const result = JSON.parse(stdout);
+    return result.layout ?? null;
+  } catch (error) {
+    console.error('Error computing layout:', error);
+    return null;
+  } finally {
+    await fs.unlink(wordsPath).catch(() => undefined);
+  }
+}
+
 // Wrap multer middleware to work with Next.js API routes
 function runMiddleware(req: NextApiRequest, res: NextApiResponse, fn: any) {
   return new Promise((resolve, reject) => {
@@ -290,6 +338,13 @@ export default async function handler(req: NextApiRequest, res: NextApiResponse)
       .map(([text, value]) => ({ text, value }))
       .sort((a, b) => b.value - a.value);
     
+    // Optionally place the words here, so the browser does not run d3-cloud
+    const layoutSize = parseLayoutSize(req.body);
+    if (layoutSize && combinedWordCloudData.length > 0) {
+      const layout = await computeLayoutWithPython(combinedWordCloudData, layoutSize);
+      return res.status(200).json({ wordCloudData: combinedWordCloudData, layout });
+    }
+    
     return res.status(200).json({ wordCloudData: combinedWordCloudData });
   } catch (error) {
     console.error('API error:', error);
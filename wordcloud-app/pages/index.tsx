@@ -1,15 +1,20 @@
 import React, { useState } from 'react';
 import Head from 'next/head';
 import FileUpload from '../components/FileUpload';
-import WordCloud from '../components/WordCloud';
+import WordCloud, { PlacedLayout } from '../components/WordCloud';
 
 interface WordCloudData {
   text: string;
   value: number;
 }
 
+// Canvas the server lays the words out for
+const CLOUD_WIDTH = 800;
+const CLOUD_HEIGHT = 600;
+
 export default function Home() {
   const [wordCloudData, setWordCloudData] = useState<WordCloudData[]>([]);
+  const [cloudLayout, setCloudLayout] = useState<PlacedLayout | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [colorScheme, setColorScheme] = useState<string>('default');
@@ -32,6 +37,8 @@ export default function Home() {
       files.forEach(file => {
         formData.append('documents', file);
       });
+      formData.append('layoutWidth', String(CLOUD_WIDTH));
+      formData.append('layoutHeight', String(CLOUD_HEIGHT));
 
       const response = await fetch('/api/upload', {
         method: 'POST',
@@ -46,6 +53,7 @@ export default function Home() {
       
       if (data.wordCloudData && Array.isArray(data.wordCloudData)) {
         setWordCloudData(data.wordCloudData.slice(0, maxWords));
+        setCloudLayout(data.layout ?? null);
       } else {
         throw new Error('Invalid data format received from server');
       }
@@ -53,6 +61,7 @@ export default function Home() {
       console.error('Error uploading files:', err);
       setError(err instanceof Error ? err.message : 'An unknown error occurred');
       setWordCloudData([]);
+      setCloudLayout(null);
     } finally {
       setIsLoading(false);
     }
@@ -183,6 +192,9 @@ export default function Home() {
               ) : wordCloudData.length > 0 ? (
                 <WordCloud 
                   words={wordCloudData} 
+                  layout={cloudLayout}
+                  width={CLOUD_WIDTH}
+                  height={CLOUD_HEIGHT}
                   colors={colorSchemes[colorScheme as keyof typeof colorSchemes]}
                 />
               ) : (
@@ -1,8 +1,14 @@
 
 import sys
+import argparse
 import json
 import re
 import os
+import hashlib
+import tempfile
+import time
+import zipfile
+import xml.etree.ElementTree as ET
 from collections import Counter
 
 # For PDF processing
@@ -11,12 +17,6 @@ try:
 except ImportError:
     pass
 
-# For DOCX processing
-try:
-    import docx
-except ImportError:
-    pass
-
 # For NLP processing
 import nltk
 from nltk.corpus import stopwords
@@ -41,12 +41,42 @@ def extract_text_from_pdf(file_path):
             text += page.extract_text() + "\n"
     return text
 
+# WordprocessingML tags, DOCX parts are streamed without python-docx
+# (same extraction as the Streamlit app's document_processing.py)
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BREAKS = (W_NS + "br", W_NS + "cr")
+DOCX_EXTRA_PARTS = re.compile(r"word/(header\d*|footer\d*|footnotes|endnotes)\.xml$")
+
+def iter_docx_paragraphs(file_path):
+    with zipfile.ZipFile(file_path) as docx_zip:
+        parts = ["word/document.xml"]
+        parts += sorted(name for name in docx_zip.namelist() if DOCX_EXTRA_PARTS.match(name))
+        for part_name in parts:
+            with docx_zip.open(part_name) as part:
+                pieces = []
+                parents = []
+                for event, elem in ET.iterparse(part, events=("start", "end")):
+                    if event == "start":
+                        parents.append(elem)
+                        continue
+                    parents.pop()
+                    if elem.tag == W_NS + "t":
+                        pieces.append(elem.text or "")
+                    elif elem.tag == W_NS + "tab":
+                        pieces.append("\t")
+                    elif elem.tag in W_BREAKS:
+                        pieces.append("\n")
+                    elif elem.tag in (W_NS + "p", W_NS + "tbl"):
+                        if elem.tag == W_NS + "p":
+                            yield "".join(pieces)
+                            pieces = []
+                        # Drop finished paragraphs and tables so memory stays bounded
+                        elem.clear()
+                        if parents:
+                            parents[-1].remove(elem)
+
 def extract_text_from_docx(file_path):
-    doc = docx.Document(file_path)
-    text = ""
-    for para in doc.paragraphs:
-        text += para.text + "\n"
-    return text
+    return "\n".join(iter_docx_paragraphs(file_path))
 
 def extract_text_from_txt(file_path):
     with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
@@ -75,12 +105,127 @@ def process_text(text):
     
     return word_cloud_data
 
+# Placed layouts are cached here by content hash and canvas size
+LAYOUT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "wordcloud-layouts")
+
+# Most layouts kept (least recently used dropped first), and how long an unused one is kept
+LAYOUT_CACHE_MAX_ENTRIES = int(os.getenv("WORDCLOUD_LAYOUT_CACHE_ENTRIES", "500"))
+LAYOUT_CACHE_TTL = int(os.getenv("WORDCLOUD_LAYOUT_CACHE_TTL_HOURS", "24")) * 3600
+
+def compute_layout(word_cloud_data, width, height):
+    """Place words on a width x height canvas with the wordcloud package.
+    
+    Each placed word is [text, x, y, font size, rotation, text length]: x and
+    y are the center of the word's box, rotation is 0 or -90 degrees and the
+    text length is the word's width along its baseline, so the browser can
+    draw it with any font without overlaps.
+    """
+    from PIL import ImageFont
+    from wordcloud import WordCloud
+    
+    frequencies = {item["text"]: item["value"] for item in word_cloud_data}
+    wordcloud = WordCloud(width=width, height=height, max_words=len(frequencies),
+                          prefer_horizontal=0.9, min_font_size=4, random_state=42)
+    wordcloud.generate_from_frequencies(frequencies)
+    
+    words = []
+    fonts = {}
+    for (word, _), font_size, (row, col), orientation, _ in wordcloud.layout_:
+        if font_size not in fonts:
+            fonts[font_size] = ImageFont.truetype(wordcloud.font_path, font_size)
+        left, top, right, bottom = fonts[font_size].getbbox(word, anchor="lt")
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        if orientation is not None:
+            # Rotated words run down the canvas, their height along x
+            center_x, center_y = center_y, center_x
+        words.append([word, round(col + center_x), round(row + center_y), int(font_size),
+                      0 if orientation is None else -90, right - left])
+    
+    return {"width": width, "height": height, "words": words}
+
+def get_layout(word_cloud_data, width, height):
+    """Cached compute_layout, keyed by the word counts and canvas size."""
+    key = hashlib.sha256(
+        json.dumps([word_cloud_data, width, height], separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    cache_path = os.path.join(LAYOUT_CACHE_DIR, key + ".json")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            layout = json.load(file)
+        # The modification time records the last use, for pruning
+        os.utime(cache_path)
+        return layout
+    except (FileNotFoundError, ValueError):
+        pass
+    
+    layout = compute_layout(word_cloud_data, width, height)
+    os.makedirs(LAYOUT_CACHE_DIR, exist_ok=True)
+    
+    # Write to a temporary file first so concurrent requests never read a partial layout
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(layout, file, separators=(",", ":"))
+    os.replace(tmp_path, cache_path)
+    prune_layout_cache()
+    return layout
+
+def prune_layout_cache():
+    """Drop cached layouts unused for LAYOUT_CACHE_TTL, then the least recently used beyond the cap."""
+    entries = []
+    for entry in os.scandir(LAYOUT_CACHE_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    entries.sort(reverse=True)
+    cutoff = time.time() - LAYOUT_CACHE_TTL
+    for rank, (used_at, path) in enumerate(entries):
+        if rank >= LAYOUT_CACHE_MAX_ENTRIES or used_at < cutoff:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another request pruned it first
+                pass
+
+def parse_size(value):
+    width, height = (int(part) for part in value.lower().split("x"))
+    if not (100 <= width <= 4000 and 100 <= height <= 4000):
+        raise ValueError(f"Canvas size out of range: {value}")
+    return width, height
+
 def main():
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="Count the words of a document for a word cloud")
+    parser.add_argument("file_path", nargs="?")
+    parser.add_argument("--layout", metavar="WIDTHxHEIGHT", help="also place the words on a canvas of this size")
+    parser.add_argument("--words", metavar="JSON_FILE", help="place these word counts instead of reading a document")
+    args = parser.parse_args()
+    
+    try:
+        size = parse_size(args.layout) if args.layout else None
+    except ValueError as e:
+        print(json.dumps({"error": f"Invalid layout size: {e}"}))
+        sys.exit(1)
+    
+    # Layout only, for word counts already combined by the caller
+    if args.words:
+        if size is None:
+            print(json.dumps({"error": "--words needs --layout WIDTHxHEIGHT"}))
+            sys.exit(1)
+        try:
+            with open(args.words, 'r', encoding='utf-8') as file:
+                word_cloud_data = json.load(file)
+            print(json.dumps({"layout": get_layout(word_cloud_data, *size)}, separators=(",", ":")))
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+        return
+    
+    if not args.file_path:
         print(json.dumps({"error": "Missing file path argument"}))
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args.file_path
     
     if not os.path.exists(file_path):
         print(json.dumps({"error": f"File not found: {file_path}"}))
@@ -104,7 +249,10 @@ def main():
         word_cloud_data = process_text(text)
         
         # Return the result as JSON
-        print(json.dumps({"wordCloudData": word_cloud_data}))
+        result = {"wordCloudData": word_cloud_data}
+        if size is not None:
+            result["layout"] = get_layout(word_cloud_data, *size)
+        print(json.dumps(result))
         
     except Exception as e:
         print(json.dumps({"error": str(e)}))